@@ -0,0 +1,215 @@
+"""
+Garbage collector degli asset orfani in cars/ e images/.
+
+Un file è orfano se nessuna pagina HTML, foglio di stile, modulo JS o voce del
+dataset (logo dei brand, image e gallery delle auto) lo referenzia: ad esempio
+le immagini tolte con "Rimuovi Selezionata" nel tab Modifica, le cartelle
+rimaste dopo la rimozione di un'auto con DELETE_IMAGE_FOLDERS = False, o i
+vecchi loghi in images/old_*. Vengono segnalati anche i file JSON in datasets/
+che nessuno usa.
+
+Uso:
+    python datasets/asset_gc.py               # dry run: elenca gli orfani e i byte recuperabili
+    python datasets/asset_gc.py --quarantine  # sposta gli orfani in .quarantine/<data>/
+    python datasets/asset_gc.py --delete      # elimina definitivamente gli orfani
+"""
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import site_refs
+
+SITE_ROOT = Path(__file__).parent.parent
+ASSET_TREES = ("cars", "images")
+QUARANTINE_DIR = ".quarantine"
+DATASET_FILE = "datasets/dataset.json"
+
+# Sorgenti che possono referenziare asset
+SOURCE_PATTERNS = ("*.html", "pages/*.html", "styles/*.css", "scripts/**/*.js")
+# File di datasets/ usati dagli strumenti anche se nessuna pagina li referenzia
+PROTECTED_FILES = {
+    DATASET_FILE,
+    "datasets/.photo_hashes.json",  # indice degli hash delle foto (photo_hashes.py)
+    "datasets/.similar_cache.json",  # cache incrementale delle auto simili (similar_cars.py)
+}
+
+
+def _scan_dir(path, root_len):
+    """Elenca ricorsivamente (percorso relativo, byte) con os.scandir"""
+    found = []
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        rel = entry.path[root_len:].replace(os.sep, '/')
+                        found.append((rel, entry.stat(follow_symlinks=False).st_size))
+        except OSError as e:
+            print(f"Impossibile leggere {current}: {e}")
+    return found
+
+
+def scan_assets(root=SITE_ROOT, trees=ASSET_TREES, workers=8):
+    """
+    Scansiona in parallelo gli alberi di asset (una sottocartella per job).
+
+    Returns:
+        dict percorso relativo -> dimensione in byte
+    """
+    root = str(Path(root))
+    root_len = len(root) + 1
+    jobs = []
+    files = {}
+    for tree in trees:
+        tree_path = os.path.join(root, tree)
+        if not os.path.isdir(tree_path):
+            continue
+        with os.scandir(tree_path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    jobs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files[entry.path[root_len:].replace(os.sep, '/')] = entry.stat().st_size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(lambda p: _scan_dir(p, root_len), jobs):
+            files.update(result)
+
+    datasets_dir = os.path.join(root, "datasets")
+    if os.path.isdir(datasets_dir):
+        with os.scandir(datasets_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    files[f"datasets/{entry.name}"] = entry.stat().st_size
+    return files
+
+
+def dataset_references(root=SITE_ROOT):
+    """Percorsi (relativi alla root) di loghi e immagini citati nel dataset"""
+    with open(Path(root) / DATASET_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    refs = set()
+
+    def _add(ref):
+        if ref and site_refs.is_local(ref):
+            path = site_refs.normalize("pages", ref)
+            if path:
+                refs.add(path)
+
+    for brand in data.get('brands', []):
+        _add(brand.get('logo'))
+        for car in brand.get('cars', []):
+            _add(car.get('image'))
+            for img in car.get('gallery', []):
+                _add(img if isinstance(img, str) else img.get('src'))
+    return refs
+
+
+def reachable_paths(root, known):
+    """Tutti i file noti raggiungibili dal dataset e da HTML/CSS/JS"""
+    root = Path(root)
+    reachable = dataset_references(root) & set(known)
+    for pattern in SOURCE_PATTERNS:
+        for path in root.glob(pattern):
+            rel = path.relative_to(root).as_posix()
+            text = path.read_text(encoding='utf-8', errors='replace')
+            reachable |= site_refs.find_references(text, rel, known)
+    return reachable | PROTECTED_FILES
+
+
+def find_orphans(root=SITE_ROOT, workers=8):
+    """Restituisce dict percorso orfano -> byte"""
+    files = scan_assets(root, workers=workers)
+    reachable = reachable_paths(root, files)
+    return {rel: size for rel, size in sorted(files.items()) if rel not in reachable}
+
+
+def orphan_folders(orphans, files):
+    """Cartelle delle auto in cui tutti i file sono orfani (da eliminare per intero)"""
+    by_folder = {}
+    for rel in files:
+        parts = rel.split('/')
+        if parts[0] == "cars" and len(parts) >= 4:
+            by_folder.setdefault('/'.join(parts[:3]), []).append(rel)
+    return sorted(folder for folder, members in by_folder.items() if all(m in orphans for m in members))
+
+
+def _remove_empty_dirs(root, rel_paths):
+    for rel in sorted({str(Path(r).parent) for r in rel_paths}, key=len, reverse=True):
+        folder = Path(root) / rel
+        while folder != Path(root) and folder.exists() and not any(folder.iterdir()):
+            folder.rmdir()
+            folder = folder.parent
+
+
+def quarantine(root, orphans):
+    """Sposta gli orfani in .quarantine/<data ora>/ mantenendo la struttura delle cartelle"""
+    target = Path(root) / QUARANTINE_DIR / datetime.now().strftime("%Y%m%d-%H%M%S")
+    for rel in orphans:
+        dest = target / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(Path(root) / rel), str(dest))
+    _remove_empty_dirs(root, orphans)
+    return target
+
+
+def delete(root, orphans):
+    for rel in orphans:
+        try:
+            (Path(root) / rel).unlink()
+        except OSError as e:
+            print(f"Errore nell'eliminazione di {rel}: {e}")
+    _remove_empty_dirs(root, orphans)
+
+
+def _format_bytes(size):
+    return f"{size / 1024 / 1024:.2f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trova e recupera gli asset orfani in cars/ e images/")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--quarantine", action="store_true", help=f"sposta gli orfani in {QUARANTINE_DIR}/")
+    mode.add_argument("--delete", action="store_true", help="elimina definitivamente gli orfani")
+    parser.add_argument("--workers", type=int, default=8, help="thread per la scansione (default: 8)")
+    args = parser.parse_args()
+
+    files = scan_assets(SITE_ROOT, workers=args.workers)
+    reachable = reachable_paths(SITE_ROOT, files)
+    orphans = {rel: size for rel, size in sorted(files.items()) if rel not in reachable}
+
+    folders = orphan_folders(orphans, files)
+    in_folders = {rel for rel in orphans if any(rel.startswith(f + '/') for f in folders)}
+    for folder in folders:
+        size = sum(s for rel, s in orphans.items() if rel.startswith(folder + '/'))
+        print(f"[CARTELLA] {folder}/ ({_format_bytes(size)})")
+    for rel, size in orphans.items():
+        if rel not in in_folders:
+            print(f"{rel} ({_format_bytes(size)})")
+
+    total = sum(orphans.values())
+    print(f"\n{len(orphans)} file orfani su {len(files)}, {_format_bytes(total)} recuperabili")
+
+    if not orphans:
+        return
+    if args.quarantine:
+        target = quarantine(SITE_ROOT, orphans)
+        print(f"Orfani spostati in {target}")
+    elif args.delete:
+        delete(SITE_ROOT, orphans)
+        print("Orfani eliminati")
+    else:
+        print("Dry run: nessun file modificato (usa --quarantine o --delete)")
+
+
+if __name__ == "__main__":
+    main()
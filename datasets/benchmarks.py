@@ -0,0 +1,187 @@
+"""
+Benchmark di scalabilità dell'editor, senza interfaccia grafica.
+
+Per ogni dimensione genera un inventario sintetico (synthetic_inventory.py) e
+misura la parte non grafica delle operazioni di CarManagerApp:
+
+    load       json.load di dataset.json
+    save       json.dump con la stessa formattazione di save_json
+    validate   validator.validate_inventory (eseguito a ogni salvataggio)
+    filter     filtro della lista per ogni tasto digitato nella ricerca
+    select     ricerca dell'auto selezionata nella lista (ultima riga)
+    ids        creazione di CarIdAllocator (al primo inserimento)
+    add        limite "aggiunto" + assegnazione id + inserimento
+    edit       selezione + aggiornamento dei campi
+    remove     selezione + rimozione dal brand
+    aggiunto   ricerca dell'auto più vecchia con aggiunto=true
+
+Di ogni operazione riporta la mediana in ms per dimensione e l'esponente k
+stimato tra dimensioni successive (tempo ~ n^k: 1 = lineare).
+
+Uso:
+    python datasets/benchmarks.py                       # 1000, 10000, 100000 auto
+    python datasets/benchmarks.py --sizes 10000 --repeat 5 --json bench.json
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import car_ids
+import inventory
+import synthetic_inventory
+import validator
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SEARCH_TERM = "opel"
+
+
+def measure(func, repeat):
+    """Mediana in ms di repeat esecuzioni di func()"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _add_car(data, allocator, brand, template_car):
+    car = dict(template_car, aggiunto=True)
+    oldest = inventory.oldest_added_car(data)
+    if oldest:
+        oldest[1]['aggiunto'] = False
+    now = datetime.now()
+    car['id'], _ = allocator.allocate(brand['id'], car['name'], car['chilometraggio'], car['anno'], now)
+    car['date_added'] = now.strftime(inventory.DATE_FORMAT)
+    brand['cars'].append(car)
+    return car, oldest
+
+
+def _undo_add(brand, car, oldest):
+    brand['cars'].remove(car)
+    if oldest:
+        oldest[1]['aggiunto'] = True
+
+
+def bench_size(size, repeat, seed=0, template=None):
+    """dict operazione -> mediana in ms per un inventario di size auto"""
+    data = synthetic_inventory.generate(size, template, seed)
+    results = {}
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        def save():
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+        def load():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        results["save"] = measure(save, repeat)
+        results["load"] = measure(load, repeat)
+    finally:
+        os.remove(path)
+
+    results["validate"] = measure(lambda: validator.validate_inventory(data, check_files=False), repeat)
+
+    # Ogni tasto digitato rifiltra l'intera lista
+    keystrokes = [SEARCH_TERM[:n] for n in range(1, len(SEARCH_TERM) + 1)]
+    results["filter"] = statistics.median(
+        measure(lambda term=term: list(inventory.display_rows(data, term)), repeat) for term in keystrokes
+    )
+
+    last_row = size - 1
+    results["select"] = measure(lambda: inventory.find_listed_car(data, "", last_row), repeat)
+    results["ids"] = measure(lambda: car_ids.CarIdAllocator.from_data(data), repeat)
+
+    allocator = car_ids.CarIdAllocator.from_data(data)
+    brand, _, template_car = inventory.find_listed_car(data, "", 0)
+
+    def add():
+        _undo_add(brand, *_add_car(data, allocator, brand, template_car))
+
+    results["add"] = measure(add, repeat)
+
+    middle_row = size // 2
+
+    def edit():
+        _, _, car = inventory.find_listed_car(data, "", middle_row)
+        car.update(prezzo=car['prezzo'] + 100, chilometraggio=car['chilometraggio'] + 1000)
+
+    results["edit"] = measure(edit, repeat)
+
+    def remove():
+        target_brand, index, car = inventory.find_listed_car(data, "", middle_row)
+        target_brand['cars'].pop(index)
+        target_brand['cars'].insert(index, car)
+
+    results["remove"] = measure(remove, repeat)
+    results["aggiunto"] = measure(lambda: inventory.oldest_added_car(data), repeat)
+    return results
+
+
+def scaling_exponents(sizes, results):
+    """Esponente k tra dimensioni successive: log(t2/t1) / log(n2/n1)"""
+    exponents = {}
+    for op in results[sizes[0]]:
+        values = []
+        for small, large in zip(sizes, sizes[1:]):
+            t1, t2 = results[small][op], results[large][op]
+            values.append(round(math.log(t2 / t1) / math.log(large / small), 2) if t1 > 0 and t2 > 0 else None)
+        exponents[op] = values
+    return exponents
+
+
+def format_table(sizes, results, exponents):
+    header = f"{'operazione':<12}" + ''.join(f"{f'{n} auto':>14}" for n in sizes)
+    if len(sizes) > 1:
+        header += f"{'k (t ~ n^k)':>16}"
+    lines = [header + "   (mediana, ms)"]
+    for op in results[sizes[0]]:
+        row = f"{op:<12}" + ''.join(f"{results[n][op]:>14.3f}" for n in sizes)
+        if len(sizes) > 1:
+            row += f"{' / '.join('-' if k is None else f'{k:.2f}' for k in exponents[op]):>16}"
+        lines.append(row)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di scalabilità delle operazioni dell'editor")
+    parser.add_argument("--sizes", type=int, nargs='+', default=list(DEFAULT_SIZES), help="numero di auto da provare")
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni per operazione (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seme dell'inventario sintetico")
+    parser.add_argument("--json", metavar="FILE", help="salva i risultati in FILE")
+    args = parser.parse_args()
+
+    sizes = sorted(set(args.sizes))
+    template = synthetic_inventory.load_template()
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        results[size] = bench_size(size, args.repeat, args.seed, template)
+        print(f"{size} auto: {time.perf_counter() - start:.1f} s")
+    exponents = scaling_exponents(sizes, results)
+
+    print()
+    print(format_table(sizes, results, exponents))
+
+    if args.json:
+        report = {
+            "generated": datetime.now().strftime(inventory.DATE_FORMAT),
+            "repeat": args.repeat,
+            "results_ms": {str(n): {op: round(ms, 4) for op, ms in results[n].items()} for n in sizes},
+            "exponents": exponents,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRisultati salvati in {args.json}")
+
+
+if __name__ == "__main__":
+    main()
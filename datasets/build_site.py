@@ -0,0 +1,142 @@
+"""
+Build del sito per la pubblicazione.
+
+Copia la radice del sito in una cartella di output (default: dist/) ed esegue
+in sequenza gli step di build sulla copia. I sorgenti nel repository non
+vengono mai modificati; lo stato che la build conserva tra una pubblicazione
+e l'altra sta fuori dai file versionati:
+
+    cronologia delle versioni del dataset   fuori dal repository (--versions-dir,
+                                            default dataset_versions.DEFAULT_HISTORY_DIR)
+    cache delle auto simili                 datasets/.similar_cache.json (ignorata da git)
+
+Uso:
+    python datasets/build_site.py [--out CARTELLA] [--versions-dir CARTELLA]
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import columnar
+import css_bundle
+import dataset_versions
+import fingerprint
+import js_bundle
+import resource_hints
+import search_index
+import service_worker
+import similar_cars
+import validator
+
+SITE_ROOT = Path(__file__).parent.parent
+DEFAULT_OUT_DIR = SITE_ROOT / "dist"
+
+# Pagine HTML pubblicate (percorsi relativi alla root del sito)
+PAGES = ["index.html", "pages/auto.html"]
+
+# Cosa viene copiato nella cartella di output
+STAGED_DIRS = ["pages", "styles", "scripts", "images", "cars"]
+STAGED_FILES = [
+    "index.html", "CNAME", "robots.txt", "sitemap.xml",
+    "datasets/dataset.json", "datasets/last_update.txt",  # last_update.txt è letto da pages/auto.html
+]
+SKIPPED_SUFFIXES = {".md", ".txt", ".old", ".py"}
+
+# File di testo: vengono sempre copiati (gli step li riscrivono nella copia)
+TEXT_SUFFIXES = {".html", ".css", ".js", ".json", ".xml", ".svg"}
+
+# Step eseguiti in ordine sulla cartella di output
+STEPS = [
+    ("validate", validator.run),
+    ("css", css_bundle.run),
+    ("js", js_bundle.run),
+    ("fingerprint", fingerprint.run),
+    ("columns", columnar.run),
+    ("search", search_index.run),
+    ("similar", similar_cars.run),
+    ("versions", dataset_versions.run),  # dopo il fingerprint: usa il dataset con i nomi con hash
+    ("hints", resource_hints.run),  # dopo versions: il catalogo precaricato è quello del puntatore
+    ("sw", service_worker.run),  # ultimo: la versione del manifest include gli asset degli step precedenti
+]
+
+
+def _link_or_copy(src, dest):
+    """Copia un file; le immagini vengono collegate con hard link quando possibile (molto più veloce)"""
+    if src.suffix.lower() not in TEXT_SUFFIXES:
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dest)
+
+
+def stage_site(root, out_dir):
+    """Ricrea la cartella di output con una copia dei file pubblicati"""
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    files = [root / f for f in STAGED_FILES if (root / f).exists()]
+    for dir_name in STAGED_DIRS:
+        files.extend(
+            p for p in sorted((root / dir_name).rglob('*'))
+            if p.is_file() and p.suffix.lower() not in SKIPPED_SUFFIXES
+        )
+
+    count = 0
+    for src in files:
+        dest = out_dir / src.relative_to(root)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(src, dest)
+        count += 1
+    return count
+
+
+def build(root=SITE_ROOT, out_dir=DEFAULT_OUT_DIR, steps=None, versions_dir=None):
+    """
+    Esegue la build completa.
+
+    Args:
+        root: radice del sito sorgente
+        out_dir: cartella di output (viene ricreata)
+        steps: lista di (nome, funzione) - default STEPS
+        versions_dir: cronologia delle versioni del dataset - default dataset_versions.DEFAULT_HISTORY_DIR
+
+    Returns:
+        dict di contesto condiviso tra gli step (contiene i risultati di ciascuno)
+    """
+    root = Path(root)
+    out_dir = Path(out_dir)
+    context = {"root": root, "out": out_dir, "pages": list(PAGES), "versions_dir": versions_dir}
+
+    start = time.perf_counter()
+    staged = stage_site(root, out_dir)
+    print(f"Copiati {staged} file in {out_dir} ({time.perf_counter() - start:.2f}s)")
+
+    for name, step in steps or STEPS:
+        start = time.perf_counter()
+        context[name] = step(out_dir, context)
+        print(f"Step '{name}' completato ({time.perf_counter() - start:.2f}s)")
+
+    return context
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build del sito per la pubblicazione")
+    parser.add_argument("--out", default=str(DEFAULT_OUT_DIR), help="cartella di output (default: dist/)")
+    parser.add_argument("--versions-dir", default=str(dataset_versions.DEFAULT_HISTORY_DIR),
+                        help=f"cronologia delle versioni del dataset, da conservare tra le pubblicazioni (default: {dataset_versions.DEFAULT_HISTORY_DIR})")
+    args = parser.parse_args()
+    try:
+        build(SITE_ROOT, Path(args.out), versions_dir=Path(args.versions_dir))
+    except ValueError as e:
+        print(f"Build interrotta: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
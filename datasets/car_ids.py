@@ -0,0 +1,147 @@
+"""
+Generazione degli id delle auto senza collisioni.
+
+Formato: <brand_id>-<xxx><anno*10 + km compresso><MMYY>, es. "audi-a4216300126",
+dove xxx sono tre lettere ricavate dal nome. La cartella delle immagini è
+"<nome senza spazi>-<id senza brand>", es. "a4-a4216300126".
+
+Due auto con stesso nome, anno e chilometraggio simile aggiunte nello stesso mese
+generano lo stesso id di base: CarIdAllocator tiene in memoria gli id e le
+cartelle già usati (dal dataset e da cars/) e in caso di collisione aggiunge un
+suffisso di lettere deterministico ("b", "c", ..., "z", "ba", ...).
+Ogni assegnazione costa O(1) ammortizzato, quindi un lotto di n auto costa O(n).
+"""
+import os
+from datetime import datetime
+
+import validator
+
+_SUFFIX_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def name_code(car_name):
+    """Tre lettere ricavate dal nome dell'auto (preferibilmente consonanti)"""
+    name_clean = car_name.lower().replace(" ", "")
+    consonants = [c for c in name_clean if c.isalpha() and c not in 'aeiou']
+
+    if len(name_clean) == 3:
+        return name_clean[:3]
+    if len(consonants) >= 3:
+        return ''.join(consonants[:3])
+    if len(consonants) == 2:
+        # Trova una lettera vicina
+        idx = name_clean.index(consonants[1])
+        if idx + 1 < len(name_clean):
+            return consonants[0] + consonants[1] + name_clean[idx + 1]
+        return consonants[0] + consonants[1] + name_clean[0]
+    if len(consonants) == 1:
+        idx = name_clean.index(consonants[0])
+        if idx + 2 < len(name_clean):
+            return consonants[0] + name_clean[idx + 1] + name_clean[idx + 2]
+    return name_clean[:3]
+
+
+def numeric_code(chilometraggio, anno, now=None):
+    """Parte numerica dell'id: anno*10 + chilometraggio compresso a 4 cifre, seguito da MMYY"""
+    now = now or datetime.now()
+    if chilometraggio < 1000:
+        # Auto quasi nuove: il chilometraggio da solo è troppo corto, lo si allunga
+        # in modo deterministico (le collisioni sono risolte dall'allocatore)
+        a = 1000 - chilometraggio
+        num_digits = len(str(a))
+        a = a * (10 ** num_digits) + 10 ** (num_digits - 1)
+    else:
+        a = chilometraggio
+    while a > 9999:
+        last_digit = a % 10
+        a = a // 10
+        a += last_digit
+    a = anno * 10 + a
+    return str(a) + now.strftime("%m%y")
+
+
+def base_car_id(brand_id, car_name, chilometraggio, anno, now=None):
+    """Id senza controllo delle collisioni"""
+    return f"{brand_id}-{name_code(car_name)}{numeric_code(chilometraggio, anno, now)}"
+
+
+def folder_name_for(brand_id, car_name, car_id):
+    """Nome della cartella immagini: funziona anche con brand che contengono '-' (es. great-wall)"""
+    return f"{car_name.lower().replace(' ', '')}-{car_id[len(brand_id) + 1:]}"
+
+
+def _suffix(n):
+    """0 -> '', 1 -> 'b', 25 -> 'z', 26 -> 'ba', ..."""
+    if n == 0:
+        return ''
+    letters = []
+    while n:
+        n, r = divmod(n, 26)
+        letters.append(_SUFFIX_ALPHABET[r])
+    return ''.join(reversed(letters))
+
+
+class CarIdAllocator:
+    """Assegna id e cartelle univoci rispetto al dataset e alle cartelle presenti su disco"""
+
+    def __init__(self, used_ids=(), used_folders=()):
+        self.used_ids = set(used_ids)
+        self.used_folders = set(used_folders)  # "brand_id/nome-cartella"
+        self._next_suffix = {}
+
+    @classmethod
+    def from_data(cls, data, cars_dir=None):
+        """
+        Args:
+            data: contenuto di dataset.json
+            cars_dir: cartella cars/ da cui leggere anche le cartelle non più nel dataset
+        """
+        ids = set()
+        folders = set()
+        for brand in data.get('brands', []):
+            for car in brand.get('cars', []):
+                if car.get('id'):
+                    ids.add(car['id'])
+                folder = validator.car_folder(car)
+                if folder:
+                    folders.add(folder)
+        if cars_dir and os.path.isdir(cars_dir):
+            with os.scandir(cars_dir) as brands:
+                for brand_entry in brands:
+                    if brand_entry.is_dir():
+                        with os.scandir(brand_entry.path) as entries:
+                            folders.update(f"{brand_entry.name}/{e.name}" for e in entries if e.is_dir())
+        return cls(ids, folders)
+
+    def allocate(self, brand_id, car_name, chilometraggio, anno, now=None):
+        """
+        Restituisce (car_id, folder_name) liberi e li segna come usati.
+        """
+        base = base_car_id(brand_id, car_name, chilometraggio, anno, now)
+        n = self._next_suffix.get(base, 0)
+        while True:
+            car_id = base + _suffix(n)
+            folder = folder_name_for(brand_id, car_name, car_id)
+            if car_id not in self.used_ids and f"{brand_id}/{folder}" not in self.used_folders:
+                break
+            n += 1
+        self._next_suffix[base] = n + 1
+        self.used_ids.add(car_id)
+        self.used_folders.add(f"{brand_id}/{folder}")
+        return car_id, folder
+
+    def allocate_many(self, cars, now=None):
+        """
+        Assegna gli id a un lotto di auto.
+
+        Args:
+            cars: lista di dict con brand_id, name, chilometraggio, anno
+
+        Returns:
+            lista di (car_id, folder_name) nello stesso ordine
+        """
+        now = now or datetime.now()
+        return [
+            self.allocate(c['brand_id'], c['name'], c['chilometraggio'], c['anno'], now)
+            for c in cars
+        ]
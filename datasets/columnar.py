@@ -0,0 +1,201 @@
+"""
+Step di build: codifica a colonne del catalogo pubblicato.
+
+In dataset.json ogni auto ripete i nomi dei campi (chilometraggio,
+neopatentati, tipo_cambio, ...) e stringhe lunghe come le etichette dei
+carburanti ibridi. La codifica a colonne scrive ogni campo una sola volta:
+
+    str     lista di stringhe
+    dict    dizionario dei valori distinti + indici (campi a bassa cardinalità:
+            carburante, euro, condizioni, tipo_cambio, brand, ...)
+    int     numeri interi in un array tipizzato (u8/u16/i32) codificato in base64
+    f64     numeri con decimali (Float64, base64)
+    bool    u8 0/1
+    paths   gallery: cartella + nomi dei file
+    records liste di oggetti con le stesse chiavi (gallery_meta): chiavi una
+            volta sola, poi solo i valori
+    json    qualsiasi altro valore
+
+Gli array tipizzati sono little-endian (come Uint8Array/Int32Array in tutti i
+browser). Le righe in cui un campo manca sono elencate in "missing". Il file
+viene verificato decodificandolo di nuovo prima di pubblicarlo; il decoder per
+il browser è scripts/modules/columnar.js e produce gli stessi oggetti di
+dataset.json. Il file viene pubblicato come datasets/dataset.columns.<hash>.json
+ed elencato nel manifest e nel puntatore di versione.
+"""
+import base64
+import json
+import posixpath
+import sys
+from array import array
+
+import fingerprint
+
+FORMAT = "columns/1"
+DATASET_FILE = "datasets/dataset.json"
+COLUMNS_FILE = "datasets/dataset.columns.json"
+
+# Codificati sempre con dizionario; gli altri testi solo se i valori distinti sono pochi
+DICTIONARY_FIELDS = {"brand", "carburante", "euro", "condizioni", "tipo_cambio", "neopatentati"}
+MAX_DICTIONARY_RATIO = 0.5
+
+_INT_TYPES = (("u8", 'B', 0, 0xFF), ("u16", 'H', 0, 0xFFFF), ("i32", 'i', -2 ** 31, 2 ** 31 - 1))
+_ARRAY_CODES = {"u8": 'B', "u16": 'H', "i32": 'i', "f64": 'd'}
+
+
+def _pack(values, kind):
+    data = array(_ARRAY_CODES[kind], values)
+    if data.itemsize > 1 and sys.byteorder == 'big':
+        data.byteswap()  # sempre little-endian
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def _unpack(text, kind):
+    data = array(_ARRAY_CODES[kind])
+    data.frombytes(base64.b64decode(text))
+    if data.itemsize > 1 and sys.byteorder == 'big':
+        data.byteswap()
+    return data.tolist()
+
+
+def _int_kind(values):
+    low, high = min(values, default=0), max(values, default=0)
+    for kind, _, kind_low, kind_high in _INT_TYPES:
+        if kind_low <= low and high <= kind_high:
+            return kind
+    return None
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _common_dir(paths):
+    dirs = {posixpath.dirname(p) for p in paths}
+    return dirs.pop() if len(dirs) == 1 else None
+
+
+def _encode_column(field, values):
+    """values: valori presenti (nell'ordine delle righe) -> dict della colonna"""
+    if all(isinstance(v, bool) for v in values):
+        return {"type": "bool", "data": _pack([int(v) for v in values], "u8")}
+
+    if all(_is_int(v) for v in values) and _int_kind(values):
+        kind = _int_kind(values)
+        return {"type": "int", "kind": kind, "data": _pack(values, kind)}
+
+    if all(_is_int(v) or isinstance(v, float) for v in values) and not any(isinstance(v, bool) for v in values):
+        integral = [int(v) for v in values if float(v).is_integer()]
+        if len(integral) == len(values) and _int_kind(integral):
+            # Prezzi come 3500.0: interi nel file, numeri con la virgola una volta decodificati
+            kind = _int_kind(integral)
+            return {"type": "int", "kind": kind, "float": True, "data": _pack(integral, kind)}
+        return {"type": "f64", "data": _pack([float(v) for v in values], "f64")}
+
+    if all(isinstance(v, str) for v in values):
+        distinct = list(dict.fromkeys(values))
+        if field in DICTIONARY_FIELDS or len(distinct) <= MAX_DICTIONARY_RATIO * len(values):
+            index = {value: n for n, value in enumerate(distinct)}
+            codes = [index[v] for v in values]
+            kind = _int_kind(codes)
+            return {"type": "dict", "values": distinct, "kind": kind, "data": _pack(codes, kind)}
+        return {"type": "str", "values": values}
+
+    if all(isinstance(v, list) and v and all(isinstance(p, str) for p in v) and _common_dir(v) is not None for v in values):
+        return {
+            "type": "paths",
+            "values": [[_common_dir(v), [posixpath.basename(p) for p in v]] for v in values],
+        }
+
+    if all(isinstance(v, list) and all(isinstance(r, dict) for r in v) for v in values):
+        keys = list(dict.fromkeys(key for v in values for r in v for key in r))
+        if all(list(r) == keys for v in values for r in v):
+            return {"type": "records", "keys": keys, "values": [[[r[key] for key in keys] for r in v] for v in values]}
+
+    return {"type": "json", "values": values}
+
+
+def _decode_column(column):
+    kind = column["type"]
+    if kind == "bool":
+        return [bool(v) for v in _unpack(column["data"], "u8")]
+    if kind == "int":
+        values = _unpack(column["data"], column["kind"])
+        return [float(v) for v in values] if column.get("float") else values
+    if kind == "f64":
+        return _unpack(column["data"], "f64")
+    if kind == "dict":
+        distinct = column["values"]
+        return [distinct[code] for code in _unpack(column["data"], column["kind"])]
+    if kind == "paths":
+        return [[f"{folder}/{name}" for name in names] for folder, names in column["values"]]
+    if kind == "records":
+        keys = column["keys"]
+        return [[dict(zip(keys, row)) for row in rows] for rows in column["values"]]
+    return list(column["values"])
+
+
+def encode(data):
+    """dataset.json -> documento a colonne"""
+    brands = []
+    cars = []
+    for brand in data['brands']:
+        meta = {key: value for key, value in brand.items() if key != 'cars'}
+        meta['count'] = len(brand.get('cars', []))
+        brands.append(meta)
+        cars.extend(brand.get('cars', []))
+
+    fields = list(dict.fromkeys(key for car in cars for key in car))
+    columns = {}
+    for field in fields:
+        present = [car[field] for car in cars if field in car]
+        column = _encode_column(field, present)
+        missing = [row for row, car in enumerate(cars) if field not in car]
+        if missing:
+            column["missing"] = missing
+        columns[field] = column
+    return {"format": FORMAT, "count": len(cars), "brands": brands, "fields": fields, "columns": columns}
+
+
+def decode(doc):
+    """Documento a colonne -> stessa struttura di dataset.json"""
+    count = doc["count"]
+    cars = [{} for _ in range(count)]
+    for field in doc["fields"]:
+        column = doc["columns"][field]
+        missing = set(column.get("missing", []))
+        values = iter(_decode_column(column))
+        for row in range(count):
+            if row not in missing:
+                cars[row][field] = next(values)
+
+    brands = []
+    start = 0
+    for meta in doc["brands"]:
+        brand = {key: value for key, value in meta.items() if key != 'count'}
+        brand['cars'] = cars[start:start + meta['count']]
+        start += meta['count']
+        brands.append(brand)
+    return {"brands": brands}
+
+
+def run(out_dir, context):
+    """Scrive la versione a colonne del dataset pubblicato e la aggiunge al manifest"""
+    manifest = context.get("fingerprint")
+    published = manifest["assets"][DATASET_FILE]["file"] if manifest else DATASET_FILE
+    with open(out_dir / published, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    doc = encode(data)
+    if decode(doc) != data:
+        print("Colonne: la decodifica non restituisce il dataset originale, file non pubblicato")
+        return None
+
+    payload = json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    rel = fingerprint.register_asset(out_dir, manifest, COLUMNS_FILE, payload) if manifest else COLUMNS_FILE
+    if not manifest:
+        (out_dir / rel).write_bytes(payload)
+
+    original = (out_dir / published).stat().st_size
+    print(f"Colonne: {doc['count']} auto, {original / 1024:.1f} KB -> {len(payload) / 1024:.1f} KB ({rel})")
+    return {"file": rel, "bytes": len(payload), "original_bytes": original}
@@ -0,0 +1,108 @@
+"""
+Salvataggi raggruppati di dataset.json per l'editor.
+
+Ogni operazione (aggiunta, modifica, rimozione, Annulla/Ripeti) segna il
+dataset come modificato invece di riscriverlo subito: il salvataggio parte
+COMMIT_DELAY_MS dopo l'ultima modifica, così una serie di modifiche ravvicinate
+(es. 20 prezzi) diventa una sola scrittura. Per non tenere modifiche in memoria
+troppo a lungo durante una sessione continua, il salvataggio parte comunque
+entro COMMIT_MAX_DELAY_MS dalla prima modifica non salvata. flush() salva
+subito (Salva ora, chiusura della finestra, operazioni che devono essere su
+disco prima di proseguire).
+
+Lo scheduler non dipende da Tk: riceve le funzioni per programmare e annullare
+un timer (root.after / root.after_cancel), così il salvataggio gira nel ciclo
+degli eventi quando la finestra è libera.
+
+Il salvataggio non è in un thread separato: validazione, unione con le
+modifiche di altri operatori (con la finestra dei conflitti) e aumento dei
+rev leggono e modificano il dataset in memoria che l'interfaccia sta usando.
+La finestra resta quindi ferma per la durata di una scrittura (circa 200 ms
+con 10.000 auto in benchmarks.py), ma una volta per gruppo di modifiche e
+dopo COMMIT_DELAY_MS di inattività, invece che a ogni modifica.
+"""
+import time
+
+COMMIT_DELAY_MS = 3000
+COMMIT_MAX_DELAY_MS = 30000
+
+
+class CommitScheduler:
+    """Raggruppa le richieste di salvataggio e le esegue dopo una pausa"""
+
+    def __init__(self, write, schedule, cancel, delay_ms=COMMIT_DELAY_MS, max_delay_ms=COMMIT_MAX_DELAY_MS, on_change=None):
+        """
+        Args:
+            write: funzione senza argomenti che salva; True se il salvataggio è riuscito
+            schedule: funzione (ms, callback) -> identificativo del timer
+            cancel: funzione (identificativo) che annulla il timer
+            on_change: chiamata quando cambia lo stato (modifiche in attesa, salvataggio fallito)
+        """
+        self.write = write
+        self.schedule = schedule
+        self.cancel = cancel
+        self.delay_ms = delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.on_change = on_change
+        self.pending = 0          # modifiche non ancora su disco
+        self.failed = False       # l'ultimo salvataggio è stato annullato o è fallito
+        self._first_change = None
+        self._timer = None
+
+    @property
+    def dirty(self):
+        return self.pending > 0
+
+    def mark_dirty(self):
+        """Registra una modifica e (ri)programma il salvataggio"""
+        now = time.monotonic()
+        if not self.pending:
+            self._first_change = now
+        self.pending += 1
+        waited_ms = (now - self._first_change) * 1000
+        self._reschedule(max(0, min(self.delay_ms, self.max_delay_ms - waited_ms)))
+        self._notify()
+
+    def flush(self):
+        """Salva subito le modifiche in attesa. Restituisce True se sul disco non resta nulla da salvare"""
+        self._cancel_timer()
+        if not self.pending:
+            return True
+        saved = self.write()
+        if saved:
+            self.pending = 0
+            self._first_change = None
+        # Un salvataggio annullato non viene ripetuto da solo: riparte alla prossima modifica o con flush()
+        self.failed = not saved
+        self._notify()
+        return saved
+
+    def retract(self):
+        """
+        Toglie una modifica annullata prima di arrivare su disco (es. operazione
+        riportata indietro dopo un salvataggio rifiutato): se non ne restano altre
+        non c'è più nulla da salvare né da segnalare come fallito.
+        """
+        self.pending = max(0, self.pending - 1)
+        if not self.pending:
+            self._cancel_timer()
+            self._first_change = None
+            self.failed = False
+        self._notify()
+
+    def _reschedule(self, delay_ms):
+        self._cancel_timer()
+        self._timer = self.schedule(int(delay_ms), self._on_timer)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self.cancel(self._timer)
+            self._timer = None
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def _notify(self):
+        if self.on_change:
+            self.on_change()
@@ -0,0 +1,424 @@
+"""
+Step di build: bundle, minificazione e CSS critico per ogni pagina.
+
+Per ogni pagina HTML:
+1. legge i <link rel="stylesheet"> locali nell'ordine in cui compaiono
+   (risolvendo anche gli @import), e li concatena in un unico file
+   styles/bundle-<pagina>.css minificato;
+2. elimina le regole i cui selettori usano classi o id che non compaiono in
+   nessuna pagina, modulo JS o nel dataset;
+3. inserisce nella pagina un <style> con il CSS critico (le regole che servono
+   al markup statico della pagina: loader, header, filtri...) e carica il bundle
+   completo in modo asincrono.
+
+Il fingerprint viene eseguito dopo questo step, quindi anche i bundle ricevono
+il loro hash.
+"""
+import posixpath
+import re
+
+import site_refs
+
+STYLE_DIR = "styles"
+
+LINK_RE = re.compile(r'[ \t]*<link\b[^>]*\brel=["\']stylesheet["\'][^>]*>[ \t]*\n?', re.IGNORECASE)
+HREF_RE = re.compile(r'\bhref=["\']([^"\']+)["\']', re.IGNORECASE)
+IMPORT_RE = re.compile(r'@import\s+(?:url\(\s*)?["\']?([^"\')\s;]+)["\']?\s*\)?\s*([^;]*);', re.IGNORECASE)
+URL_RE = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)', re.IGNORECASE)
+WORD_RE = re.compile(r'[A-Za-z_][\w-]*')
+CLASS_ATTR_RE = re.compile(r'\bclass=["\']([^"\']*)["\']', re.IGNORECASE)
+ID_ATTR_RE = re.compile(r'\bid=["\']([^"\']*)["\']', re.IGNORECASE)
+TAG_RE = re.compile(r'<([a-zA-Z][\w-]*)')
+
+# Token dei selettori
+SELECTOR_NAME_RE = re.compile(r'([.#])(-?[A-Za-z_][\w-]*)')
+SELECTOR_TAG_RE = re.compile(r'(?:^|[\s>+~(,])([a-zA-Z][\w-]*)')
+NOT_RE = re.compile(r':not\([^)]*\)')
+ATTRIBUTE_RE = re.compile(r'\[[^\]]*\]')
+PSEUDO_RE = re.compile(r'::?[\w-]+')
+
+# At-rule che contengono altre regole (le altre, es. @keyframes e @font-face, restano intere)
+GROUP_AT_RULES = ("@media", "@supports", "@layer", "@document")
+ALWAYS_PRESENT_TAGS = {"html", "body"}
+
+
+# ---------------------------------------------------------------------------
+# Parsing e minificazione
+# ---------------------------------------------------------------------------
+
+def strip_comments(css):
+    """Rimuove i commenti /* */ senza toccare le stringhe"""
+    out = []
+    i, n = 0, len(css)
+    while i < n:
+        ch = css[i]
+        if ch in '"\'':
+            end = _string_end(css, i)
+            out.append(css[i:end])
+            i = end
+        elif css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+
+def _string_end(css, start):
+    """Indice successivo alla chiusura della stringa che inizia in start"""
+    quote = css[start]
+    i = start + 1
+    while i < len(css):
+        if css[i] == '\\':
+            i += 2
+            continue
+        if css[i] == quote:
+            return i + 1
+        i += 1
+    return len(css)
+
+
+def _find(css, start, targets):
+    """Primo carattere in targets fuori da stringhe e parentesi tonde"""
+    depth = 0
+    i = start
+    while i < len(css):
+        ch = css[i]
+        if ch in '"\'':
+            i = _string_end(css, i)
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth = max(0, depth - 1)
+        elif depth == 0 and ch in targets:
+            return i
+        i += 1
+    return -1
+
+
+def _matching_brace(css, open_index):
+    depth = 0
+    i = open_index
+    while i < len(css):
+        ch = css[i]
+        if ch in '"\'':
+            i = _string_end(css, i)
+            continue
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(css)
+
+
+def parse(css):
+    """
+    Parser minimale: restituisce una lista di nodi
+        ("stmt", testo)                    es. @charset "UTF-8";
+        ("rule", prelude, corpo)           regole normali, @keyframes, @font-face
+        ("group", prelude, [nodi figli])   @media, @supports...
+    I commenti devono essere già stati rimossi.
+    """
+    nodes = []
+    i = 0
+    while i < len(css):
+        j = _find(css, i, '{;}')
+        if j == -1:
+            break
+        if css[j] == '}':
+            # Graffa orfana: la si salta
+            i = j + 1
+            continue
+        prelude = css[i:j].strip()
+        if css[j] == ';':
+            if prelude:
+                nodes.append(("stmt", prelude))
+            i = j + 1
+            continue
+        end = _matching_brace(css, j)
+        body = css[j + 1:end]
+        if prelude.lower().startswith(GROUP_AT_RULES):
+            nodes.append(("group", prelude, parse(body)))
+        else:
+            nodes.append(("rule", prelude, body))
+        i = end + 1
+    return nodes
+
+
+def minify_fragment(css):
+    """Comprime spazi e separatori fuori dalle stringhe"""
+    out = []
+    i, n = 0, len(css)
+    while i < n:
+        ch = css[i]
+        if ch in '"\'':
+            end = _string_end(css, i)
+            out.append(css[i:end])
+            i = end
+            continue
+        if ch.isspace():
+            while i < n and css[i].isspace():
+                i += 1
+            prev = out[-1][-1] if out and out[-1] else ''
+            nxt = css[i] if i < n else ''
+            # Lo spazio è necessario solo tra due token (es. "0 auto", "a .b", "and (")
+            if prev and prev not in '{};,:>' and nxt and nxt not in '{};,>!':
+                out.append(' ')
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def serialize(nodes):
+    """Nodi -> CSS minificato"""
+    parts = []
+    for node in nodes:
+        if node[0] == "stmt":
+            parts.append(minify_fragment(node[1]) + ';')
+        elif node[0] == "rule":
+            body = minify_fragment(node[2]).rstrip(';')
+            if node[1].lower().startswith("@keyframes") or node[1].lower().startswith("@font-face") or body:
+                parts.append(f"{minify_fragment(node[1])}{{{body}}}")
+        else:
+            inner = serialize(node[2])
+            if inner:
+                parts.append(f"{minify_fragment(node[1])}{{{inner}}}")
+    return ''.join(parts)
+
+
+# ---------------------------------------------------------------------------
+# Selettori usati / critici
+# ---------------------------------------------------------------------------
+
+def _selector_parts(selector):
+    """Classi/id e tag richiesti da un selettore (ignora :not(), attributi e pseudo-classi)"""
+    cleaned = NOT_RE.sub('', ATTRIBUTE_RE.sub('', selector))
+    names = SELECTOR_NAME_RE.findall(cleaned)
+    tags = SELECTOR_TAG_RE.findall(PSEUDO_RE.sub(' ', SELECTOR_NAME_RE.sub(' ', cleaned)))
+    return [name for _, name in names], [t.lower() for t in tags]
+
+
+class UsageIndex:
+    """Insieme di parole (classi, id, tag) che compaiono nei sorgenti"""
+
+    def __init__(self, words, tags=None):
+        self.words = set(words)
+        # Parole come "brand-" in 'brand-' + id generano classi dinamiche
+        self.prefixes = tuple(w for w in self.words if w.endswith(('-', '_')) and len(w) > 2)
+        self.tags = tags
+
+    def has_name(self, name):
+        return name in self.words or (bool(self.prefixes) and name.startswith(self.prefixes))
+
+    def matches(self, selector):
+        names, tags = _selector_parts(selector)
+        if not all(self.has_name(n) for n in names):
+            return False
+        if self.tags is not None:
+            return all(t in self.tags or t in ALWAYS_PRESENT_TAGS for t in tags)
+        return True
+
+
+def _split_selectors(prelude):
+    selectors = []
+    start = 0
+    while True:
+        j = _find(prelude, start, ',')
+        if j == -1:
+            selectors.append(prelude[start:].strip())
+            return selectors
+        selectors.append(prelude[start:j].strip())
+        start = j + 1
+
+
+def filter_rules(nodes, index):
+    """Mantiene solo le regole con almeno un selettore soddisfatto da index"""
+    kept = []
+    for node in nodes:
+        if node[0] == "stmt":
+            kept.append(node)
+        elif node[0] == "group":
+            children = filter_rules(node[2], index)
+            if children:
+                kept.append(("group", node[1], children))
+        elif node[1].startswith('@'):
+            kept.append(node)
+        else:
+            selectors = [s for s in _split_selectors(node[1]) if index.matches(s)]
+            if selectors:
+                kept.append(("rule", ','.join(selectors), node[2]))
+    return kept
+
+
+def _used_keyframes(nodes):
+    names = set()
+    for node in nodes:
+        if node[0] == "group":
+            names |= _used_keyframes(node[2])
+        elif node[0] == "rule" and not node[1].startswith('@'):
+            for match in re.finditer(r'animation(?:-name)?\s*:([^;]*)', node[2]):
+                names.update(WORD_RE.findall(match.group(1)))
+    return names
+
+
+def critical_rules(nodes, index):
+    """Regole per il markup statico della pagina, più i @keyframes che usano"""
+    critical = [n for n in filter_rules(nodes, index) if not (n[0] == "rule" and n[1].startswith('@'))]
+    used = _used_keyframes(critical)
+    for node in nodes:
+        if node[0] == "rule" and node[1].lower().startswith("@keyframes"):
+            if node[1].split()[-1] in used:
+                critical.append(node)
+    return critical
+
+
+def collect_used_words(out_dir):
+    """Parole presenti in tutte le pagine, moduli JS e nel dataset pubblicato"""
+    words = set()
+    for pattern in ("*.html", "pages/*.html", "scripts/**/*.js", "datasets/*.json"):
+        for path in out_dir.glob(pattern):
+            words.update(WORD_RE.findall(path.read_text(encoding='utf-8')))
+    return words
+
+
+def static_markup_index(html):
+    """Classi, id e tag del markup statico di una pagina (esclusi script e head)"""
+    body = re.sub(r'<script\b.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    body = re.sub(r'<!--.*?-->', '', body, flags=re.DOTALL)
+    words = set()
+    for value in CLASS_ATTR_RE.findall(body) + ID_ATTR_RE.findall(body):
+        words.update(value.split())
+    tags = {t.lower() for t in TAG_RE.findall(body)}
+    return UsageIndex(words, tags)
+
+
+# ---------------------------------------------------------------------------
+# Bundle
+# ---------------------------------------------------------------------------
+
+def rebase_urls(css, from_dir, to_dir):
+    """Riscrive gli url() relativi di un CSS spostato da from_dir a to_dir"""
+    if from_dir == to_dir:
+        return css
+
+    def _replace(match):
+        quote, ref = match.group(1), match.group(2).strip()
+        if not site_refs.is_local(ref) or ref.startswith(('/', '#')):
+            return match.group(0)
+        target = site_refs.normalize(from_dir, ref)
+        if target is None:
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(target, to_dir or '.')}{quote})"
+
+    return URL_RE.sub(_replace, css)
+
+
+def expand_stylesheet(out_dir, rel_path, external_imports, seen):
+    """Contenuto di un foglio di stile con gli @import locali già risolti (url relativi a styles/)"""
+    if rel_path in seen:
+        return ''
+    seen.add(rel_path)
+    path = out_dir / rel_path
+    if not path.exists():
+        print(f"Foglio di stile non trovato: {rel_path}")
+        return ''
+    css = strip_comments(path.read_text(encoding='utf-8'))
+    own_dir = posixpath.dirname(rel_path)
+
+    def _replace(match):
+        ref, media = match.group(1), match.group(2).strip()
+        if not site_refs.is_local(ref):
+            external_imports.append(match.group(0))
+            return ''
+        target = site_refs.normalize(own_dir, ref)
+        inner = expand_stylesheet(out_dir, target, external_imports, seen) if target else ''
+        return f"@media {media}{{{inner}}}" if media else inner
+
+    css = IMPORT_RE.sub(_replace, css)
+    return rebase_urls(css, own_dir, STYLE_DIR)
+
+
+def page_stylesheets(html, page):
+    """Fogli di stile locali di una pagina: lista di (tag, percorso relativo alla root)"""
+    page_dir = posixpath.dirname(page)
+    found = []
+    for match in LINK_RE.finditer(html):
+        href = HREF_RE.search(match.group(0))
+        if not href or not site_refs.is_local(href.group(1)):
+            continue
+        target = site_refs.normalize(page_dir, href.group(1))
+        if target:
+            found.append((match.group(0), target))
+    return found
+
+
+def bundle_page(out_dir, page, used):
+    """Crea il bundle di una pagina e riscrive i suoi <link>. Restituisce le statistiche"""
+    page_path = out_dir / page
+    html = page_path.read_text(encoding='utf-8')
+    sheets = page_stylesheets(html, page)
+    if not sheets:
+        return None
+
+    original_bytes = sum((out_dir / rel).stat().st_size for _, rel in sheets if (out_dir / rel).exists())
+    external_imports = []
+    seen = set()
+    combined = ''.join(expand_stylesheet(out_dir, rel, external_imports, seen) for _, rel in sheets)
+
+    nodes = parse(combined)
+    pruned = filter_rules(nodes, used)
+    bundle_css = ''.join(minify_fragment(i) for i in external_imports) + serialize(pruned)
+
+    page_dir = posixpath.dirname(page)
+    page_name = posixpath.splitext(posixpath.basename(page))[0]
+    bundle_rel = f"{STYLE_DIR}/bundle-{page_name}.css"
+    (out_dir / bundle_rel).write_text(bundle_css, encoding='utf-8')
+
+    critical = critical_rules(pruned, static_markup_index(html))
+    critical_css = rebase_urls(serialize(critical), STYLE_DIR, page_dir)
+
+    href = posixpath.relpath(bundle_rel, page_dir or '.')
+    replacement = (
+        f'    <style>{critical_css}</style>\n'
+        f'    <link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        f'    <noscript><link rel="stylesheet" href="{href}"></noscript>\n'
+    )
+    first_tag = sheets[0][0]
+    for tag, _ in sheets:
+        html = html.replace(tag, replacement if tag == first_tag else '', 1)
+    page_path.write_text(html, encoding='utf-8')
+
+    return {
+        "stylesheets": [rel for _, rel in sheets],
+        "bundle": bundle_rel,
+        "original_bytes": original_bytes,
+        "bundle_bytes": len(bundle_css.encode('utf-8')),
+        "critical_bytes": len(critical_css.encode('utf-8')),
+    }
+
+
+def run(out_dir, context):
+    """Esegue il bundle CSS per tutte le pagine. Restituisce le statistiche per pagina"""
+    used = UsageIndex(collect_used_words(out_dir))
+    report = {}
+    for page in context.get("pages", []):
+        if not (out_dir / page).exists():
+            continue
+        stats = bundle_page(out_dir, page, used)
+        if stats is None:
+            continue
+        report[page] = stats
+        saved = stats["original_bytes"] - stats["bundle_bytes"]
+        percent = saved / stats["original_bytes"] * 100 if stats["original_bytes"] else 0
+        print(
+            f"CSS {page}: {len(stats['stylesheets'])} file -> 1 bundle, "
+            f"{stats['original_bytes'] / 1024:.1f} KB -> {stats['bundle_bytes'] / 1024:.1f} KB "
+            f"(-{percent:.0f}%), critico inline {stats['critical_bytes'] / 1024:.1f} KB"
+        )
+    return report
@@ -0,0 +1,309 @@
+"""
+Salvataggio di dataset.json con più operatori sulla stessa cartella condivisa.
+
+Ogni auto ha un contatore "rev" che aumenta a ogni salvataggio che la
+modifica. Al caricamento SyncState ricorda, per ogni id, la rev e un'impronta
+del contenuto (la "base"). Al salvataggio, tenendo un file di lock
+(dataset.json.lock) per la sola durata di lettura-unione-scrittura, rilegge il
+file dal disco e unisce auto per auto:
+
+- modificata solo qui (impronta diversa dalla base)    -> vince la nostra, rev + 1
+- modificata solo dall'altro (rev diversa dalla base)   -> vince la sua
+- aggiunte e rimozioni seguono la stessa regola
+- modificata da entrambi in modo diverso                 -> conflitto, lo decide l'operatore
+
+Le modifiche degli altri vengono applicate ai record già in memoria (stessi
+oggetti), così l'interfaccia non deve ricaricare il dataset. pull() fa la
+stessa unione senza scrivere, per aggiornare le liste mentre si lavora.
+"""
+import getpass
+import hashlib
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
+
+REV_FIELD = "rev"
+LOCK_SUFFIX = ".lock"
+# Attesa massima del lock e età oltre la quale un lock è considerato abbandonato
+LOCK_TIMEOUT = 10
+LOCK_STALE_SECONDS = 60
+# Tentativi di salvataggio se il file cambia di nuovo mentre l'operatore risolve i conflitti
+MAX_SAVE_ATTEMPTS = 3
+
+
+def car_digest(car):
+    """Impronta del contenuto di un'auto, esclusa la rev"""
+    content = {key: value for key, value in car.items() if key != REV_FIELD}
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class FileLock:
+    """Lock esclusivo tramite creazione atomica di un file (funziona anche su cartelle sincronizzate)"""
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT, stale_after=LOCK_STALE_SECONDS):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def owner(self):
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        info = json.dumps({
+            "user": getpass.getuser(),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "since": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
+        })
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - self.path.stat().st_mtime > self.stale_after:
+                        print(f"Lock abbandonato rimosso: {self.owner()}")
+                        self.path.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() >= deadline:
+                    owner = self.owner()
+                    raise TimeoutError(
+                        f"Il dataset è in salvataggio da parte di {owner.get('user', '?')}@{owner.get('host', '?')} "
+                        f"(dalle {owner.get('since', '?')}). Riprova tra qualche secondo."
+                    )
+                time.sleep(0.1)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(info)
+            return self
+
+    def __exit__(self, *exc):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        return False
+
+
+class Conflict:
+    """Auto modificata sia da questo operatore sia da un altro"""
+
+    def __init__(self, car_id, mine, theirs):
+        self.car_id = car_id
+        self.mine = mine
+        self.theirs = theirs
+
+    @property
+    def label(self):
+        car = self.mine or self.theirs
+        return f"{car.get('brand', '?')} {car.get('name', '?')} ({self.car_id})"
+
+    @property
+    def description(self):
+        if self.mine is None:
+            return "l'hai rimossa, ma un altro operatore l'ha modificata"
+        if self.theirs is None:
+            return "l'hai modificata, ma un altro operatore l'ha rimossa"
+        fields = sorted(
+            key for key in set(self.mine) | set(self.theirs)
+            if key != REV_FIELD and self.mine.get(key) != self.theirs.get(key)
+        )
+        return f"modificata anche da un altro operatore (campi diversi: {', '.join(fields)})"
+
+
+class MergeResult:
+    def __init__(self):
+        self.conflicts = []     # Conflict non ancora risolti
+        self.remote_changes = 0  # auto aggiunte, modificate o rimosse da altri
+        self.local_changes = set()  # id delle auto modificate qui che vanno scritte con una nuova rev
+        self.written = False
+
+
+def _index(data):
+    """id -> auto"""
+    return {car['id']: car for brand in data.get('brands', []) for car in brand.get('cars', []) if car.get('id')}
+
+
+class SyncState:
+    """Base dell'ultima lettura/scrittura di dataset.json e unione delle modifiche"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + LOCK_SUFFIX)
+        self.base = {}  # id -> (rev, impronta)
+        self.stamp = None
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data, self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _remember(self, data, stamp):
+        self.base = {car_id: (car.get(REV_FIELD, 0), car_digest(car)) for car_id, car in _index(data).items()}
+        self.stamp = stamp
+
+    def load(self):
+        """Legge il dataset e lo usa come base"""
+        data, stamp = self._read()
+        self._remember(data, stamp)
+        return data
+
+    def changed_on_disk(self):
+        return self._stat() != self.stamp
+
+    def merge(self, local, theirs, resolutions=None):
+        """
+        Unisce theirs (il file su disco) in local, modificando local sul posto.
+
+        Args:
+            resolutions: id -> "mine" | "theirs" per i conflitti già decisi
+
+        Returns:
+            MergeResult; le auto in conflitto senza decisione restano come in local
+        """
+        resolutions = resolutions or {}
+        result = MergeResult()
+        local_cars = _index(local)
+        theirs_cars = _index(theirs)
+        decisions = {}
+
+        for car_id in local_cars.keys() | theirs_cars.keys() | self.base.keys():
+            mine = local_cars.get(car_id)
+            other = theirs_cars.get(car_id)
+            base = self.base.get(car_id)
+            if base is None:
+                mine_changed, other_changed = mine is not None, other is not None
+            else:
+                mine_changed = mine is None or car_digest(mine) != base[1]
+                other_changed = other is None or other.get(REV_FIELD, 0) != base[0]
+
+            same = (mine is None and other is None) or (
+                mine is not None and other is not None and car_digest(mine) == car_digest(other)
+            )
+            if not other_changed:
+                decision = "mine"
+            elif not mine_changed or same:
+                decision = "theirs"
+            elif car_id in resolutions:
+                decision = resolutions[car_id]
+            else:
+                decision = "pending"
+                result.conflicts.append(Conflict(car_id, mine, other))
+            decisions[car_id] = decision
+
+            if decision == "theirs" and not same:
+                result.remote_changes += 1
+            if decision == "mine" and mine is not None and mine_changed:
+                result.local_changes.add(car_id)
+                if other is not None:
+                    # La nostra versione deve superare anche la rev scritta dall'altro operatore
+                    mine[REV_FIELD] = max(mine.get(REV_FIELD, 0), other.get(REV_FIELD, 0))
+
+        # Brand e ordine delle auto restano quelli locali; ciò che arriva da altri va in coda
+        local_brands = {brand['id']: brand for brand in local['brands']}
+        for brand in theirs.get('brands', []):
+            if brand['id'] in local_brands:
+                local_brand = local_brands[brand['id']]
+                for key, value in brand.items():
+                    if key != 'cars':
+                        local_brand[key] = value
+            else:
+                local_brands[brand['id']] = dict(brand, cars=[])
+                local['brands'].append(local_brands[brand['id']])
+
+        placed = set()
+        for brand in local['brands']:
+            cars = []
+            for car in brand['cars']:
+                car_id = car.get('id')
+                decision = decisions.get(car_id, "mine")
+                if decision == "theirs":
+                    other = theirs_cars.get(car_id)
+                    if other is None:
+                        continue
+                    car.clear()
+                    car.update(other)
+                cars.append(car)
+                placed.add(car_id)
+            brand['cars'] = cars
+        for brand in theirs.get('brands', []):
+            for car in brand.get('cars', []):
+                if car.get('id') not in placed and decisions.get(car.get('id')) == "theirs":
+                    local_brands[brand['id']]['cars'].append(dict(car))
+        return result
+
+    def pull(self, local):
+        """Applica a local le modifiche fatte da altri (senza scrivere); i conflitti restano per il salvataggio"""
+        theirs, stamp = self._read()
+        result = self.merge(local, theirs)
+        pending = {c.car_id for c in result.conflicts}
+        # La base dei conflitti resta quella vecchia, così il salvataggio li rileva ancora
+        old_base = {car_id: self.base[car_id] for car_id in pending if car_id in self.base}
+        self._remember(theirs, stamp)
+        for car_id in pending:
+            if car_id in old_base:
+                self.base[car_id] = old_base[car_id]
+            else:
+                self.base.pop(car_id, None)
+        return result
+
+    def save(self, local, resolve=None):
+        """
+        Unisce e scrive local su disco tenendo il lock.
+
+        Args:
+            resolve: funzione Conflict -> "mine" | "theirs" | None (None annulla il salvataggio)
+
+        Returns:
+            MergeResult (written=False se il salvataggio è stato annullato)
+        """
+        resolutions = {}
+        for _ in range(MAX_SAVE_ATTEMPTS):
+            with FileLock(self.lock_path):
+                try:
+                    theirs, _ = self._read()
+                except FileNotFoundError:
+                    theirs = {"brands": []}
+                result = self.merge(local, theirs, resolutions)
+                if not result.conflicts:
+                    self._bump_revisions(local, result.local_changes)
+                    self._write(local)
+                    self._remember(local, self._stat())
+                    result.written = True
+                    return result
+            # I conflitti si decidono senza tenere il lock
+            for conflict in result.conflicts:
+                choice = resolve(conflict) if resolve else None
+                if choice is None:
+                    return result
+                resolutions[conflict.car_id] = choice
+        return result
+
+    def _bump_revisions(self, local, car_ids):
+        for car_id, car in _index(local).items():
+            if car_id in car_ids:
+                base_rev = self.base[car_id][0] if car_id in self.base else 0
+                car[REV_FIELD] = max(base_rev, car.get(REV_FIELD, 0)) + 1
+
+    def _write(self, data):
+        """Scrittura atomica: file temporaneo nella stessa cartella e os.replace"""
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,283 @@
+"""
+Step di build: versioni del dataset pubblicato e patch incrementali.
+
+Ogni build in cui il dataset pubblicato (già con i nomi con hash delle
+immagini) è cambiato crea una nuova versione nella cronologia: uno snapshot
+completo e una patch dalla versione precedente con le sole differenze per
+auto (aggiunte, rimosse, campi modificati). Nella cartella di output vengono
+scritti:
+
+    datasets/version.json            puntatore: versione, hash, file completo
+                                     e catena delle ultime MAX_CHAIN patch
+    datasets/versions/<da>-<a>.json  patch (nome dagli hash, quindi immutabili)
+
+Un browser che ha in cache la versione N scarica solo le patch da N
+all'ultima; se la catena è troppo lunga, interrotta o più pesante del file
+completo scarica dataset.json come prima (vedi scripts/modules/api.js).
+
+La cronologia è stato di pubblicazione, non un sorgente: sta fuori dal
+repository (DEFAULT_HISTORY_DIR, oppure build_site.py --versions-dir) e va
+conservata sulla macchina da cui si pubblica. Con una cronologia vuota (primo
+avvio, nuova macchina) la build pubblica la versione 1 senza patch e i
+browser scaricano una volta il file completo.
+"""
+import hashlib
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import fingerprint
+
+DEFAULT_HISTORY_DIR = Path.home() / ".yaraauto" / "dataset-versions"
+PATCHES_DIR = "datasets/versions"
+HISTORY_NAME = "history.json"
+POINTER_NAME = "datasets/version.json"
+DATASET_FILE = "datasets/dataset.json"
+
+# Patch elencate nel puntatore: oltre questo numero il client scarica il file completo
+MAX_CHAIN = 10
+# Snapshot completi conservati nella cronologia (serve solo l'ultimo per la patch successiva)
+KEEP_SNAPSHOTS = 3
+
+
+def canonical_hash(data):
+    """Hash del contenuto indipendente da formattazione e ordine delle chiavi"""
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:fingerprint.HASH_LENGTH]
+
+
+def _brand_meta(brand):
+    return {key: value for key, value in brand.items() if key != 'cars'}
+
+
+def _cars_by_id(data):
+    """id -> (brand_id, auto); None se ci sono auto senza id o id duplicati"""
+    cars = {}
+    for brand in data['brands']:
+        for car in brand.get('cars', []):
+            car_id = car.get('id')
+            if not car_id or car_id in cars:
+                return None
+            cars[car_id] = (brand['id'], car)
+    return cars
+
+
+def apply_patch(data, patch):
+    """Applica una patch a un dataset (stesso algoritmo di applyPatch in api.js)"""
+    old_brands = {b['id']: b for b in data['brands']}
+    if 'brands' in patch:
+        brands = [dict(meta, cars=list(old_brands[meta['id']]['cars']) if meta['id'] in old_brands else [])
+                  for meta in patch['brands']]
+    else:
+        brands = [dict(b, cars=list(b['cars'])) for b in data['brands']]
+    by_id = {b['id']: b for b in brands}
+
+    removed = set(patch.get('removed', []))
+    changes = patch.get('changed', {})
+    for brand in brands:
+        cars = []
+        for car in brand['cars']:
+            if car['id'] in removed:
+                continue
+            change = changes.get(car['id'])
+            if change:
+                car = {key: value for key, value in car.items() if key not in change.get('unset', [])}
+                car.update(change.get('set', {}))
+            cars.append(car)
+        brand['cars'] = cars
+    for entry in patch.get('added', []):
+        by_id[entry['brand']]['cars'].append(entry['car'])
+    for brand_id, order in patch.get('order', {}).items():
+        cars = {car['id']: car for car in by_id[brand_id]['cars']}
+        by_id[brand_id]['cars'] = [cars[car_id] for car_id in order]
+    return dict(data, brands=brands)
+
+
+def diff(old, new):
+    """
+    Patch che trasforma old in new, con le differenze per auto.
+
+    Returns:
+        dict della patch, oppure None se i dataset non sono confrontabili
+        (auto senza id o con id duplicati): in quel caso il client scarica il file completo
+    """
+    old_cars = _cars_by_id(old)
+    new_cars = _cars_by_id(new)
+    if old_cars is None or new_cars is None:
+        return None
+
+    patch = {}
+    old_meta = [_brand_meta(b) for b in old['brands']]
+    new_meta = [_brand_meta(b) for b in new['brands']]
+    if old_meta != new_meta:
+        patch['brands'] = new_meta
+
+    removed = []
+    changed = {}
+    for car_id, (brand_id, car) in old_cars.items():
+        if car_id not in new_cars or new_cars[car_id][0] != brand_id:
+            # Un'auto spostata di brand è una rimozione più un'aggiunta
+            removed.append(car_id)
+            continue
+        new_car = new_cars[car_id][1]
+        if new_car != car:
+            change = {}
+            updated = {key: value for key, value in new_car.items() if car.get(key, object()) != value}
+            unset = [key for key in car if key not in new_car]
+            if updated:
+                change['set'] = updated
+            if unset:
+                change['unset'] = unset
+            changed[car_id] = change
+    added = [
+        {"brand": brand_id, "car": car}
+        for car_id, (brand_id, car) in new_cars.items()
+        if car_id not in old_cars or old_cars[car_id][0] != brand_id
+    ]
+    if removed:
+        patch['removed'] = removed
+    if changed:
+        patch['changed'] = changed
+    if added:
+        patch['added'] = added
+
+    # Ordine delle auto solo per i brand in cui non coincide già
+    result = apply_patch(old, patch)
+    order = {}
+    for brand, expected in zip(result['brands'], new['brands']):
+        ids = [car['id'] for car in expected.get('cars', [])]
+        if [car['id'] for car in brand['cars']] != ids:
+            order[brand['id']] = ids
+    if order:
+        patch['order'] = order
+        result = apply_patch(old, patch)
+    if canonical_hash(result) != canonical_hash(new):
+        return None
+    return patch
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data, indent=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    separators = None if indent else (',', ':')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, separators=separators)
+
+
+def _snapshot_name(version):
+    return f"v{version:06d}.json"
+
+
+def _patch_name(from_hash, to_hash):
+    return f"{from_hash}-{to_hash}.json"
+
+
+def record_version(versions_dir, data, now=None):
+    """
+    Registra data come nuova versione se è diverso dall'ultima.
+
+    Returns:
+        la storia delle versioni (lista di dict version, hash, date, patch)
+    """
+    history = _read_json(versions_dir / HISTORY_NAME, [])
+    data_hash = canonical_hash(data)
+    if history and history[-1]['hash'] == data_hash:
+        return history
+
+    entry = {
+        "version": history[-1]['version'] + 1 if history else 1,
+        "hash": data_hash,
+        "date": (now or datetime.now()).strftime("%d-%m-%Y %H:%M:%S"),
+        "patch": None,
+    }
+    if history:
+        previous = _read_json(versions_dir / _snapshot_name(history[-1]['version']))
+        patch = diff(previous, data) if previous else None
+        if patch is not None:
+            patch.update({
+                "from": history[-1]['version'], "to": entry['version'],
+                "from_hash": history[-1]['hash'], "to_hash": data_hash,
+            })
+            entry['patch'] = _patch_name(history[-1]['hash'], data_hash)
+            _write_json(versions_dir / "patches" / entry['patch'], patch)
+    _write_json(versions_dir / _snapshot_name(entry['version']), data)
+    history.append(entry)
+
+    # Pulizia: snapshot e patch non più raggiungibili dal puntatore
+    for old in history[:-KEEP_SNAPSHOTS]:
+        (versions_dir / _snapshot_name(old['version'])).unlink(missing_ok=True)
+    for old in history[:-MAX_CHAIN]:
+        if old['patch']:
+            (versions_dir / "patches" / old['patch']).unlink(missing_ok=True)
+            old['patch'] = None
+    _write_json(versions_dir / HISTORY_NAME, history, indent=2)
+    return history
+
+
+def patch_chain(history):
+    """Ultime patch consecutive (al massimo MAX_CHAIN) che portano all'ultima versione"""
+    chain = []
+    for entry in reversed(history[-MAX_CHAIN:]):
+        if not entry['patch']:
+            break
+        chain.append(entry)
+    return list(reversed(chain))
+
+
+def run(out_dir, context):
+    """Registra la versione del dataset pubblicato e scrive puntatore e patch nell'output"""
+    manifest = context.get("fingerprint") or {}
+    published = manifest.get("assets", {}).get(DATASET_FILE, {}).get("file", DATASET_FILE)
+    data = _read_json(out_dir / published)
+    if data is None:
+        print(f"Versioni: {published} non trovato, nessun puntatore generato")
+        return None
+
+    versions_dir = Path(context.get("versions_dir") or DEFAULT_HISTORY_DIR)
+    history = record_version(versions_dir, data)
+    latest = history[-1]
+
+    patches = []
+    for entry in patch_chain(history):
+        dest = out_dir / PATCHES_DIR / entry['patch']
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(versions_dir / "patches" / entry['patch'], dest)
+        patches.append({
+            "from": entry['version'] - 1,
+            "from_hash": history[history.index(entry) - 1]['hash'],
+            "file": f"versions/{entry['patch']}",
+            "bytes": dest.stat().st_size,
+        })
+
+    # Percorsi relativi a datasets/, la cartella del puntatore
+    pointer = {
+        "version": latest['version'],
+        "hash": latest['hash'],
+        "full": Path(published).name,
+        "full_bytes": (out_dir / published).stat().st_size,
+        "patches": patches,
+    }
+    columns = context.get("columns")
+    if columns:
+        # Stesso contenuto di "full" nella codifica a colonne (columnar.py)
+        pointer["columns"] = Path(columns["file"]).name
+        pointer["columns_bytes"] = columns["bytes"]
+    search = context.get("search")
+    if search:
+        # Indice di ricerca testuale (search_index.py)
+        pointer["search"] = Path(search["file"]).name
+    similar = context.get("similar")
+    if similar:
+        # Auto simili per la scheda di dettaglio (similar_cars.py)
+        pointer["similar"] = Path(similar["file"]).name
+    _write_json(out_dir / POINTER_NAME, pointer, indent=2)
+    print(f"Versioni: dataset v{latest['version']} ({latest['hash']}), {len(patches)} patch pubblicate (cronologia in {versions_dir})")
+    return pointer
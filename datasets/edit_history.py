@@ -0,0 +1,174 @@
+"""
+Annulla / ripeti per le operazioni di CarManagerApp.
+
+Ogni operazione (aggiunta, modifica, rimozione) è un'Action che salva solo i
+record che tocca: la copia di un brand contiene la lista delle sue auto (i
+riferimenti, non le auto), la copia di un'auto i suoi campi. Tutto il resto
+del dataset è condiviso tra le versioni, quindi il costo in memoria e in tempo
+di un passo della storia non dipende dalla dimensione dell'inventario.
+
+Annullare o ripetere scambia il contenuto dei record con la copia salvata:
+gli oggetti restano gli stessi, quindi i riferimenti tenuti dall'interfaccia
+(es. l'auto in modifica) restano validi.
+
+Anche le cartelle e le immagini fanno parte della storia: invece di essere
+eliminate vengono spostate nel cestino (datasets/.trash/, stessa unità, quindi
+uno spostamento costa una rinomina) e tornano al loro posto con Annulla. Il
+cestino viene svuotato delle voci più vecchie di TRASH_RETENTION_DAYS giorni.
+"""
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+TRASH_DIR = Path(__file__).parent / ".trash"
+HISTORY_LIMIT = 50
+TRASH_RETENTION_DAYS = 7
+
+
+def copy_record(record):
+    """Copia di un brand o di un'auto: i campi lista (cars, gallery) vengono copiati, il loro contenuto no"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in record.items()}
+
+
+class Action:
+    """Un passo della storia: record toccati e file spostati"""
+
+    def __init__(self, label, trash_dir=TRASH_DIR, generation=0):
+        self.label = label
+        self.generation = generation
+        self.trash_dir = Path(trash_dir)
+        self._records = {}  # id(record) -> (record, copia dell'altro stato)
+        self._moves = []    # (percorso, percorso nel cestino, presente nel percorso dopo l'azione)
+
+    def touch(self, record, before=None):
+        """
+        Da chiamare prima di modificare un brand o un'auto (basta la prima volta).
+
+        Args:
+            record: dict del brand o dell'auto
+            before: stato precedente se il record è già stato modificato
+                    (es. la gallery cambiata nel form prima di salvare)
+        """
+        if id(record) not in self._records:
+            self._records[id(record)] = (record, copy_record(before if before is not None else record))
+
+    def _trash_path(self, path):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = self.trash_dir / f"{stamp}-{len(self._moves)}-{path.parent.name}-{path.name}"
+        n = 1
+        while target.exists():
+            target = target.with_name(f"{target.name}-{n}")
+            n += 1
+        return target
+
+    def trash(self, path):
+        """Sposta un file o una cartella nel cestino (al posto dell'eliminazione)"""
+        path = Path(path)
+        target = self._trash_path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), str(target))
+        self._moves.append((path, target, False))
+        return target
+
+    def created(self, path):
+        """Registra un file o una cartella creati dall'azione: Annulla li sposta nel cestino"""
+        path = Path(path)
+        self._moves.append((path, self._trash_path(path), True))
+
+    def _swap_records(self):
+        for key, (record, saved) in list(self._records.items()):
+            current = copy_record(record)
+            record.clear()
+            record.update(saved)
+            self._records[key] = (record, current)
+
+    def _move_files(self, undoing):
+        moves = reversed(self._moves) if undoing else self._moves
+        for path, trashed, present_after in moves:
+            # Annullando si torna allo stato precedente l'azione
+            to_trash = present_after if undoing else not present_after
+            src, dest = (path, trashed) if to_trash else (trashed, path)
+            if src.exists():
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(src), str(dest))
+
+    def undo(self):
+        self._swap_records()
+        self._move_files(undoing=True)
+
+    def redo(self):
+        self._swap_records()
+        self._move_files(undoing=False)
+
+
+class EditHistory:
+    """Pile annulla / ripeti"""
+
+    def __init__(self, limit=HISTORY_LIMIT, trash_dir=TRASH_DIR):
+        self.limit = limit
+        self.trash_dir = Path(trash_dir)
+        self.undo_stack = []
+        self.redo_stack = []
+        self.generation = 0
+
+    def begin(self, label):
+        return Action(label, self.trash_dir, self.generation)
+
+    def commit(self, action):
+        """Aggiunge un'azione completata (e salvata) alla storia"""
+        if action.generation != self.generation:
+            # La storia è stata svuotata mentre l'azione era in corso (es. unione con modifiche di altri)
+            return
+        self.undo_stack.append(action)
+        del self.undo_stack[:-self.limit]
+        self.redo_stack.clear()
+
+    def clear(self):
+        """Da chiamare quando il dataset viene ricaricato dal disco: i record salvati non sono più quelli in uso"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.generation += 1
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        action = self.undo_stack.pop()
+        action.undo()
+        self.redo_stack.append(action)
+        return action
+
+    def redo(self):
+        action = self.redo_stack.pop()
+        action.redo()
+        self.undo_stack.append(action)
+        return action
+
+
+def purge_trash(trash_dir=TRASH_DIR, retention_days=TRASH_RETENTION_DAYS):
+    """Elimina definitivamente le voci del cestino più vecchie di retention_days giorni"""
+    trash_dir = Path(trash_dir)
+    if not trash_dir.is_dir():
+        return 0
+    # La data è nel nome: lo spostamento conserva la data di modifica dell'originale
+    limit = datetime.now().timestamp() - retention_days * 86400
+    removed = 0
+    for entry in trash_dir.iterdir():
+        try:
+            trashed_at = datetime.strptime(entry.name[:15], "%Y%m%d-%H%M%S").timestamp()
+        except ValueError:
+            continue
+        if trashed_at >= limit:
+            continue
+        try:
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+            removed += 1
+        except OSError as e:
+            print(f"Errore nella pulizia del cestino ({entry.name}): {e}")
+    return removed
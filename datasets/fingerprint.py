@@ -0,0 +1,174 @@
+"""
+Step di build: fingerprint degli asset tramite hash del contenuto.
+
+Ogni asset (dataset, CSS, moduli JS, immagini) viene rinominato in
+nome.<hash>.ext e tutti i riferimenti in HTML, CSS, JS e nel dataset pubblicato
+vengono aggiornati. Il file asset-manifest.json elenca la corrispondenza tra
+nomi originali e nomi con hash: i file con hash possono essere serviti come
+immutabili, mentre le pagine HTML e il manifest vanno sempre rivalidati.
+"""
+import hashlib
+import json
+import posixpath
+from datetime import datetime
+
+import site_refs
+
+MANIFEST_NAME = "asset-manifest.json"
+HASH_LENGTH = 10
+
+ASSET_DIRS = ("styles", "scripts", "images", "cars", "datasets")
+
+# Asset che possono contenere riferimenti ad altri asset
+TEXT_ASSET_SUFFIXES = {".css", ".js", ".json"}
+
+
+def file_hash(path):
+    """Hash SHA-256 di un file letto a blocchi"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(rel_path, digest):
+    """cars/audi/x/main.jpg -> cars/audi/x/main.<hash>.jpg"""
+    stem, ext = posixpath.splitext(rel_path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def collect_assets(out_dir):
+    """Percorsi (relativi, POSIX) di tutti gli asset da fingerprintare"""
+    assets = set()
+    for dir_name in ASSET_DIRS:
+        base = out_dir / dir_name
+        if not base.exists():
+            continue
+        for path in base.rglob('*'):
+            if path.is_file() and path.suffix.lower() in site_refs.ASSET_SUFFIXES:
+                assets.add(path.relative_to(out_dir).as_posix())
+    return assets
+
+
+def _is_text(rel_path):
+    return posixpath.splitext(rel_path)[1].lower() in TEXT_ASSET_SUFFIXES
+
+
+def dependency_order(out_dir, assets):
+    """
+    Ordina gli asset in modo che ogni file venga dopo quelli che referenzia
+    (l'hash di un CSS/JS dipende dai nomi con hash dei file che contiene).
+    """
+    deps = {}
+    for rel in assets:
+        if _is_text(rel):
+            text = (out_dir / rel).read_text(encoding='utf-8')
+            deps[rel] = site_refs.find_references(text, rel, assets) - {rel}
+        else:
+            deps[rel] = set()
+
+    order = []
+    state = {}  # rel -> "visiting" | "done"
+
+    def visit(rel, chain):
+        if state.get(rel) == "done":
+            return
+        if state.get(rel) == "visiting":
+            raise ValueError(f"Riferimento circolare tra asset: {' -> '.join(chain + [rel])}")
+        state[rel] = "visiting"
+        for dep in sorted(deps[rel]):
+            visit(dep, chain + [rel])
+        state[rel] = "done"
+        order.append(rel)
+
+    for rel in sorted(assets):
+        visit(rel, [])
+    return order
+
+
+def run(out_dir, context):
+    """
+    Rinomina gli asset con il loro hash e riscrive i riferimenti.
+
+    Returns:
+        il manifest (dict) scritto in asset-manifest.json
+    """
+    assets = collect_assets(out_dir)
+    renamed = {}
+    entries = {}
+
+    for rel in dependency_order(out_dir, assets):
+        path = out_dir / rel
+        if _is_text(rel):
+            text = path.read_text(encoding='utf-8')
+            data = site_refs.rewrite_references(text, rel, renamed).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            new_rel = hashed_name(rel, digest)
+            # Scrive un nuovo file invece di modificare quello esistente
+            path.unlink()
+            (out_dir / new_rel).write_bytes(data)
+            size = len(data)
+        else:
+            digest = file_hash(path)
+            new_rel = hashed_name(rel, digest)
+            size = path.stat().st_size
+            path.replace(out_dir / new_rel)
+
+        renamed[rel] = new_rel
+        entries[rel] = {"file": new_rel, "hash": digest[:HASH_LENGTH], "bytes": size}
+
+    for page in context.get("pages", []):
+        page_path = out_dir / page
+        if page_path.exists():
+            text = page_path.read_text(encoding='utf-8')
+            page_path.write_text(site_refs.rewrite_references(text, page, renamed), encoding='utf-8')
+
+    manifest = {
+        "version": None,
+        "generated": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
+        "last_update": _read_last_update(context),
+        "assets": entries,
+    }
+    write_manifest(out_dir, manifest)
+
+    print(f"Fingerprint: {len(entries)} asset, versione {manifest['version']}")
+    return manifest
+
+
+def write_manifest(out_dir, manifest):
+    """Ricalcola la versione dagli hash degli asset e scrive asset-manifest.json"""
+    entries = manifest["assets"]
+    version_source = json.dumps(sorted((k, v["hash"]) for k, v in entries.items()))
+    manifest["version"] = hashlib.sha256(version_source.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+    manifest["assets"] = dict(sorted(entries.items()))
+    with open(out_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def register_asset(out_dir, manifest, rel_path, data):
+    """
+    Aggiunge un asset generato dopo il fingerprint (es. dagli step successivi).
+
+    Args:
+        data: contenuto (bytes), già con i riferimenti ai nomi con hash
+
+    Returns:
+        il percorso con hash del file scritto
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    new_rel = hashed_name(rel_path, digest)
+    (out_dir / new_rel).parent.mkdir(parents=True, exist_ok=True)
+    (out_dir / new_rel).write_bytes(data)
+    manifest["assets"][rel_path] = {"file": new_rel, "hash": digest[:HASH_LENGTH], "bytes": len(data)}
+    write_manifest(out_dir, manifest)
+    return new_rel
+
+
+def _read_last_update(context):
+    """Data dell'ultimo salvataggio del dataset (scritta da gen_id.py)"""
+    last_update_file = context["root"] / "datasets" / "last_update.txt"
+    try:
+        return last_update_file.read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
@@ -1,12 +1,30 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 import os
 import shutil
-import random
+import time
 from datetime import datetime
 from pathlib import Path
-from PIL import Image
+
+import car_ids
+import commit_scheduler
+import dataset_sync
+import edit_history
+import image_meta
+import inventory
+import profiling
+import sold_archive
+import thumbnails
+import validator
+
+# Istante di avvio del processo, per misurare il tempo di apertura della finestra
+STARTUP_T0 = time.perf_counter()
+
+# Righe inserite per volta nelle liste: la finestra resta reattiva anche con migliaia di auto
+LISTBOX_CHUNK_SIZE = 200
+# Ogni quanto controllare se un altro operatore ha salvato il dataset
+SYNC_INTERVAL_MS = 5000
 
 class CarManagerApp:
     def __init__(self, root):
@@ -21,14 +39,30 @@ class CarManagerApp:
         # Usa il percorso assoluto basato sulla posizione dello script
         script_dir = Path(__file__).parent
         self.json_file = script_dir / "dataset.json"
-        self.data = self.load_json()
+        # Unione con i salvataggi di altri operatori sulla stessa cartella
+        self.sync = dataset_sync.SyncState(self.json_file)
+        # Il dataset viene letto dopo che la finestra è visibile (vedi finish_startup)
+        self.data = {"brands": []}
+        self.data_loaded = False
+        self.id_allocator = None
+        self.id_allocator_data = None
+        self.photo_index = None
+        self.listbox_jobs = {}
+        self.history = edit_history.EditHistory()
+        # Le operazioni segnano il dataset come modificato, il salvataggio avviene dopo una pausa
+        self.commits = commit_scheduler.CommitScheduler(
+            self.write_dataset, self.root.after, self.root.after_cancel, on_change=self.update_save_status
+        )
+        self.last_save_note = ""
         
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after_idle(self.finish_startup)
         
+    @profiling.timed()
     def load_json(self):
         try:
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self.sync.load()
         except FileNotFoundError:
             messagebox.showerror("Errore", f"File {self.json_file} non trovato!")
             return {"brands": []}
@@ -48,34 +82,241 @@ class CarManagerApp:
         except Exception as e:
             print(f"Errore nell'aggiornamento di last_update.txt: {str(e)}")
     
+    def schedule_save(self):
+        """Segna il dataset come modificato: viene salvato insieme alle modifiche dei secondi successivi"""
+        self.commits.mark_dirty()
+    
     def save_json(self):
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        """Salva subito il dataset (con le modifiche in attesa). Restituisce False se il salvataggio è stato annullato"""
+        self.commits.mark_dirty()
+        return self.commits.flush()
+    
+    @profiling.timed()
+    def write_dataset(self):
+        """Valida e scrive il dataset. Restituisce False se il salvataggio è stato annullato"""
+        with profiling.span("validate"):
+            report = validator.validate_inventory(self.data, Path(__file__).parent.parent)
+        if report:
+            message = validator.format_report(report, limit=10)
+            if not messagebox.askyesno("Errore di validazione", f"Il dataset contiene errori:\n\n{message}\n\nSalvare comunque?", icon='warning'):
+                return False
+        
+        try:
+            with profiling.span("write_json"):
+                result = self.sync.save(self.data, resolve=self.resolve_conflict)
+        except TimeoutError as e:
+            messagebox.showerror("Dataset occupato", str(e))
+            return False
+        if not result.written:
+            return False
         
         # Aggiorna il file last_update.txt
         self.update_last_update_file()
+        self.sync_edit_revision()
         
-        messagebox.showinfo("Successo", "Dati salvati con successo!")
+        self.last_save_note = f"Salvato alle {datetime.now().strftime('%H:%M:%S')}"
+        if result.remote_changes:
+            self.after_remote_changes()
+            self.last_save_note += f", unite {result.remote_changes} modifiche di altri operatori"
+        return True
+    
+    def sync_edit_revision(self):
+        """
+        Dopo un salvataggio: allinea il rev della copia del form a quello dell'auto
+        se il contenuto non è cambiato. Il salvataggio (raggruppato, quindi spesso
+        dopo save_car_edit) aumenta il rev delle auto modificate: non è una modifica
+        di un altro operatore e non deve far comparire l'avviso "Auto modificata".
+        """
+        car, original = getattr(self, 'current_edit_car', None), getattr(self, 'edit_original', None)
+        if not car or not original:
+            return
+        content = lambda record: {key: value for key, value in record.items() if key != dataset_sync.REV_FIELD}
+        if content(car) == content(original):
+            original[dataset_sync.REV_FIELD] = car.get(dataset_sync.REV_FIELD)
+    
+    def update_save_status(self):
+        """Indicatore delle modifiche non salvate (barra in basso e titolo della finestra)"""
+        if self.commits.dirty:
+            text = f"● {self.commits.pending} modifiche non salvate"
+            if self.commits.failed:
+                text += " - salvataggio annullato, usa File > Salva ora"
+            self.save_status.config(text=text, foreground='#b91c1c')
+            self.root.title("Gestore Auto - JSON Editor *")
+        else:
+            self.save_status.config(text=self.last_save_note or "Tutte le modifiche sono salvate", foreground='')
+            self.root.title("Gestore Auto - JSON Editor")
+    
+    def on_close(self):
+        """Chiusura della finestra: salva le modifiche in attesa prima di uscire"""
+        if not self.commits.flush():
+            if not messagebox.askyesno("Modifiche non salvate", "Il salvataggio non è riuscito.\n\nChiudere comunque perdendo le modifiche?", icon='warning'):
+                return
+        self.root.destroy()
+    
+    def resolve_conflict(self, conflict):
+        """Chiede all'operatore quale versione tenere di un'auto modificata anche da altri"""
+        answer = messagebox.askyesnocancel(
+            "Conflitto",
+            f"{conflict.label}: {conflict.description}.\n\n"
+            "Sì = mantieni la tua versione\nNo = usa la versione dell'altro operatore\nAnnulla = non salvare",
+            icon='warning'
+        )
+        return {True: "mine", False: "theirs"}.get(answer)
+    
+    def check_remote_changes(self):
+        """Applica periodicamente le modifiche salvate da altri operatori"""
+        try:
+            if self.data_loaded and self.sync.changed_on_disk():
+                result = self.sync.pull(self.data)
+                if result.remote_changes:
+                    print(f"Applicate {result.remote_changes} modifiche di altri operatori")
+                    self.after_remote_changes()
+        except (OSError, ValueError) as e:
+            # File in scrittura da un altro operatore: si riprova al prossimo giro
+            print(f"Controllo delle modifiche remote non riuscito: {e}")
+        self.root.after(SYNC_INTERVAL_MS, self.check_remote_changes)
+    
+    def after_remote_changes(self):
+        """Le modifiche di altri non sono nella storia: Annulla non può più tornare indietro in modo sicuro"""
+        self.reset_history()
+        self.refresh_car_lists()
+    
+    def refresh_car_lists(self):
+        """Rifiltra le liste auto dei tab già costruiti"""
+        if hasattr(self, 'edit_cars_listbox'):
+            self.filter_cars_for_edit(None)
+        if hasattr(self, 'cars_listbox'):
+            self.filter_cars_for_removal(None)
+        if hasattr(self, 'archive_listbox'):
+            self.filter_archive(None)
+    
+    def commit_action(self, action):
+        """Aggiunge alla storia un'operazione già applicata al dataset (il salvataggio è raggruppato)"""
+        self.history.commit(action)
+        self.update_history_menu()
+    
+    def reset_history(self):
+        """Svuota la storia (dopo aver ricaricato il dataset dal disco)"""
+        self.history.clear()
+        self.update_history_menu()
+    
+    def update_history_menu(self):
+        """Mostra nel menu quale operazione verrà annullata o ripetuta"""
+        for index, (text, stack) in enumerate((("Annulla", self.history.undo_stack), ("Ripeti", self.history.redo_stack))):
+            label = f"{text}: {stack[-1].label}" if stack else text
+            self.edit_menu.entryconfig(index, label=label, state='normal' if stack else 'disabled')
+    
+    def undo(self):
+        if not self.history.can_undo():
+            return
+        self.history.undo()
+        self.schedule_save()
+        self.after_history_change()
+    
+    def redo(self):
+        if not self.history.can_redo():
+            return
+        self.history.redo()
+        self.schedule_save()
+        self.after_history_change()
+    
+    def after_history_change(self):
+        """Aggiorna menu e liste dopo Annulla / Ripeti; il form di modifica viene svuotato"""
+        self.update_history_menu()
+        if hasattr(self, 'edit_cars_listbox'):
+            self.current_edit_car = None
+            self.current_edit_brand = None
+            self.edit_new_images = []
+            self.edit_images_listbox.delete(0, tk.END)
+            self.refresh_thumbnail_strip()
+        self.refresh_car_lists()
     
     def create_widgets(self):
-        # Notebook per tab
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill='both', expand=True, padx=10, pady=10)
-        
-        # Tab Aggiungi Auto
-        add_frame = ttk.Frame(notebook)
-        notebook.add(add_frame, text="Aggiungi Auto")
-        self.create_add_tab(add_frame)
-        
-        # Tab Modifica Auto
-        edit_frame = ttk.Frame(notebook)
-        notebook.add(edit_frame, text="Modifica Auto")
-        self.create_edit_tab(edit_frame)
-        
-        # Tab Rimuovi Auto
-        remove_frame = ttk.Frame(notebook)
-        notebook.add(remove_frame, text="Rimuovi Auto")
-        self.create_remove_tab(remove_frame)
+        # Menu Modifica con Annulla / Ripeti
+        menubar = tk.Menu(self.root)
+        self.edit_menu = tk.Menu(menubar, tearoff=0)
+        self.edit_menu.add_command(label="Annulla", accelerator="Ctrl+Z", command=self.undo, state='disabled')
+        self.edit_menu.add_command(label="Ripeti", accelerator="Ctrl+Y", command=self.redo, state='disabled')
+        menubar.add_cascade(label="Modifica", menu=self.edit_menu)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Salva ora", accelerator="Ctrl+S", command=self.commits.flush)
+        file_menu.add_separator()
+        file_menu.add_command(label="Esci", command=self.on_close)
+        menubar.insert_cascade(0, label="File", menu=file_menu)
+        self.root.config(menu=menubar)
+        self.root.bind_all('<Control-z>', lambda e: self.undo())
+        self.root.bind_all('<Control-y>', lambda e: self.redo())
+        self.root.bind_all('<Control-s>', lambda e: self.commits.flush())
+        
+        # Stato del salvataggio, sempre visibile in fondo alla finestra
+        self.save_status = ttk.Label(self.root, anchor='w', padding=(10, 2))
+        self.save_status.pack(side='bottom', fill='x')
+        self.update_save_status()
+        
+        # Notebook per tab: ogni tab viene costruito solo quando viene selezionato la prima volta
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        self.tab_builders = {}
+        tabs = [
+            ("Aggiungi Auto", self.create_add_tab),
+            ("Modifica Auto", self.create_edit_tab),
+            ("Rimuovi Auto", self.create_remove_tab),
+            ("Archivio Venduti", self.create_archive_tab),
+        ]
+        for text, builder in tabs:
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text=text)
+            self.tab_builders[str(frame)] = (builder, frame)
+        
+        self.notebook.bind('<<NotebookTabChanged>>', self.build_selected_tab)
+    
+    def build_selected_tab(self, event=None):
+        """Costruisce il tab selezionato se non è ancora stato creato"""
+        if not self.data_loaded:
+            return
+        entry = self.tab_builders.pop(self.notebook.select(), None)
+        if entry:
+            builder, frame = entry
+            builder(frame)
+    
+    def finish_startup(self):
+        """Carica il dataset e costruisce il primo tab dopo che la finestra è stata mostrata"""
+        self.root.update_idletasks()
+        window_ms = (time.perf_counter() - STARTUP_T0) * 1000
+        
+        self.data = self.load_json()
+        self.data_loaded = True
+        self.build_selected_tab()
+        edit_history.purge_trash()
+        self.root.after(SYNC_INTERVAL_MS, self.check_remote_changes)
+        
+        ready_ms = (time.perf_counter() - STARTUP_T0) * 1000
+        profiling.record("startup", int(STARTUP_T0 * 1e9), int(ready_ms * 1e6))
+        print(f"Avvio: finestra visibile in {window_ms:.0f} ms, primo tab pronto in {ready_ms:.0f} ms")
+    
+    def fill_listbox(self, listbox, items):
+        """Riempie una listbox a blocchi durante l'idle, annullando un riempimento precedente ancora in corso"""
+        previous = self.listbox_jobs.pop(str(listbox), None)
+        if previous:
+            self.root.after_cancel(previous)
+        listbox.delete(0, tk.END)
+        items = list(items)
+        
+        def insert_chunk(start):
+            listbox.insert(tk.END, *items[start:start + LISTBOX_CHUNK_SIZE])
+            next_start = start + LISTBOX_CHUNK_SIZE
+            if next_start < len(items):
+                self.listbox_jobs[str(listbox)] = self.root.after_idle(insert_chunk, next_start)
+            else:
+                self.listbox_jobs.pop(str(listbox), None)
+        
+        if items:
+            insert_chunk(0)
+    
+    def car_display_rows(self, search_term=""):
+        """Testo delle righe delle liste auto, filtrato per brand, nome, sotto nome, anno e prezzo"""
+        return inventory.display_rows(self.data, search_term)
     
     def create_add_tab(self, parent):
         # Frame principale con scrollbar
@@ -142,7 +383,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Condizioni:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.condizioni_var = tk.StringVar()
         condizioni_combo = ttk.Combobox(scrollable_frame, textvariable=self.condizioni_var, width=28)
-        condizioni_combo['values'] = ("Usato", "Nuovo", "Usato Ricondizionato", "Buono", "Ottimo", "Eccellente", "Usato Nuovo")
+        condizioni_combo['values'] = validator.CONDIZIONI
         condizioni_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -150,12 +391,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Carburante:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.carburante_var = tk.StringVar()
         carburante_combo = ttk.Combobox(scrollable_frame, textvariable=self.carburante_var, width=28)
-        carburante_combo['values'] = (
-            "Benzina", "Diesel", "GPL", "Mild Hybrid Benzina+Elettrico leggero",
-            "Full Hybrid (HEV) Benzina+Elettrico", "Plug-in Hybrid (PHEV) Benzina+Elettrico con batteria grande",
-            "Plug-in Hybrid (PHEV) Gasolio+Elettrico con batteria grande", "Benzina-GPL",
-            "Benzina-Elettrico-GPL", "Elettrica", "Ibrida"
-        )
+        carburante_combo['values'] = validator.CARBURANTI
         carburante_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -163,7 +399,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Tipo Cambio:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.cambio_var = tk.StringVar()
         cambio_combo = ttk.Combobox(scrollable_frame, textvariable=self.cambio_var, width=28)
-        cambio_combo['values'] = ("Manuale", "Automatico")
+        cambio_combo['values'] = validator.TIPI_CAMBIO
         cambio_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -171,7 +407,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Euro:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.euro_var = tk.StringVar()
         euro_combo = ttk.Combobox(scrollable_frame, textvariable=self.euro_var, width=28)
-        euro_combo['values'] = ("Euro 0", "Euro 1", "Euro 2", "Euro 3", "Euro 4", "Euro 5", "Euro 6", "Euro 6A", "Euro 6B", "Euro 6C", "Euro 6D", "Euro 7")
+        euro_combo['values'] = validator.EURO
         euro_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -179,7 +415,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Neopatentati:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.neopatentati_var = tk.StringVar()
         neopatentati_combo = ttk.Combobox(scrollable_frame, textvariable=self.neopatentati_var, width=28)
-        neopatentati_combo['values'] = ("SI", "NO")
+        neopatentati_combo['values'] = validator.NEOPATENTATI
         neopatentati_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -374,7 +610,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Condizioni:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.edit_condizioni_var = tk.StringVar()
         edit_condizioni_combo = ttk.Combobox(scrollable_frame, textvariable=self.edit_condizioni_var, width=28)
-        edit_condizioni_combo['values'] = ("Usato", "Nuovo", "Usato Ricondizionato", "Buono", "Ottimo", "Eccellente", "Usato Nuovo")
+        edit_condizioni_combo['values'] = validator.CONDIZIONI
         edit_condizioni_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -382,12 +618,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Carburante:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.edit_carburante_var = tk.StringVar()
         edit_carburante_combo = ttk.Combobox(scrollable_frame, textvariable=self.edit_carburante_var, width=28)
-        edit_carburante_combo['values'] = (
-            "Benzina", "Diesel", "GPL", "Mild Hybrid Benzina+Elettrico leggero",
-            "Full Hybrid (HEV) Benzina+Elettrico", "Plug-in Hybrid (PHEV) Benzina+Elettrico con batteria grande",
-            "Plug-in Hybrid (PHEV) Gasolio+Elettrico con batteria grande", "Benzina-GPL",
-            "Benzina-Elettrico-GPL", "Elettrica", "Ibrida"
-        )
+        edit_carburante_combo['values'] = validator.CARBURANTI
         edit_carburante_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -395,7 +626,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Tipo Cambio:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.edit_cambio_var = tk.StringVar()
         edit_cambio_combo = ttk.Combobox(scrollable_frame, textvariable=self.edit_cambio_var, width=28)
-        edit_cambio_combo['values'] = ("Manuale", "Automatico")
+        edit_cambio_combo['values'] = validator.TIPI_CAMBIO
         edit_cambio_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -403,7 +634,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Euro:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.edit_euro_var = tk.StringVar()
         edit_euro_combo = ttk.Combobox(scrollable_frame, textvariable=self.edit_euro_var, width=28)
-        edit_euro_combo['values'] = ("Euro 0", "Euro 1", "Euro 2", "Euro 3", "Euro 4", "Euro 5", "Euro 6", "Euro 6A", "Euro 6B", "Euro 6C", "Euro 6D", "Euro 7")
+        edit_euro_combo['values'] = validator.EURO
         edit_euro_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -411,7 +642,7 @@ class CarManagerApp:
         ttk.Label(scrollable_frame, text="Neopatentati:").grid(row=row, column=0, sticky='w', padx=5, pady=5)
         self.edit_neopatentati_var = tk.StringVar()
         edit_neopatentati_combo = ttk.Combobox(scrollable_frame, textvariable=self.edit_neopatentati_var, width=28)
-        edit_neopatentati_combo['values'] = ("SI", "NO")
+        edit_neopatentati_combo['values'] = validator.NEOPATENTATI
         edit_neopatentati_combo.grid(row=row, column=1, sticky='ew', padx=5, pady=5)
         row += 1
         
@@ -444,6 +675,26 @@ class CarManagerApp:
         images_scrollbar.config(command=self.edit_images_listbox.yview)
         row += 1
         
+        # Anteprime delle immagini (clic su un'anteprima = seleziona la riga nella lista)
+        thumbs_container = ttk.Frame(scrollable_frame)
+        thumbs_container.grid(row=row, column=1, columnspan=2, sticky='ew', padx=5, pady=5)
+        
+        self.thumbs_canvas = tk.Canvas(thumbs_container, height=thumbnails.THUMB_SIZE[1] + 10, highlightthickness=0)
+        thumbs_scrollbar = ttk.Scrollbar(thumbs_container, orient="horizontal", command=self.thumbs_canvas.xview)
+        self.thumbs_canvas.configure(xscrollcommand=thumbs_scrollbar.set)
+        self.thumbs_canvas.pack(fill='x')
+        thumbs_scrollbar.pack(fill='x')
+        
+        self.thumbs_frame = ttk.Frame(self.thumbs_canvas)
+        self.thumbs_canvas.create_window((0, 0), window=self.thumbs_frame, anchor="nw")
+        self.thumbs_frame.bind(
+            "<Configure>",
+            lambda e: self.thumbs_canvas.configure(scrollregion=self.thumbs_canvas.bbox("all"))
+        )
+        self.thumbnail_loader = thumbnails.ThumbnailLoader(self.root)
+        self.thumbnail_loader.prune(Path(__file__).parent.parent)
+        row += 1
+        
         # Bottoni gestione immagini
         buttons_frame = ttk.Frame(scrollable_frame)
         buttons_frame.grid(row=row, column=1, columnspan=2, sticky='w', padx=5, pady=5)
@@ -467,35 +718,27 @@ class CarManagerApp:
         self.current_edit_car = None
         self.current_edit_brand = None
         self.edit_new_images = []  # Nuove immagini da aggiungere
+        self.edit_original = None  # Copia dell'auto prima delle modifiche (per Annulla)
     
     def populate_cars_for_edit(self):
         """Popola la lista con tutte le auto disponibili"""
-        self.edit_cars_listbox.delete(0, tk.END)
-        for brand in self.data['brands']:
-            for car in brand['cars']:
-                display_text = f"{brand['name']} - {car['name']} ({car['anno']}) - {car['chilometraggio']}km - €{car['prezzo']}"
-                self.edit_cars_listbox.insert(tk.END, display_text)
+        self.fill_listbox(self.edit_cars_listbox, self.car_display_rows())
     
     def refresh_edit_list(self):
         """Ricarica i dati dal JSON e aggiorna la lista"""
         self.data = self.load_json()
+        self.reset_history()
         self.edit_search_var.set("")  # Reset ricerca
         self.populate_cars_for_edit()
         messagebox.showinfo("Aggiornato", "Lista aggiornata con successo!")
     
+    @profiling.timed()
     def filter_cars_for_edit(self, event):
         """Filtra le auto in base al testo di ricerca"""
         search_term = self.edit_search_var.get().lower()
-        self.edit_cars_listbox.delete(0, tk.END)
-        
-        for brand in self.data['brands']:
-            for car in brand['cars']:
-                # Cerca in brand, nome, anno, prezzo
-                searchable_text = f"{brand['name']} {car['name']} {car.get('sub_name', '')} {car['anno']} {car['prezzo']}".lower()
-                if search_term in searchable_text:
-                    display_text = f"{brand['name']} - {car['name']} ({car['anno']}) - {car['chilometraggio']}km - €{car['prezzo']}"
-                    self.edit_cars_listbox.insert(tk.END, display_text)
+        self.fill_listbox(self.edit_cars_listbox, self.car_display_rows(search_term))
     
+    @profiling.timed()
     def load_car_for_edit(self, event):
         """Carica i dati dell'auto selezionata nel form di modifica"""
         selection = self.edit_cars_listbox.curselection()
@@ -503,76 +746,67 @@ class CarManagerApp:
             return
         
         # Trova l'auto selezionata
-        selected_index = 0
         search_term = self.edit_search_var.get().lower()
+        brand, _, car = inventory.find_listed_car(self.data, search_term, selection[0])
+        if car is None:
+            return
         
-        for brand in self.data['brands']:
-            for car in brand['cars']:
-                # Se c'è un filtro attivo, salta le auto non corrispondenti
-                if search_term:
-                    searchable_text = f"{brand['name']} {car['name']} {car.get('sub_name', '')} {car['anno']} {car['prezzo']}".lower()
-                    if search_term not in searchable_text:
-                        continue
-                
-                if selected_index == selection[0]:
-                    # Auto trovata!
-                    self.current_edit_car = car
-                    self.current_edit_brand = brand
-                    self.edit_new_images = []
-                    
-                    # Popola il form
-                    self.edit_entries['edit_name'].delete(0, tk.END)
-                    self.edit_entries['edit_name'].insert(0, car['name'])
-                    
-                    self.edit_entries['edit_sub_name'].delete(0, tk.END)
-                    self.edit_entries['edit_sub_name'].insert(0, car.get('sub_name', ''))
-                    
-                    self.edit_entries['edit_details'].delete(0, tk.END)
-                    self.edit_entries['edit_details'].insert(0, car.get('details', ''))
-                    
-                    self.edit_entries['edit_chilometraggio'].delete(0, tk.END)
-                    self.edit_entries['edit_chilometraggio'].insert(0, str(car['chilometraggio']))
-                    
-                    self.edit_entries['edit_anno'].delete(0, tk.END)
-                    self.edit_entries['edit_anno'].insert(0, str(car['anno']))
-                    
-                    self.edit_entries['edit_cilindrata'].delete(0, tk.END)
-                    self.edit_entries['edit_cilindrata'].insert(0, str(car['cilindrata']))
-                    
-                    self.edit_entries['edit_cavalli'].delete(0, tk.END)
-                    self.edit_entries['edit_cavalli'].insert(0, str(car['cavalli']))
-                    
-                    self.edit_entries['edit_kw'].delete(0, tk.END)
-                    self.edit_entries['edit_kw'].insert(0, str(car['kw']))
-                    
-                    self.edit_entries['edit_posti'].delete(0, tk.END)
-                    self.edit_entries['edit_posti'].insert(0, str(car['posti']))
-                    
-                    self.edit_entries['edit_prezzo'].delete(0, tk.END)
-                    self.edit_entries['edit_prezzo'].insert(0, str(car['prezzo']))
-                    
-                    # Dropdowns
-                    self.edit_condizioni_var.set(car.get('condizioni', ''))
-                    self.edit_carburante_var.set(car.get('carburante', ''))
-                    self.edit_cambio_var.set(car.get('tipo_cambio', ''))
-                    self.edit_euro_var.set(car.get('euro', ''))
-                    self.edit_neopatentati_var.set(car.get('neopatentati', ''))
-                    
-                    # Checkboxes
-                    self.edit_venduto_var.set(car.get('venduto', False))
-                    self.edit_aggiunto_var.set(car.get('aggiunto', False))
-                    
-                    # Popola lista immagini
-                    self.edit_images_listbox.delete(0, tk.END)
-                    if 'gallery' in car and car['gallery']:
-                        for i, img_path in enumerate(car['gallery']):
-                            img_name = img_path.split('/')[-1]
-                            prefix = "[PRINCIPALE] " if i == 0 else ""
-                            self.edit_images_listbox.insert(tk.END, f"{prefix}{img_name}")
-                    
-                    return
-                
-                selected_index += 1
+        self.current_edit_car = car
+        self.current_edit_brand = brand
+        self.edit_new_images = []
+        # Stato prima delle modifiche del form (la gallery cambia già prima di salvare)
+        self.edit_original = edit_history.copy_record(car)
+        
+        # Popola il form
+        self.edit_entries['edit_name'].delete(0, tk.END)
+        self.edit_entries['edit_name'].insert(0, car['name'])
+        
+        self.edit_entries['edit_sub_name'].delete(0, tk.END)
+        self.edit_entries['edit_sub_name'].insert(0, car.get('sub_name', ''))
+        
+        self.edit_entries['edit_details'].delete(0, tk.END)
+        self.edit_entries['edit_details'].insert(0, car.get('details', ''))
+        
+        self.edit_entries['edit_chilometraggio'].delete(0, tk.END)
+        self.edit_entries['edit_chilometraggio'].insert(0, str(car['chilometraggio']))
+        
+        self.edit_entries['edit_anno'].delete(0, tk.END)
+        self.edit_entries['edit_anno'].insert(0, str(car['anno']))
+        
+        self.edit_entries['edit_cilindrata'].delete(0, tk.END)
+        self.edit_entries['edit_cilindrata'].insert(0, str(car['cilindrata']))
+        
+        self.edit_entries['edit_cavalli'].delete(0, tk.END)
+        self.edit_entries['edit_cavalli'].insert(0, str(car['cavalli']))
+        
+        self.edit_entries['edit_kw'].delete(0, tk.END)
+        self.edit_entries['edit_kw'].insert(0, str(car['kw']))
+        
+        self.edit_entries['edit_posti'].delete(0, tk.END)
+        self.edit_entries['edit_posti'].insert(0, str(car['posti']))
+        
+        self.edit_entries['edit_prezzo'].delete(0, tk.END)
+        self.edit_entries['edit_prezzo'].insert(0, str(car['prezzo']))
+        
+        # Dropdowns
+        self.edit_condizioni_var.set(car.get('condizioni', ''))
+        self.edit_carburante_var.set(car.get('carburante', ''))
+        self.edit_cambio_var.set(car.get('tipo_cambio', ''))
+        self.edit_euro_var.set(car.get('euro', ''))
+        self.edit_neopatentati_var.set(car.get('neopatentati', ''))
+        
+        # Checkboxes
+        self.edit_venduto_var.set(car.get('venduto', False))
+        self.edit_aggiunto_var.set(car.get('aggiunto', False))
+        
+        # Popola lista immagini
+        self.edit_images_listbox.delete(0, tk.END)
+        if 'gallery' in car and car['gallery']:
+            for i, img_path in enumerate(car['gallery']):
+                img_name = img_path.split('/')[-1]
+                prefix = "[PRINCIPALE] " if i == 0 else ""
+                self.edit_images_listbox.insert(tk.END, f"{prefix}{img_name}")
+        self.refresh_thumbnail_strip()
     
     def add_images_to_edit(self):
         """Aggiunge nuove immagini all'auto in modifica"""
@@ -584,12 +818,14 @@ class CarManagerApp:
             title="Seleziona immagini da aggiungere",
             filetypes=[("Immagini", "*.jpg *.jpeg *.png *.gif *.webp")]
         )
+        file_paths = self.confirm_unique_photos(file_paths)
         
         if file_paths:
             for path in file_paths:
                 self.edit_new_images.append(path)
                 img_name = os.path.basename(path)
                 self.edit_images_listbox.insert(tk.END, f"[NUOVA] {img_name}")
+            self.refresh_thumbnail_strip()
     
     def remove_image_from_edit(self):
         """Rimuove un'immagine selezionata"""
@@ -616,13 +852,15 @@ class CarManagerApp:
         gallery_size = len(self.current_edit_car.get('gallery', []))
         
         if index < gallery_size:
-            # Immagine esistente - rimuovi dalla gallery dell'auto
-            self.current_edit_car['gallery'].pop(index)
+            # Immagine esistente - rimuovi dalla gallery dell'auto (insieme ai suoi metadati)
+            image_meta.pop_gallery_image(self.current_edit_car, index)
         else:
             # Nuova immagine non ancora salvata
             new_image_index = index - gallery_size
             if new_image_index < len(self.edit_new_images):
                 self.edit_new_images.pop(new_image_index)
+        
+        self.refresh_thumbnail_strip()
     
     def set_main_image_edit(self):
         """Imposta l'immagine selezionata come principale (la sposta in prima posizione)"""
@@ -645,10 +883,8 @@ class CarManagerApp:
         gallery_size = len(self.current_edit_car.get('gallery', []))
         
         if index < gallery_size:
-            # Immagine esistente
-            gallery = self.current_edit_car['gallery']
-            selected_img = gallery.pop(index)
-            gallery.insert(0, selected_img)
+            # Immagine esistente (i metadati seguono la foto)
+            image_meta.move_gallery_image(self.current_edit_car, index, 0)
         else:
             # Nuova immagine
             new_image_index = index - gallery_size
@@ -670,14 +906,54 @@ class CarManagerApp:
         for img_path in self.edit_new_images:
             img_name = os.path.basename(img_path)
             self.edit_images_listbox.insert(tk.END, f"[NUOVA] {img_name}")
+        
+        self.refresh_thumbnail_strip()
+    
+    def refresh_thumbnail_strip(self):
+        """Ricostruisce le anteprime dell'auto in modifica, nello stesso ordine della lista immagini"""
+        for child in self.thumbs_frame.winfo_children():
+            child.destroy()
+        self.thumbs_canvas.xview_moveto(0)
+        if not self.current_edit_car:
+            return
+        
+        site_root = Path(__file__).parent.parent
+        paths = [site_root / img_path.replace('../', '', 1) for img_path in self.current_edit_car.get('gallery', [])]
+        paths += [Path(img_path) for img_path in self.edit_new_images]
+        
+        for index, path in enumerate(paths):
+            label = tk.Label(self.thumbs_frame, text="...", relief='solid' if index == 0 else 'flat', borderwidth=1)
+            label.pack(side='left', padx=2)
+            label.bind('<Button-1>', lambda e, i=index: self.select_edit_image(i))
+            
+            def show(image, label=label):
+                if label.winfo_exists():
+                    label.configure(image=image, text="")
+            
+            self.thumbnail_loader.request(path, show)
     
+    def select_edit_image(self, index):
+        """Seleziona nella lista l'immagine corrispondente all'anteprima cliccata"""
+        self.edit_images_listbox.selection_clear(0, tk.END)
+        self.edit_images_listbox.selection_set(index)
+        self.edit_images_listbox.see(index)
+    
+    @profiling.timed()
     def save_car_edit(self):
         """Salva le modifiche all'auto"""
         if not self.current_edit_car or not self.current_edit_brand:
             messagebox.showwarning("Attenzione", "Seleziona prima un'auto da modificare!")
             return
         
+        # Un altro operatore ha salvato questa auto dopo che è stata aperta nel form
+        if self.current_edit_car.get(dataset_sync.REV_FIELD) != self.edit_original.get(dataset_sync.REV_FIELD):
+            if not messagebox.askyesno("Auto modificata", "Un altro operatore ha modificato quest'auto dopo che l'hai aperta.\n\nSovrascrivere le sue modifiche con quelle del form?", icon='warning'):
+                return
+        
         try:
+            action = self.history.begin(f"modifica {self.current_edit_car['name']}")
+            action.touch(self.current_edit_car, before=self.edit_original)
+            
             # Aggiorna dati con formattazione
             self.current_edit_car['name'] = self.edit_entries['edit_name'].get().title()  # Ogni parola con maiuscola
             self.current_edit_car['sub_name'] = self.edit_entries['edit_sub_name'].get().capitalize()  # Prima lettera maiuscola
@@ -695,9 +971,15 @@ class CarManagerApp:
             self.current_edit_car['euro'] = self.edit_euro_var.get()
             self.current_edit_car['neopatentati'] = self.edit_neopatentati_var.get()
             self.current_edit_car['venduto'] = self.edit_venduto_var.get()
+            # Data di vendita, da cui conta il periodo prima dell'archiviazione (sold_archive.py)
+            if not self.current_edit_car['venduto']:
+                self.current_edit_car.pop(sold_archive.SOLD_DATE_FIELD, None)
+            elif not self.edit_original.get('venduto'):
+                self.current_edit_car[sold_archive.SOLD_DATE_FIELD] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
             self.current_edit_car['aggiunto'] = self.edit_aggiunto_var.get()
             
             # Gestione nuove immagini
+            written_images = []
             if self.edit_new_images:
                 # Ottieni la cartella delle immagini dall'immagine esistente
                 if 'image' in self.current_edit_car and self.current_edit_car['image']:
@@ -724,18 +1006,29 @@ class CarManagerApp:
                             # Ottimizza immagine
                             optimized_path = self.optimize_image(str(img_dest))
                             optimized_ext = os.path.splitext(optimized_path)[1]
+                            action.created(optimized_path)
+                            written_images.append(optimized_path)
                             
                             # Aggiungi alla gallery
                             if 'gallery' not in self.current_edit_car:
                                 self.current_edit_car['gallery'] = []
+                            meta = image_meta.aligned_meta(self.current_edit_car)
                             self.current_edit_car['gallery'].append(f"{relative_base}/main{existing_count + i}{optimized_ext}")
+                            if meta is not None:
+                                meta.append(image_meta.read_image_meta(optimized_path))
             
             # Aggiorna l'immagine principale (prima della gallery)
             if 'gallery' in self.current_edit_car and self.current_edit_car['gallery']:
                 self.current_edit_car['image'] = self.current_edit_car['gallery'][0]
+            # Dimensioni e peso delle foto, ricalcolati solo se la lista non è allineata alla gallery
+            image_meta.ensure_gallery_meta(self.current_edit_car)
             
-            # Salva JSON
-            self.save_json()
+            # Salvataggio raggruppato con le modifiche dei secondi successivi
+            self.schedule_save()
+            self.commit_action(action)
+            self.index_photos(written_images)
+            self.edit_original = edit_history.copy_record(self.current_edit_car)
+            self.edit_new_images = []
             
             # Aggiorna lista
             self.populate_cars_for_edit()
@@ -746,23 +1039,19 @@ class CarManagerApp:
             messagebox.showerror("Errore", f"Errore durante il salvataggio: {str(e)}")
     
     def populate_brands(self):
-        self.brand_listbox.delete(0, tk.END)
-        for brand in self.data['brands']:
-            self.brand_listbox.insert(tk.END, brand['name'])
+        self.fill_listbox(self.brand_listbox, (brand['name'] for brand in self.data['brands']))
     
+    @profiling.timed()
     def filter_brands(self, event):
         search_term = self.brand_var.get().lower()
-        self.brand_listbox.delete(0, tk.END)
-        for brand in self.data['brands']:
-            if search_term in brand['name'].lower():
-                self.brand_listbox.insert(tk.END, brand['name'])
+        self.fill_listbox(self.brand_listbox, (b['name'] for b in self.data['brands'] if search_term in b['name'].lower()))
     
     def select_image(self, img_type):
         file_path = filedialog.askopenfilename(
             title="Seleziona immagine",
             filetypes=[("Immagini", "*.jpg *.jpeg *.png *.gif *.webp")]
         )
-        if file_path:
+        if file_path and self.confirm_unique_photos([file_path]):
             if img_type == 'main':
                 self.main_image_path.set(file_path)
     
@@ -771,57 +1060,74 @@ class CarManagerApp:
             title="Seleziona immagini per la galleria",
             filetypes=[("Immagini", "*.jpg *.jpeg *.png *.gif *.webp")]
         )
+        file_paths = self.confirm_unique_photos(file_paths)
         if file_paths:
             self.gallery_paths.extend(file_paths)
             self.gallery_listbox.delete(0, tk.END)
             for path in self.gallery_paths:
                 self.gallery_listbox.insert(tk.END, os.path.basename(path))
     
-    def generate_car_id(self, brand_id, car_name, chilometraggio, anno):
-        # Estrai 3 lettere dal nome
-        name_clean = car_name.lower().replace(" ", "")
-        consonants = [c for c in name_clean if c.isalpha() and c not in 'aeiou']
-        
-        if len(name_clean) == 3:
-            xxx = name_clean[:3]
-        elif len(consonants) >= 3:
-            xxx = ''.join(consonants[:3])
-        elif len(consonants) == 2:
-            # Trova una lettera vicina
-            idx = name_clean.index(consonants[1])
-            if idx + 1 < len(name_clean):
-                xxx = consonants[0] + consonants[1] + name_clean[idx + 1]
-            else:
-                xxx = consonants[0] + consonants[1] + name_clean[0]
-        elif len(consonants) == 1:
-            idx = name_clean.index(consonants[0])
-            if idx + 2 < len(name_clean):
-                xxx = consonants[0] + name_clean[idx + 1] + name_clean[idx + 2]
-            else:
-                xxx = name_clean[:3]
-        else:
-            xxx = name_clean[:3]
-        
-        # ID numerico
-        now = datetime.now()
-        if chilometraggio < 1000:
-            a = 1000 - chilometraggio
-            num_digits = len(str(a))
-            min_val = 10 ** (num_digits - 1)
-            max_val = 10 ** num_digits - 1
-            a = a * (10 ** num_digits) + random.randint(min_val, max_val)
-        else :
-            a = chilometraggio
-        while a > 9999:
-            last_digit = a % 10
-            a = a // 10
-            a += last_digit
-        a = anno * 10 + a
-        
-        id_numerico = str(a) + now.strftime("%m%y")
-        
-        return f"{brand_id}-{xxx}{id_numerico}"
+    def get_id_allocator(self):
+        """Allocatore degli id, ricostruito quando i dati vengono ricaricati"""
+        if self.id_allocator is None or self.id_allocator_data is not self.data:
+            cars_base_path = Path(__file__).parent.parent / "cars"
+            self.id_allocator = car_ids.CarIdAllocator.from_data(self.data, cars_base_path)
+            # Le auto archiviate possono essere ripristinate: i loro id e cartelle restano occupati
+            archived_ids, archived_folders = sold_archive.SoldArchive().reserved()
+            self.id_allocator.used_ids |= archived_ids
+            self.id_allocator.used_folders |= archived_folders
+            self.id_allocator_data = self.data
+        return self.id_allocator
+    
+    def get_photo_index(self):
+        """Indice degli hash delle foto (photo_hashes.py), letto al primo utilizzo"""
+        if self.photo_index is None:
+            # NumPy e Pillow vengono importati al primo utilizzo per non rallentare l'avvio
+            import photo_hashes
+            self.photo_index = photo_hashes.PhotoIndex().load()
+        return self.photo_index
+    
+    @profiling.timed()
+    def confirm_unique_photos(self, file_paths):
+        """
+        Segnala le foto scelte che sono già nell'inventario (anche ridimensionate o ricompresse).
+        
+        Returns:
+            le foto da usare: tutte, oppure senza i doppioni se l'operatore non li vuole
+        """
+        duplicates = {}
+        try:
+            index = self.get_photo_index()
+            for path in file_paths:
+                matches = index.check(path)
+                if matches:
+                    duplicates[path] = matches[0][0]
+        except Exception as e:
+            print(f"Controllo delle foto duplicate non riuscito: {e}")
+            return list(file_paths)
+        if not duplicates:
+            return list(file_paths)
+        
+        import photo_hashes
+        owners = photo_hashes.image_owners(self.data)
+        lines = [f"{os.path.basename(path)} → {owners.get(match, match)}" for path, match in duplicates.items()]
+        if len(lines) > 10:
+            lines = lines[:10] + [f"... e altre {len(lines) - 10}"]
+        if messagebox.askyesno("Foto già presenti", "Queste foto sono già nell'inventario:\n\n" + "\n".join(lines) + "\n\nAggiungerle comunque?", icon='warning'):
+            return list(file_paths)
+        return [path for path in file_paths if path not in duplicates]
+    
+    def index_photos(self, image_paths):
+        """Aggiunge all'indice degli hash le foto appena salvate in cars/"""
+        try:
+            index = self.get_photo_index()
+            for path in image_paths:
+                index.add(Path(path).resolve().relative_to(index.root.resolve()).as_posix())
+            index.save()
+        except Exception as e:
+            print(f"Aggiornamento dell'indice delle foto non riuscito: {e}")
     
+    @profiling.timed()
     def optimize_image(self, image_path, target_size=(1200, 800), quality=85):
         """
         Ottimizza l'immagine:
@@ -838,6 +1144,9 @@ class CarManagerApp:
             Path dell'immagine ottimizzata (stesso percorso, sovrascrive l'originale)
         """
         try:
+            # Pillow viene importato al primo utilizzo per non rallentare l'avvio
+            from PIL import Image
+            
             # Apri immagine
             img = Image.open(image_path)
             
@@ -897,6 +1206,7 @@ class CarManagerApp:
             return image_path  # Ritorna percorso originale in caso di errore
     
     
+    @profiling.timed()
     def add_car(self):
         try:
             # Valida selezione brand
@@ -930,31 +1240,19 @@ class CarManagerApp:
                 "aggiunto": self.aggiunto_var.get()
             }
             
-            # Gestione limite 6 auto con aggiunto=true
+            action = self.history.begin(f"aggiunta {car_data['name']}")
+            
+            # Gestione limite 6 auto con aggiunto=true: il flag passa dalla più vecchia alla nuova
             if car_data['aggiunto']:
-                # Cerca tutte le auto con aggiunto=true in tutti i brand
-                added_cars = []
-                for b in self.data['brands']:
-                    for car in b['cars']:
-                        if car.get('aggiunto', False):
-                            added_cars.append({
-                                'car': car,
-                                'brand': b,
-                                'date_added': car.get('date_added', '01-01-1970 00:00:00')
-                            })
-                
-                # Se ci sono già 6 o più auto con aggiunto=true
-                if len(added_cars) >= 6:
-                    # Ordina per data (dal più recente al più vecchio)
-                    added_cars.sort(key=lambda x: datetime.strptime(x['date_added'], "%d-%m-%Y %H:%M:%S"), reverse=True)
-                    
-                    # Rimuovi aggiunto=true dalla più vecchia (ultima nella lista ordinata)
-                    oldest = added_cars[-1]
-                    oldest['car']['aggiunto'] = False
-                    messagebox.showinfo("Info", f"Rimosso flag 'aggiunto' dall'auto più vecchia: {oldest['car']['name']} ({oldest['car']['anno']}) - Aggiunta il: {oldest['date_added']}")
+                oldest = inventory.oldest_added_car(self.data)
+                if oldest:
+                    _, oldest_car = oldest
+                    action.touch(oldest_car)
+                    oldest_car['aggiunto'] = False
+                    messagebox.showinfo("Info", f"Rimosso flag 'aggiunto' dall'auto più vecchia: {oldest_car['name']} ({oldest_car['anno']}) - Aggiunta il: {oldest_car.get('date_added', '01-01-1970 00:00:00')}")
             
-            # Genera ID
-            car_id = self.generate_car_id(
+            # Genera ID (univoco rispetto al dataset e alle cartelle esistenti)
+            car_id, folder_name = self.get_id_allocator().allocate(
                 brand['id'], 
                 car_data['name'], 
                 car_data['chilometraggio'], 
@@ -965,19 +1263,22 @@ class CarManagerApp:
             # Aggiungi data e ora corrente
             now = datetime.now()
             car_data['date_added'] = now.strftime("%d-%m-%Y %H:%M:%S")
+            if car_data['venduto']:
+                car_data[sold_archive.SOLD_DATE_FIELD] = car_data['date_added']
             
             # Crea cartella e copia immagini
-            id_completo = car_id.split('-')[1]  # Estrae XXXidNumerico (senza il brand_id)
             script_dir = Path(__file__).parent
             cars_base_path = script_dir.parent / "cars"  # g:\YaraAuto_website\yaraauto-website\cars
-            folder_name = f"{car_data['name'].lower().replace(' ', '')}-{id_completo}"
             folder_path = cars_base_path / brand['id'] / folder_name
+            if not folder_path.exists():
+                action.created(folder_path)
             folder_path.mkdir(parents=True, exist_ok=True)
             
             # Percorso relativo base per il JSON (relativo alla root del sito)
             relative_base = f"../cars/{brand['id']}/{folder_name}"
             
             # Copia e ottimizza immagine principale
+            written_images = []
             if self.main_image_path.get():
                 main_img_ext = os.path.splitext(self.main_image_path.get())[1]
                 main_img_dest = folder_path / f"main{main_img_ext}"
@@ -986,6 +1287,7 @@ class CarManagerApp:
                 # Ottimizza immagine a 1200x800
                 optimized_path = self.optimize_image(str(main_img_dest))
                 optimized_ext = os.path.splitext(optimized_path)[1]
+                written_images.append(optimized_path)
                 
                 # Salva percorso relativo nel JSON
                 car_data['image'] = f"{relative_base}/main{optimized_ext}"
@@ -1004,15 +1306,22 @@ class CarManagerApp:
                 # Ottimizza immagine a 1200x800
                 optimized_path = self.optimize_image(str(img_dest))
                 optimized_ext = os.path.splitext(optimized_path)[1]
+                written_images.append(optimized_path)
                 
                 # Salva percorso relativo nel JSON
                 gallery.append(f"{relative_base}/main{i}{optimized_ext}")
             
             car_data['gallery'] = gallery
+            meta = image_meta.gallery_meta(gallery)
+            if meta:
+                car_data[image_meta.META_FIELD] = meta
             
             # Aggiungi al JSON
+            action.touch(brand)
             brand['cars'].append(car_data)
-            self.save_json()
+            self.schedule_save()
+            self.commit_action(action)
+            self.index_photos(written_images)
             
             messagebox.showinfo("Successo", f"Auto aggiunta con ID: {car_id}")
             self.clear_form()
@@ -1036,36 +1345,27 @@ class CarManagerApp:
     
     def populate_cars_for_removal(self):
         """Popola la lista con tutte le auto disponibili per la rimozione"""
-        self.cars_listbox.delete(0, tk.END)
-        for brand in self.data['brands']:
-            for car in brand['cars']:
-                display_text = f"{brand['name']} - {car['name']} ({car['anno']}) - {car['chilometraggio']}km - €{car['prezzo']}"
-                self.cars_listbox.insert(tk.END, display_text)
+        self.fill_listbox(self.cars_listbox, self.car_display_rows())
     
     def refresh_remove_list(self):
         """Ricarica i dati dal JSON e aggiorna la lista"""
         self.data = self.load_json()
+        self.reset_history()
         self.remove_search_var.set("")  # Reset ricerca
         self.populate_cars_for_removal()
         messagebox.showinfo("Aggiornato", "Lista aggiornata con successo!")
     
+    @profiling.timed()
     def filter_cars_for_removal(self, event):
         """Filtra le auto in base al testo di ricerca"""
         search_term = self.remove_search_var.get().lower()
-        self.cars_listbox.delete(0, tk.END)
-        
-        for brand in self.data['brands']:
-            for car in brand['cars']:
-                # Cerca in brand, nome, sub_name, anno, prezzo
-                searchable_text = f"{brand['name']} {car['name']} {car.get('sub_name', '')} {car['anno']} {car['prezzo']}".lower()
-                if search_term in searchable_text:
-                    display_text = f"{brand['name']} - {car['name']} ({car['anno']}) - {car['chilometraggio']}km - €{car['prezzo']}"
-                    self.cars_listbox.insert(tk.END, display_text)
+        self.fill_listbox(self.cars_listbox, self.car_display_rows(search_term))
     
     def load_cars_for_removal(self, event):
         """Funzione legacy - non più utilizzata con la ricerca"""
         pass
     
+    @profiling.timed()
     def remove_car(self):
         selection = self.cars_listbox.curselection()
         if not selection:
@@ -1073,32 +1373,8 @@ class CarManagerApp:
             return
         
         # Trova l'auto selezionata nella lista filtrata
-        selected_index = 0
         search_term = self.remove_search_var.get().lower()
-        
-        target_brand = None
-        target_car = None
-        target_car_index = None
-        
-        for brand in self.data['brands']:
-            for car_idx, car in enumerate(brand['cars']):
-                # Se c'è un filtro attivo, salta le auto non corrispondenti
-                if search_term:
-                    searchable_text = f"{brand['name']} {car['name']} {car.get('sub_name', '')} {car['anno']} {car['prezzo']}".lower()
-                    if search_term not in searchable_text:
-                        continue
-                
-                if selected_index == selection[0]:
-                    # Auto trovata!
-                    target_brand = brand
-                    target_car = car
-                    target_car_index = car_idx
-                    break
-                
-                selected_index += 1
-            
-            if target_car:
-                break
+        target_brand, target_car_index, target_car = inventory.find_listed_car(self.data, search_term, selection[0])
         
         if not target_car or not target_brand:
             messagebox.showerror("Errore", "Auto non trovata!")
@@ -1106,7 +1382,16 @@ class CarManagerApp:
         
         # Conferma
         if messagebox.askyesno("Conferma", f"Vuoi rimuovere {target_car['name']} ({target_car['anno']}) - {target_brand['name']}?"):
-            # Rimuovi cartella immagini se il flag è attivo
+            action = self.history.begin(f"rimozione {target_car['name']}")
+            action.touch(target_brand)
+            target_brand['cars'].pop(target_car_index)
+            # Salvataggio immediato: la cartella va nel cestino solo quando il dataset su disco non la usa più
+            if not self.save_json():
+                target_brand['cars'].insert(target_car_index, target_car)
+                self.commits.retract()
+                return
+            
+            # Sposta la cartella immagini nel cestino se il flag è attivo (Annulla la ripristina)
             if self.DELETE_IMAGE_FOLDERS and 'image' in target_car and target_car['image']:
                 try:
                     # Estrae il percorso della cartella dall'immagine
@@ -1122,13 +1407,12 @@ class CarManagerApp:
                         folder_path = cars_base_path / brand_id / folder_name
                         
                         if folder_path.exists():
-                            shutil.rmtree(folder_path)
-                            print(f"Cartella eliminata: {folder_path}")
+                            with profiling.span("trash"):
+                                trashed = action.trash(folder_path)
+                            print(f"Cartella spostata nel cestino: {trashed}")
                 except Exception as e:
                     messagebox.showwarning("Avviso", f"Errore nell'eliminazione della cartella: {str(e)}")
-            
-            target_brand['cars'].pop(target_car_index)
-            self.save_json()
+            self.commit_action(action)
             
             # Aggiorna la lista
             if search_term:
@@ -1138,7 +1422,110 @@ class CarManagerApp:
             
             messagebox.showinfo("Successo", "Auto rimossa con successo!")
 
+    def create_archive_tab(self, parent):
+        self.sold_archive = sold_archive.SoldArchive()
+        self.archive_rows = []
+        
+        # Archiviazione delle auto vendute da più di N giorni
+        archive_frame = ttk.LabelFrame(parent, text="Archivia auto vendute", padding=10)
+        archive_frame.pack(padx=10, pady=5, fill='x')
+        
+        ttk.Label(archive_frame, text="Vendute da più di").pack(side='left')
+        self.archive_days_var = tk.StringVar(value=str(sold_archive.ARCHIVE_AFTER_DAYS))
+        ttk.Spinbox(archive_frame, from_=0, to=3650, textvariable=self.archive_days_var, width=6).pack(side='left', padx=5)
+        ttk.Label(archive_frame, text="giorni   Foto:").pack(side='left')
+        self.archive_photos_var = tk.StringVar(value="move")
+        ttk.Combobox(archive_frame, textvariable=self.archive_photos_var, values=sold_archive.PHOTO_MODES, state='readonly', width=10).pack(side='left', padx=5)
+        ttk.Button(archive_frame, text="Archivia", command=self.archive_sold_cars).pack(side='left', padx=5)
+        
+        # Ricerca nell'archivio
+        search_frame = ttk.Frame(parent)
+        search_frame.pack(padx=10, pady=5, fill='x')
+        
+        ttk.Label(search_frame, text="Cerca nell'archivio:", font=('Arial', 10, 'bold')).pack(side='left', padx=(0, 5))
+        self.archive_search_var = tk.StringVar()
+        archive_search_entry = ttk.Entry(search_frame, textvariable=self.archive_search_var, width=50)
+        archive_search_entry.pack(side='left', padx=5, fill='x', expand=True)
+        archive_search_entry.bind('<KeyRelease>', self.filter_archive)
+        
+        self.archive_listbox = tk.Listbox(parent, height=15, width=80)
+        self.archive_listbox.pack(padx=10, pady=5, fill='both', expand=True)
+        self.filter_archive(None)
+        
+        ttk.Button(parent, text="Ripristina Auto Selezionata", command=self.restore_archived_car).pack(pady=10)
+    
+    @profiling.timed()
+    def filter_archive(self, event):
+        self.archive_rows = self.sold_archive.search(self.archive_search_var.get().lower())
+        self.fill_listbox(self.archive_listbox, (self.sold_archive.display_text(r) for r in self.archive_rows))
+    
+    @profiling.timed()
+    def archive_sold_cars(self):
+        """Sposta nell'archivio le auto vendute da più dei giorni indicati"""
+        try:
+            days = int(self.archive_days_var.get())
+        except ValueError:
+            messagebox.showerror("Errore", "Numero di giorni non valido!")
+            return
+        photo_mode = self.archive_photos_var.get()
+        cars = sold_archive.due_for_archive(self.data, days)
+        if not cars:
+            messagebox.showinfo("Info", f"Nessuna auto venduta da più di {days} giorni.")
+            return
+        if not messagebox.askyesno("Conferma", f"Archiviare {len(cars)} auto vendute da più di {days} giorni?\n\nLe foto escono dal sito e vanno in datasets/archive/ ({photo_mode})."):
+            return
+        
+        records = self.sold_archive.archive(self.data, cars, photo_mode)
+        if not self.save_json():
+            self.sold_archive.rollback(records, self.data)
+            self.commits.retract()
+            self.filter_archive(None)
+            return
+        errors = self.sold_archive.move_photos(records, photo_mode)
+        # Le auto archiviate non sono più nei brand: Annulla non può riportarle in modo sicuro
+        self.reset_history()
+        self.refresh_car_lists()
+        if errors:
+            messagebox.showwarning("Avviso", "Foto non archiviate:\n" + "\n".join(errors[:10]))
+        messagebox.showinfo("Successo", f"{len(records)} auto archiviate.")
+    
+    @profiling.timed()
+    def restore_archived_car(self):
+        selection = self.archive_listbox.curselection()
+        if not selection:
+            messagebox.showerror("Errore", "Seleziona un'auto da ripristinare!")
+            return
+        record = self.archive_rows[selection[0]]
+        car_id = record['car']['id']
+        try:
+            brand, car = self.sold_archive.restore(self.data, car_id)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Errore", str(e))
+            return
+        sold_archive.refresh_gallery_meta(car)
+        if not self.save_json():
+            self.sold_archive.cancel_restore(self.data, brand, car)
+            self.commits.retract()
+            return
+        self.sold_archive.mark_restored(car_id)
+        self.reset_history()
+        self.refresh_car_lists()
+        messagebox.showinfo("Successo", f"{car['name']} ripristinata in {brand['name']}.")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestore Auto - JSON Editor")
+    parser.add_argument("--profile", nargs='?', const="profile.trace.json", metavar="FILE",
+                        help="registra i tempi delle operazioni e li salva in FILE (formato Chrome trace)")
+    args = parser.parse_args()
+    
+    if args.profile:
+        profiling.enable()
+    
     root = tk.Tk()
     app = CarManagerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    
+    if args.profile:
+        profiling.write_trace(args.profile)
+        print(profiling.format_summary())
+        print(f"Traccia salvata in {args.profile}")
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Dimensioni, peso e formato delle foto della gallery.
+
+Ogni auto può avere, accanto a "gallery", la lista parallela "gallery_meta":
+una voce per foto, nello stesso ordine, con
+
+    {"width": 1200, "height": 800, "bytes": 183422, "format": "jpeg"}
+
+così il sito può riservare lo spazio delle foto prima che arrivino (niente
+spostamenti del layout) e sapere quanto pesano. gen_id.py la aggiorna quando
+scrive, riordina o toglie le foto; per le auto esistenti (o dopo modifiche a
+mano) c'è il backfill, che legge solo l'intestazione dei file (Pillow non
+decodifica i pixel finché non servono) in un pool di thread.
+
+Uso:
+    python datasets/image_meta.py            # completa le voci mancanti o non aggiornate
+    python datasets/image_meta.py --force    # rilegge tutte le foto
+    python datasets/image_meta.py --dry-run  # conta soltanto le auto da aggiornare
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import dataset_sync
+import site_refs
+
+SITE_ROOT = Path(__file__).parent.parent
+DATASET_FILE = Path(__file__).parent / "dataset.json"
+META_FIELD = "gallery_meta"
+META_KEYS = ("width", "height", "bytes", "format")
+
+
+def read_image_meta(path):
+    """Metadati di una foto leggendo solo l'intestazione del file"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        width, height = img.size
+        image_format = (img.format or os.path.splitext(str(path))[1].lstrip('.')).lower()
+    return {"width": width, "height": height, "bytes": os.path.getsize(path), "format": image_format}
+
+
+def image_path(ref, root=SITE_ROOT):
+    """Percorso su disco di una voce della gallery ("../cars/...", relativa a pages/)"""
+    rel = site_refs.normalize("pages", ref)
+    return Path(root) / rel if rel else None
+
+
+def is_current(car, root=SITE_ROOT):
+    """True se gallery_meta ha una voce per foto e i pesi coincidono con i file su disco"""
+    gallery = car.get('gallery') or []
+    meta = car.get(META_FIELD)
+    if not isinstance(meta, list) or len(meta) != len(gallery):
+        return False
+    for ref, entry in zip(gallery, meta):
+        try:
+            if os.path.getsize(image_path(ref, root)) != entry.get('bytes'):
+                return False
+        except (OSError, TypeError):
+            return False
+    return True
+
+
+def gallery_meta(gallery, root=SITE_ROOT):
+    """Metadati di tutte le foto di una gallery (None se una foto non si può leggere)"""
+    paths = [image_path(ref, root) for ref in gallery]
+    if any(path is None for path in paths):
+        return None
+    try:
+        return [read_image_meta(path) for path in paths]
+    except OSError as e:
+        print(f"Impossibile leggere le foto della gallery: {e}")
+        return None
+
+
+def aligned_meta(car):
+    """gallery_meta se ha una voce per foto della gallery, altrimenti None"""
+    meta = car.get(META_FIELD)
+    return meta if isinstance(meta, list) and len(meta) == len(car.get('gallery') or []) else None
+
+
+def pop_gallery_image(car, index):
+    """Toglie una foto dalla gallery insieme alla sua voce in gallery_meta"""
+    meta = aligned_meta(car)
+    ref = car['gallery'].pop(index)
+    if meta is not None:
+        meta.pop(index)
+    else:
+        # Già disallineata: viene ricalcolata al salvataggio (ensure_gallery_meta)
+        car.pop(META_FIELD, None)
+    return ref
+
+
+def move_gallery_image(car, index, position=0):
+    """Sposta una foto della gallery (e la sua voce in gallery_meta) in position"""
+    meta = aligned_meta(car)
+    car['gallery'].insert(position, car['gallery'].pop(index))
+    if meta is not None:
+        meta.insert(position, meta.pop(index))
+    else:
+        car.pop(META_FIELD, None)
+
+
+def ensure_gallery_meta(car, root=SITE_ROOT):
+    """Riallinea gallery_meta alla gallery se le lunghezze non coincidono (es. modifiche a mano)"""
+    gallery = car.get('gallery') or []
+    meta = car.get(META_FIELD)
+    if isinstance(meta, list) and len(meta) == len(gallery):
+        return
+    meta = gallery_meta(gallery, root)
+    if meta is None or not gallery:
+        car.pop(META_FIELD, None)
+    else:
+        car[META_FIELD] = meta
+
+
+def backfill(data, root=SITE_ROOT, workers=8, force=False, dry_run=False):
+    """
+    Completa gallery_meta per tutte le auto, leggendo le foto in parallelo.
+
+    Returns:
+        (auto aggiornate, foto lette, foto non leggibili)
+    """
+    cars = [
+        car for brand in data.get('brands', []) for car in brand.get('cars', [])
+        if car.get('gallery') and (force or not is_current(car, root))
+    ]
+    if dry_run:
+        return len(cars), 0, 0
+
+    jobs = [(car, n, image_path(ref, root)) for car in cars for n, ref in enumerate(car['gallery'])]
+
+    def _read(job):
+        try:
+            return read_image_meta(job[2])
+        except (OSError, TypeError) as e:
+            print(f"Impossibile leggere {job[2]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_read, jobs))
+
+    by_car = {}
+    for (car, n, _), meta in zip(jobs, results):
+        by_car.setdefault(id(car), (car, [None] * len(car['gallery'])))[1][n] = meta
+    updated = 0
+    for car, meta in by_car.values():
+        # Le auto con foto mancanti restano senza metadati: il validatore segnala le foto
+        if None in meta:
+            continue
+        if car.get(META_FIELD) != meta:
+            car[META_FIELD] = meta
+            updated += 1
+    failed = sum(1 for meta in results if meta is None)
+    return updated, len(jobs), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registra dimensioni, peso e formato delle foto della gallery")
+    parser.add_argument("--force", action="store_true", help="rilegge tutte le foto, non solo quelle cambiate")
+    parser.add_argument("--dry-run", action="store_true", help="non modifica dataset.json")
+    parser.add_argument("--workers", type=int, default=8, help="thread per la lettura (default: 8)")
+    args = parser.parse_args()
+
+    sync = dataset_sync.SyncState(DATASET_FILE)
+    data = sync.load()
+    start = time.perf_counter()
+    updated, read, failed = backfill(data, workers=args.workers, force=args.force, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    if args.dry_run:
+        print(f"{updated} auto da aggiornare")
+        return
+    print(f"{read} foto lette in {elapsed:.2f}s, {updated} auto aggiornate, {failed} foto non leggibili")
+    if updated:
+        result = sync.save(data)
+        if not result.written:
+            print("Salvataggio annullato: conflitti con le modifiche di un altro operatore, riprova")
+            return
+        print(f"dataset.json aggiornato ({result.remote_changes} modifiche di altri operatori unite)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Operazioni sull'inventario che non dipendono dall'interfaccia.
+
+Sono le stesse usate da CarManagerApp (gen_id.py) per filtrare le liste,
+trovare l'auto selezionata e mantenere il limite delle auto "aggiunto";
+stando qui possono essere misurate anche senza Tk (vedi benchmarks.py).
+"""
+from datetime import datetime
+
+DATE_FORMAT = "%d-%m-%Y %H:%M:%S"
+# Numero massimo di auto con aggiunto=true (le "nuove arrivate" in home)
+AGGIUNTO_LIMIT = 6
+_EPOCH = "01-01-1970 00:00:00"
+
+
+def searchable_text(brand, car):
+    """Testo in cui cerca la casella di ricerca (già in minuscolo)"""
+    return f"{brand['name']} {car['name']} {car.get('sub_name', '')} {car['anno']} {car['prezzo']}".lower()
+
+
+def display_text(brand, car):
+    """Riga mostrata nelle liste auto"""
+    return f"{brand['name']} - {car['name']} ({car['anno']}) - {car['chilometraggio']}km - €{car['prezzo']}"
+
+
+def iter_cars(data, search_term=""):
+    """(brand, indice nel brand, auto) delle auto che contengono search_term (in minuscolo)"""
+    for brand in data['brands']:
+        for car_index, car in enumerate(brand['cars']):
+            if search_term and search_term not in searchable_text(brand, car):
+                continue
+            yield brand, car_index, car
+
+
+def display_rows(data, search_term=""):
+    """Righe delle liste auto, filtrate per brand, nome, sotto nome, anno e prezzo"""
+    for brand, _, car in iter_cars(data, search_term):
+        yield display_text(brand, car)
+
+
+def find_listed_car(data, search_term, position):
+    """
+    Auto alla riga position della lista filtrata con search_term.
+
+    Returns:
+        (brand, indice nel brand, auto) oppure (None, None, None)
+    """
+    for n, found in enumerate(iter_cars(data, search_term)):
+        if n == position:
+            return found
+    return None, None, None
+
+
+def oldest_added_car(data, limit=AGGIUNTO_LIMIT):
+    """
+    Auto a cui togliere il flag aggiunto prima di aggiungerne un'altra.
+
+    Returns:
+        (brand, auto) della più vecchia tra le auto con aggiunto=true se sono
+        già almeno limit, altrimenti None
+    """
+    count = 0
+    oldest = None
+    oldest_date = None
+    for brand in data['brands']:
+        for car in brand['cars']:
+            if not car.get('aggiunto', False):
+                continue
+            count += 1
+            date_added = datetime.strptime(car.get('date_added', _EPOCH), DATE_FORMAT)
+            # A parità di data vince l'ultima trovata, come nell'ordinamento originale
+            if oldest_date is None or date_added <= oldest_date:
+                oldest, oldest_date = (brand, car), date_added
+    return oldest if count >= limit else None
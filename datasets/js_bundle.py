@@ -0,0 +1,364 @@
+"""
+Step di build: bundle dei moduli ES di ogni pagina in un unico file minificato.
+
+Per ogni <script type="module" src="..."> di una pagina segue il grafo degli
+import statici, concatena i moduli in ordine di dipendenza (ognuno nel proprio
+scope, così i nomi interni non collidono) e scrive scripts/bundle-<pagina>.js.
+Lo script della pagina viene sostituito con il bundle e nell'head viene
+aggiunto un <link rel="modulepreload">. L'hash nel nome del file viene aggiunto
+dallo step di fingerprint.
+
+Supporta le forme usate nel sito: import { a, b as c } from, import * as x from,
+import x from, import 'x', export function/const/let/class, export { ... },
+export default. I sorgenti in scripts/ non vengono modificati.
+"""
+import posixpath
+import re
+
+import site_refs
+
+SCRIPT_DIR = "scripts"
+
+MODULE_SCRIPT_RE = re.compile(
+    r'<script\b[^>]*\btype=["\']module["\'][^>]*\bsrc=["\']([^"\']+)["\'][^>]*>\s*</script>'
+    r'|<script\b[^>]*\bsrc=["\']([^"\']+)["\'][^>]*\btype=["\']module["\'][^>]*>\s*</script>',
+    re.IGNORECASE,
+)
+IMPORT_RE = re.compile(
+    r'^[ \t]*import\s+(?:(?P<clause>[\w$*{}\s,]+?)\s+from\s+)?["\'](?P<spec>[^"\']+)["\'][ \t]*;?',
+    re.MULTILINE,
+)
+EXPORT_DECL_RE = re.compile(
+    r'^([ \t]*)export\s+(?!default\b)((?:async\s+)?function\*?\s+([\w$]+)|(?:const|let|var|class)\s+([\w$]+))',
+    re.MULTILINE,
+)
+EXPORT_LIST_RE = re.compile(r'^[ \t]*export\s*\{([^}]*)\}\s*(from\s*["\'][^"\']+["\'])?\s*;?', re.MULTILINE)
+EXPORT_DEFAULT_RE = re.compile(r'^([ \t]*)export\s+default\s+', re.MULTILINE)
+REEXPORT_ALL_RE = re.compile(r'^[ \t]*export\s*\*', re.MULTILINE)
+DYNAMIC_IMPORT_RE = re.compile(r'(?<![\w$.])import\s*\(')
+
+REGEX_PRECEDING_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PRECEDING_WORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield", "await"}
+
+
+# ---------------------------------------------------------------------------
+# Minificazione (conservativa: rimuove commenti e spazi, mantiene gli a capo per l'ASI)
+# ---------------------------------------------------------------------------
+
+def _is_word(ch):
+    return ch.isalnum() or ch in '_$' or ord(ch) > 127
+
+
+def _skip_string(src, i):
+    quote = src[i]
+    i += 1
+    while i < len(src) and src[i] != quote:
+        if src[i] == '\\':
+            i += 1
+        elif src[i] == '\n':
+            break
+        i += 1
+    return i + 1
+
+
+def _skip_regex(src, i):
+    i += 1
+    in_class = False
+    while i < len(src):
+        ch = src[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            i += 1
+            break
+        elif ch == '\n':
+            break
+        i += 1
+    while i < len(src) and _is_word(src[i]):
+        i += 1
+    return i
+
+
+class _Minifier:
+    def __init__(self, src):
+        self.src = src
+        self.out = []
+        self.pending_newline = False
+
+    def last(self):
+        for part in reversed(self.out):
+            if part:
+                return part[-1]
+        return ''
+
+    def last_word(self):
+        text = ''.join(self.out[-3:])
+        match = re.search(r'([\w$]+)\s*$', text)
+        return match.group(1) if match else ''
+
+    def emit_space(self, had_newline, nxt):
+        prev = self.last()
+        if not prev or not nxt:
+            return
+        if had_newline:
+            if prev in '{[(,;' or nxt in '}]),;.':
+                return
+            self.out.append('\n')
+        elif (_is_word(prev) and _is_word(nxt)) or (prev in '+-' and nxt == prev):
+            self.out.append(' ')
+
+    def code(self, i, stop_on_brace=False):
+        """Minifica codice da i; se stop_on_brace si ferma alla '}' che chiude un ${...}"""
+        src = self.src
+        depth = 0
+        while i < len(src):
+            ch = src[i]
+            if ch.isspace():
+                start = i
+                while i < len(src) and src[i].isspace():
+                    i += 1
+                nxt = src[i] if i < len(src) else ''
+                if src.startswith(('//', '/*'), i):
+                    # Lo spazio viene valutato dopo il commento
+                    self.pending_newline = self.pending_newline or '\n' in src[start:i]
+                    continue
+                self.emit_space(self.pending_newline or '\n' in src[start:i], nxt)
+                self.pending_newline = False
+                continue
+            if src.startswith('//', i):
+                end = src.find('\n', i)
+                i = len(src) if end == -1 else end
+                continue
+            if src.startswith('/*', i):
+                end = src.find('*/', i + 2)
+                i = len(src) if end == -1 else end + 2
+                if not src[i:i + 1].isspace():
+                    self.emit_space(self.pending_newline, src[i:i + 1])
+                    self.pending_newline = False
+                continue
+            if ch in '"\'':
+                end = _skip_string(src, i)
+                self.out.append(src[i:end])
+                i = end
+                continue
+            if ch == '`':
+                i = self.template(i)
+                continue
+            if ch == '/':
+                prev = self.last()
+                if not prev or prev in REGEX_PRECEDING_CHARS or self.last_word() in REGEX_PRECEDING_WORDS:
+                    end = _skip_regex(src, i)
+                    self.out.append(src[i:end])
+                    i = end
+                    continue
+            if stop_on_brace:
+                if ch == '{':
+                    depth += 1
+                elif ch == '}':
+                    if depth == 0:
+                        return i
+                    depth -= 1
+            self.out.append(ch)
+            i += 1
+        return i
+
+    def template(self, i):
+        src = self.src
+        start = i
+        i += 1
+        while i < len(src):
+            ch = src[i]
+            if ch == '\\':
+                i += 2
+                continue
+            if ch == '`':
+                self.out.append(src[start:i + 1])
+                return i + 1
+            if src.startswith('${', i):
+                self.out.append(src[start:i + 2])
+                i = self.code(i + 2, stop_on_brace=True)
+                start = i  # la '}' fa parte del letterale
+                i += 1
+                continue
+            i += 1
+        self.out.append(src[start:])
+        return len(src)
+
+
+def minify_js(source):
+    """Rimuove commenti, indentazione e righe vuote senza toccare stringhe, template e regex"""
+    minifier = _Minifier(source)
+    minifier.code(0)
+    return ''.join(minifier.out).strip() + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Grafo dei moduli
+# ---------------------------------------------------------------------------
+
+def _module_var(rel_path):
+    return "__m_" + re.sub(r'\W', '_', posixpath.splitext(rel_path)[0])
+
+
+def _parse_clause(clause, module_var):
+    """Clausola di import -> dichiarazioni equivalenti sul modulo già valutato"""
+    lines = []
+    clause = clause.strip()
+    named = re.search(r'\{([^}]*)\}', clause)
+    rest = re.sub(r'\{[^}]*\}', '', clause).strip().strip(',').strip()
+    if rest.startswith('*'):
+        lines.append(f"const {rest.split()[-1]} = {module_var};")
+    elif rest:
+        lines.append(f"const {rest} = {module_var}.default;")
+    if named:
+        items = []
+        for item in named.group(1).split(','):
+            parts = item.split()
+            if not parts:
+                continue
+            items.append(f"{parts[0]}: {parts[2]}" if len(parts) == 3 and parts[1] == 'as' else parts[0])
+        lines.append(f"const {{ {', '.join(items)} }} = {module_var};")
+    return ' '.join(lines)
+
+
+def transform_module(source, rel_path, resolve_import):
+    """
+    Converte un modulo in una funzione che restituisce il suo oggetto exports.
+
+    Args:
+        resolve_import: funzione(specifier) -> percorso del modulo importato
+
+    Returns:
+        (codice JS, lista dei moduli importati)
+    """
+    if REEXPORT_ALL_RE.search(source):
+        raise ValueError(f"{rel_path}: 'export *' non è supportato dal bundler")
+    if DYNAMIC_IMPORT_RE.search(source):
+        print(f"Attenzione: {rel_path} usa import() dinamici, i percorsi non vengono riscritti")
+
+    deps = []
+
+    def _replace_import(match):
+        target = resolve_import(match.group('spec'))
+        deps.append(target)
+        clause = match.group('clause')
+        return _parse_clause(clause, _module_var(target)) if clause else ''
+
+    body = IMPORT_RE.sub(_replace_import, source)
+
+    exports = {}
+
+    def _replace_decl(match):
+        name = match.group(3) or match.group(4)
+        exports[name] = name
+        if match.group(2).startswith(('let', 'var')):
+            print(f"Attenzione: {rel_path} esporta '{name}' con let/var: il bundle ne copia il valore iniziale")
+        return match.group(1) + match.group(2)
+
+    body = EXPORT_DECL_RE.sub(_replace_decl, body)
+
+    def _replace_list(match):
+        if match.group(2):
+            raise ValueError(f"{rel_path}: 'export {{...}} from' non è supportato dal bundler")
+        for item in match.group(1).split(','):
+            parts = item.split()
+            if parts:
+                exports[parts[2] if len(parts) == 3 else parts[0]] = parts[0]
+        return ''
+
+    body = EXPORT_LIST_RE.sub(_replace_list, body)
+
+    if EXPORT_DEFAULT_RE.search(body):
+        body = EXPORT_DEFAULT_RE.sub(r'\1const __default = ', body, count=1)
+        exports["default"] = "__default"
+
+    members = ', '.join(name if name == local else f"{name}: {local}" for name, local in exports.items())
+    code = f"const {_module_var(rel_path)} = (() => {{\n{body}\nreturn {{ {members} }};\n}})();\n"
+    return code, deps
+
+
+def bundle_entry(out_dir, entry):
+    """Restituisce (codice del bundle, moduli inclusi in ordine di valutazione)"""
+    order = []
+    codes = {}
+    state = {}
+
+    def visit(rel, chain):
+        if state.get(rel) == "done":
+            return
+        if state.get(rel) == "visiting":
+            raise ValueError(f"Import circolare non supportato: {' -> '.join(chain + [rel])}")
+        state[rel] = "visiting"
+        source = (out_dir / rel).read_text(encoding='utf-8')
+
+        def resolve_import(spec):
+            target = site_refs.normalize(posixpath.dirname(rel), spec) if spec.startswith('.') else None
+            if target is None or not (out_dir / target).exists():
+                raise ValueError(f"{rel}: import non risolvibile '{spec}'")
+            return target
+
+        codes[rel], deps = transform_module(source, rel, resolve_import)
+        for dep in deps:
+            visit(dep, chain + [rel])
+        state[rel] = "done"
+        order.append(rel)
+
+    visit(entry, [])
+    return ''.join(codes[rel] for rel in order), order
+
+
+def run(out_dir, context):
+    """Sostituisce gli script module di ogni pagina con un bundle. Restituisce le statistiche"""
+    report = {}
+    bundled = set()
+    for page in context.get("pages", []):
+        page_path = out_dir / page
+        if not page_path.exists():
+            continue
+        html = page_path.read_text(encoding='utf-8')
+        page_dir = posixpath.dirname(page)
+        page_name = posixpath.splitext(posixpath.basename(page))[0]
+        matches = [m for m in MODULE_SCRIPT_RE.finditer(html) if site_refs.is_local(m.group(1) or m.group(2))]
+
+        preload_tags = []
+        for n, match in enumerate(matches):
+            entry = site_refs.normalize(page_dir, match.group(1) or match.group(2))
+            code, modules = bundle_entry(out_dir, entry)
+            minified = minify_js(code)
+            suffix = f"-{n + 1}" if len(matches) > 1 else ""
+            bundle_rel = f"{SCRIPT_DIR}/bundle-{page_name}{suffix}.js"
+            (out_dir / bundle_rel).write_text(minified, encoding='utf-8')
+            bundled.update(modules)
+
+            href = posixpath.relpath(bundle_rel, page_dir or '.')
+            html = html.replace(match.group(0), f'<script type="module" src="{href}"></script>', 1)
+            preload_tags.append(f'    <link rel="modulepreload" href="{href}">\n')
+
+            original = sum((out_dir / m).stat().st_size for m in modules)
+            report[bundle_rel] = {
+                "page": page,
+                "modules": modules,
+                "original_bytes": original,
+                "bundle_bytes": len(minified.encode('utf-8')),
+            }
+            print(
+                f"JS {page}: {len(modules)} moduli -> {bundle_rel}, "
+                f"{original / 1024:.1f} KB -> {len(minified.encode('utf-8')) / 1024:.1f} KB"
+            )
+
+        if preload_tags:
+            html = html.replace('</head>', ''.join(preload_tags) + '</head>', 1)
+            page_path.write_text(html, encoding='utf-8')
+
+    # I moduli inclusi nei bundle non vengono più richiesti da nessuna pagina
+    for rel in bundled:
+        path = out_dir / rel
+        path.unlink()
+        if not any(path.parent.iterdir()):
+            path.parent.rmdir()
+    return report
@@ -0,0 +1,342 @@
+"""
+Peso delle pagine del sito: byte e richieste di una visita, confrontati con un budget.
+
+Il grafo delle risorse di ogni pagina è ricostruito staticamente:
+
+    HTML      riferimenti locali della pagina (link, script, img, anche negli script inline)
+    CSS       @import e url() dei fogli di stile, ricorsivamente
+    JS        import statici dei moduli; i fetch di file .json contano come dati
+    dati      il dataset che la pagina scarica: version.json + catalogo a colonne
+              (o dataset completo) nel sito pubblicato, datasets/dataset.json nei sorgenti
+    immagini  per le pagine che usano il dataset, i loghi dei brand con auto
+              disponibili e la prima foto di ogni scheda (createCarCard /
+              createImageCarousel), nell'ordine della pagina: prima le aggiunte
+              di recente per prezzo decrescente, poi i brand in ordine alfabetico
+
+Per ogni profilo di dispositivo (PROFILES) l'apertura della pagina conta solo le
+prime schede visibili; "scroll" è la visita completa fino all'ultima scheda.
+Per i file di testo il peso trasferito è stimato con gzip, come lo servono
+GitHub Pages e i CDN. Le risorse esterne (font, Font Awesome) sono elencate ma
+non pesate.
+
+Uso:
+    python datasets/page_weight.py                                 # sorgenti
+    python datasets/page_weight.py --site dist --report peso.json  # sito pubblicato
+    python datasets/page_weight.py --site dist --compare peso-precedente.json --strict
+"""
+import argparse
+import gzip
+import json
+import posixpath
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import css_bundle
+import fingerprint
+import js_bundle
+import site_refs
+
+SITE_ROOT = Path(__file__).parent.parent
+PAGES = ["index.html", "pages/auto.html"]
+DATASET_FILE = "datasets/dataset.json"
+POINTER_FILE = "datasets/version.json"
+
+# Schede visibili all'apertura della pagina per profilo
+PROFILES = {
+    "mobile": {"cards": 2},
+    "desktop": {"cards": 8},
+}
+
+# Budget per pagina e profilo, sull'apertura della pagina: "transfer" (byte
+# trasferiti), "requests", oppure il nome di un tipo di risorsa (byte trasferiti di quel tipo)
+BUDGETS = {
+    "index.html": {
+        "mobile": {"transfer": 400_000, "requests": 25},
+        "desktop": {"transfer": 600_000, "requests": 25},
+    },
+    "pages/auto.html": {
+        "mobile": {"transfer": 800_000, "requests": 40, "js": 80_000},
+        "desktop": {"transfer": 1_500_000, "requests": 50, "js": 80_000},
+    },
+}
+
+TYPES = {
+    ".html": "html", ".css": "css", ".js": "js", ".json": "data",
+    ".webp": "images", ".jpg": "images", ".jpeg": "images", ".png": "images",
+    ".gif": "images", ".svg": "images", ".avif": "images", ".ico": "images",
+}
+COMPRESSED_TYPES = {"html", "css", "js", "data"}
+
+# Resource hint (resource_hints.py, js_bundle.py): anticipano risorse già contate altrove, o
+# solo per alcuni profili (media), quindi non sono richieste della pagina
+HINT_LINK_RE = re.compile(r'<link\b[^>]*\brel=["\'](?:preload|modulepreload|prefetch)["\'][^>]*>', re.IGNORECASE)
+EXTERNAL_SCRIPT_RE = re.compile(r'<(?:script|img)\b[^>]*\bsrc=["\'](https?://[^"\']+)["\']', re.IGNORECASE)
+
+
+def resource_type(rel_path):
+    return TYPES.get(posixpath.splitext(rel_path)[1].lower(), "other")
+
+
+class SiteFiles:
+    """File di un sito (sorgenti o output della build) con peso su disco e trasferito"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.known = fingerprint.collect_assets(self.root) | {p for p in PAGES if (self.root / p).exists()}
+        self._sizes = {}
+
+    def read_text(self, rel_path):
+        return (self.root / rel_path).read_text(encoding='utf-8')
+
+    def sizes(self, rel_path):
+        """(byte su disco, byte trasferiti)"""
+        if rel_path not in self._sizes:
+            data = (self.root / rel_path).read_bytes()
+            transfer = len(gzip.compress(data, 6)) if resource_type(rel_path) in COMPRESSED_TYPES else len(data)
+            self._sizes[rel_path] = (len(data), transfer)
+        return self._sizes[rel_path]
+
+
+def stylesheet_graph(site, rel_path, found):
+    """Aggiunge a found il foglio di stile, i suoi @import e le risorse dei suoi url()"""
+    if rel_path in found or rel_path not in site.known:
+        return
+    found.append(rel_path)
+    css = css_bundle.strip_comments(site.read_text(rel_path))
+    own_dir = posixpath.dirname(rel_path)
+    for match in css_bundle.IMPORT_RE.finditer(css):
+        target = site_refs.normalize(own_dir, match.group(1)) if site_refs.is_local(match.group(1)) else None
+        if target:
+            stylesheet_graph(site, target, found)
+    for match in css_bundle.URL_RE.finditer(css):
+        ref = match.group(2).strip()
+        target = site_refs.normalize(own_dir, ref) if site_refs.is_local(ref) else None
+        if target in site.known and target not in found:
+            found.append(target)
+
+
+def script_graph(site, rel_path, found, data_refs):
+    """Aggiunge a found lo script e i moduli importati; i .json letti dagli script vanno in data_refs"""
+    if rel_path in found or rel_path not in site.known:
+        return
+    found.append(rel_path)
+    source = site.read_text(rel_path)
+    own_dir = posixpath.dirname(rel_path)
+    for match in js_bundle.IMPORT_RE.finditer(source):
+        spec = match.group('spec')
+        target = site_refs.normalize(own_dir, spec) if spec.startswith('.') else None
+        if target:
+            script_graph(site, target, found, data_refs)
+    for target in site_refs.find_references(source, rel_path, site.known):
+        if resource_type(target) == "data":
+            data_refs.add(target)
+        elif resource_type(target) == "images" and target not in found:
+            found.append(target)
+
+
+def dataset_requests(site):
+    """File scaricati da api.js: puntatore + catalogo nel sito pubblicato, dataset.json nei sorgenti"""
+    if POINTER_FILE not in site.known:
+        return [DATASET_FILE] if DATASET_FILE in site.known else [], DATASET_FILE
+    pointer = json.loads(site.read_text(POINTER_FILE))
+    full = posixpath.join("datasets", pointer["full"])
+    catalogue = posixpath.join("datasets", pointer.get("columns") or pointer["full"])
+    return [POINTER_FILE, catalogue], full
+
+
+def card_order(data):
+    """Auto disponibili nell'ordine delle schede della pagina (aggiunte di recente, poi brand A-Z)"""
+    brands = [
+        {**brand, "cars": [car for car in brand.get('cars', []) if car.get('venduto') is not True]}
+        for brand in data.get('brands', [])
+    ]
+    brands = [brand for brand in brands if brand["cars"]]
+    recent = sorted(
+        (car for brand in brands for car in brand["cars"] if car.get('aggiunto') is True),
+        key=lambda car: -(car.get('prezzo') or 0),
+    )
+    ordered = recent + [car for brand in sorted(brands, key=lambda b: b.get('name', '')) for car in brand["cars"]]
+    return brands, ordered
+
+
+def card_image(car):
+    """Foto caricata subito dalla scheda: la prima della gallery nel carosello, altrimenti image"""
+    gallery = car.get('gallery') or []
+    return gallery[0] if len(gallery) > 1 else (car.get('image') or '').strip() or None
+
+
+def dataset_images(site, page, dataset_file):
+    """(loghi dei brand, foto delle schede in ordine di pagina) per il dataset pubblicato"""
+    data = json.loads(site.read_text(dataset_file))
+    page_dir = posixpath.dirname(page)
+    brands, cars = card_order(data)
+
+    def _resolve(ref):
+        target = site_refs.normalize(page_dir, ref) if ref and site_refs.is_local(ref) else None
+        return target if target in site.known else None
+
+    logos = [_resolve(brand.get('logo')) for brand in brands]
+    photos = [_resolve(card_image(car)) for car in cars]
+    return [p for p in logos if p], photos
+
+
+def page_graph(site, page):
+    """
+    Risorse di una pagina.
+
+    Returns:
+        (risorse caricate all'apertura, foto delle schede in ordine di pagina, URL esterni)
+    """
+    html = site.read_text(page)
+    resources = [page]
+    data_refs = set()
+    for target in sorted(site_refs.find_references(HINT_LINK_RE.sub('', html), page, site.known)):
+        kind = resource_type(target)
+        if kind == "css":
+            stylesheet_graph(site, target, resources)
+        elif kind == "js":
+            script_graph(site, target, resources, data_refs)
+        elif kind == "data":
+            data_refs.add(target)
+        elif target not in resources:
+            resources.append(target)
+
+    photos = []
+    if data_refs:
+        requests, dataset_file = dataset_requests(site)
+        resources.extend(r for r in requests if r not in resources)
+        if dataset_file in site.known:
+            logos, photos = dataset_images(site, page, dataset_file)
+            resources.extend(logo for logo in logos if logo not in resources)
+
+    return resources, photos, external_resources(html)
+
+
+def external_resources(html):
+    """URL esterni scaricati dalla pagina (fogli di stile, script, immagini)"""
+    found = set(EXTERNAL_SCRIPT_RE.findall(html))
+    for match in css_bundle.LINK_RE.finditer(html):
+        href = css_bundle.HREF_RE.search(match.group(0))
+        if href and not site_refs.is_local(href.group(1)):
+            found.add(href.group(1))
+    return sorted(found)
+
+
+def _totals(site, paths):
+    totals = {"bytes": 0, "transfer": 0, "requests": len(paths), "types": {}}
+    for path in paths:
+        size, transfer = site.sizes(path)
+        totals["bytes"] += size
+        totals["transfer"] += transfer
+        totals["types"][resource_type(path)] = totals["types"].get(resource_type(path), 0) + transfer
+    return totals
+
+
+def over_budget(totals, budget):
+    """Voci del budget superate: lista di (metrica, valore, limite)"""
+    over = []
+    for metric, limit in budget.items():
+        value = totals[metric] if metric in ("transfer", "requests", "bytes") else totals["types"].get(metric, 0)
+        if value > limit:
+            over.append((metric, value, limit))
+    return over
+
+
+def analyze(root=SITE_ROOT, pages=PAGES, profiles=PROFILES, budgets=BUDGETS):
+    """Report del peso di tutte le pagine per tutti i profili"""
+    site = SiteFiles(root)
+    report = {"generated": datetime.now().strftime("%d-%m-%Y %H:%M:%S"), "site": str(root), "pages": {}}
+    if POINTER_FILE in site.known:
+        pointer = json.loads(site.read_text(POINTER_FILE))
+        report["dataset"] = {"version": pointer.get("version"), "hash": pointer.get("hash")}
+
+    for page in pages:
+        if page not in site.known:
+            print(f"Pagina non trovata: {page}")
+            continue
+        resources, photos, external = page_graph(site, page)
+        entry = {
+            "resources": {path: dict(zip(("bytes", "transfer"), site.sizes(path))) for path in resources + photos if path},
+            "external": external,
+            "profiles": {},
+        }
+        for name, profile in profiles.items():
+            # Foto già caricate (stessa auto in "aggiunte di recente" e nel suo brand) non si riscaricano
+            initial = resources + list(dict.fromkeys(p for p in photos[:profile["cards"]] if p and p not in resources))
+            scroll = initial + list(dict.fromkeys(p for p in photos if p and p not in initial))
+            opening = _totals(site, initial)
+            budget = budgets.get(page, {}).get(name, {})
+            entry["profiles"][name] = {
+                "initial": opening,
+                "scroll": _totals(site, scroll),
+                "budget": budget,
+                "over": [{"metric": m, "value": v, "limit": l} for m, v, l in over_budget(opening, budget)],
+            }
+        report["pages"][page] = entry
+    return report
+
+
+def compare(report, previous):
+    """Differenze di byte trasferiti e richieste rispetto a un report precedente: lista di righe"""
+    lines = []
+    for page, entry in report["pages"].items():
+        for name, result in entry["profiles"].items():
+            before = previous.get("pages", {}).get(page, {}).get("profiles", {}).get(name)
+            if not before:
+                continue
+            for stage in ("initial", "scroll"):
+                delta = result[stage]["transfer"] - before[stage]["transfer"]
+                requests = result[stage]["requests"] - before[stage]["requests"]
+                lines.append(f"{page} [{name}, {stage}]: {delta / 1024:+.1f} KB, {requests:+d} richieste")
+    return lines
+
+
+def print_report(report):
+    for page, entry in report["pages"].items():
+        print(f"\n{page}")
+        for name, result in entry["profiles"].items():
+            initial, scroll = result["initial"], result["scroll"]
+            types = ", ".join(f"{kind} {size / 1024:.0f} KB" for kind, size in sorted(initial["types"].items()))
+            print(f"  {name:8} apertura {initial['transfer'] / 1024:8.1f} KB in {initial['requests']:3d} richieste ({types})")
+            print(f"  {'':8} scroll   {scroll['transfer'] / 1024:8.1f} KB in {scroll['requests']:3d} richieste")
+            for over in result["over"]:
+                print(f"  {'':8} FUORI BUDGET: {over['metric']} {over['value']} > {over['limit']}")
+        if entry["external"]:
+            print(f"  esterne (non pesate): {len(entry['external'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peso delle pagine del sito per profilo di dispositivo")
+    parser.add_argument("--site", default=str(SITE_ROOT), help="radice del sito da analizzare (default: sorgenti)")
+    parser.add_argument("--report", help="scrive il report JSON in questo file")
+    parser.add_argument("--compare", help="report JSON precedente da confrontare")
+    parser.add_argument("--strict", action="store_true", help="esce con errore se una pagina supera il budget")
+    args = parser.parse_args()
+
+    report = analyze(Path(args.site))
+    print_report(report)
+
+    if args.compare:
+        try:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"\nReport precedente non leggibile: {e}")
+        else:
+            print(f"\nRispetto a {args.compare}:")
+            for line in compare(report, previous):
+                print(f"  {line}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport scritto in {args.report}")
+
+    if args.strict and any(result["over"] for entry in report["pages"].values() for result in entry["profiles"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Foto duplicate o quasi identiche nell'inventario (hash percettivi).
+
+Per ogni immagine in cars/ vengono calcolati due hash a 64 bit:
+
+    dHash   differenze di luminosità tra pixel vicini (immagine 9x8)
+    pHash   segno delle basse frequenze della DCT (immagine 32x32)
+
+Due foto sono considerate la stessa se entrambe le distanze di Hamming sono
+entro le soglie: regge a ridimensionamenti, ricompressioni JPEG e piccoli
+ritocchi. Prima del calcolo l'immagine viene ritagliata al centro a 3:2 come
+fa optimize_image, così la foto scelta dall'operatore si confronta con la
+versione che verrà pubblicata.
+
+Gli hash sono salvati in datasets/.photo_hashes.json con data di modifica e
+dimensione del file: vengono ricalcolati solo per le foto nuove o cambiate. Il
+confronto avviene su array NumPy uint64 (XOR + conteggio dei bit) per tutto
+l'indice insieme, quindi controllare una nuova foto richiede pochi
+millisecondi anche con decine di migliaia di immagini.
+
+Uso:
+    python datasets/photo_hashes.py                  # aggiorna l'indice ed elenca i gruppi di duplicati
+    python datasets/photo_hashes.py --check FOTO...  # foto dell'inventario simili a quelle indicate
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import site_refs
+
+SITE_ROOT = Path(__file__).parent.parent
+INDEX_FILE = Path(__file__).parent / ".photo_hashes.json"
+INDEX_VERSION = 1
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+DATASET_FILE = "datasets/dataset.json"
+
+# Bit diversi (su 64) entro cui due foto sono la stessa
+DHASH_THRESHOLD = 10
+PHASH_THRESHOLD = 12
+# Stesso rapporto di optimize_image (1200x800)
+CROP_RATIO = 1.5
+# Elementi massimi della matrice delle distanze calcolata per volta nel confronto completo
+BLOCK_ELEMENTS = 4_000_000
+# Bit a 1 di ogni byte: conteggio dei bit per NumPy < 2 (senza np.bitwise_count)
+_BYTE_BITS = np.array([bin(n).count('1') for n in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n):
+    """Matrice della DCT-II ortonormale n x n"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _center_crop(img, ratio):
+    width, height = img.size
+    if width / height > ratio:
+        new_width = int(height * ratio)
+        left = (width - new_width) // 2
+        return img.crop((left, 0, left + new_width, height))
+    if width / height < ratio:
+        new_height = int(width / ratio)
+        top = (height - new_height) // 2
+        return img.crop((0, top, width, top + new_height))
+    return img
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def compute_hashes(image_path):
+    """(dhash, phash) come interi a 64 bit"""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        # Per i JPEG decodifica direttamente a risoluzione ridotta
+        img.draft('L', (128, 128))
+        gray = _center_crop(img.convert('L'), CROP_RATIO)
+
+    small = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    dhash = _bits_to_int(small[:, 1:] > small[:, :-1])
+
+    pixels = np.asarray(gray.resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8]
+    phash = _bits_to_int(low > np.median(low))
+    return dhash, phash
+
+
+def hamming(values, target):
+    """Distanze di Hamming tra un array uint64 e un valore (o un array compatibile)"""
+    diff = np.bitwise_xor(values, np.asarray(target, dtype=np.uint64))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff)
+    diff = np.ascontiguousarray(diff)
+    return _BYTE_BITS[diff.view(np.uint8)].reshape(diff.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def _to_array(hex_values):
+    if not hex_values:
+        return np.zeros(0, dtype=np.uint64)
+    return np.frombuffer(bytes.fromhex(''.join(hex_values)), dtype='>u8').astype(np.uint64)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PhotoIndex:
+    """Indice persistente percorso -> (data modifica, byte, dhash, phash)"""
+
+    def __init__(self, root=SITE_ROOT, path=INDEX_FILE):
+        self.root = Path(root)
+        self.path = Path(path)
+        self.entries = {}  # percorso relativo -> [mtime_ns, byte, dhash hex, phash hex]
+        self.dirty = False
+        self._arrays = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get("version") == INDEX_VERSION:
+                self.entries = stored.get("images", {})
+        except (OSError, ValueError):
+            self.entries = {}
+        self._arrays = None
+        return self
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "images": self.entries}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def _set(self, rel, stamp, hashes):
+        self.entries[rel] = [stamp[0], stamp[1], f"{hashes[0]:016x}", f"{hashes[1]:016x}"]
+        self.dirty = True
+        self._arrays = None
+
+    def add(self, rel):
+        """Aggiunge (o aggiorna) una foto appena scritta; rel è relativo alla root del sito"""
+        path = self.root / rel
+        self._set(rel, _file_stamp(path), compute_hashes(path))
+
+    def scan(self):
+        """Percorsi relativi delle immagini presenti in cars/"""
+        found = []
+        root_len = len(str(self.root)) + 1
+        for dirpath, _, filenames in os.walk(self.root / "cars"):
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES:
+                    found.append(os.path.join(dirpath, name)[root_len:].replace(os.sep, '/'))
+        return found
+
+    def refresh(self, workers=8):
+        """
+        Allinea l'indice alle immagini su disco: calcola gli hash di quelle nuove o
+        modificate (in parallelo) e toglie quelle che non esistono più.
+
+        Returns:
+            (hash calcolati, voci rimosse)
+        """
+        current = {}
+        for rel in self.scan():
+            try:
+                current[rel] = _file_stamp(self.root / rel)
+            except OSError:
+                continue
+        removed = [rel for rel in self.entries if rel not in current]
+        for rel in removed:
+            del self.entries[rel]
+        stale = [rel for rel, stamp in current.items()
+                 if rel not in self.entries or tuple(self.entries[rel][:2]) != stamp]
+
+        def _hash(rel):
+            try:
+                return rel, compute_hashes(self.root / rel)
+            except Exception as e:
+                print(f"Impossibile leggere {rel}: {e}")
+                return rel, None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for rel, hashes in pool.map(_hash, stale):
+                if hashes:
+                    self._set(rel, current[rel], hashes)
+        if removed:
+            self.dirty = True
+            self._arrays = None
+        return len(stale), len(removed)
+
+    def arrays(self):
+        """(percorsi, dhash uint64, phash uint64), ricostruiti solo dopo una modifica"""
+        if self._arrays is None:
+            paths = list(self.entries)
+            self._arrays = (
+                paths,
+                _to_array([self.entries[p][2] for p in paths]),
+                _to_array([self.entries[p][3] for p in paths]),
+            )
+        return self._arrays
+
+    def similar(self, hashes, dhash_threshold=DHASH_THRESHOLD, phash_threshold=PHASH_THRESHOLD):
+        """Foto dell'indice simili a hashes: lista di (percorso, distanza dhash, distanza phash)"""
+        paths, dhashes, phashes = self.arrays()
+        d_dist = hamming(dhashes, hashes[0])
+        p_dist = hamming(phashes, hashes[1])
+        rows = np.nonzero((d_dist <= dhash_threshold) & (p_dist <= phash_threshold))[0]
+        matches = [(paths[i], int(d_dist[i]), int(p_dist[i])) for i in rows]
+        return sorted(matches, key=lambda m: m[1] + m[2])
+
+    def check(self, image_path, **thresholds):
+        """
+        Foto già nell'inventario simili a image_path (es. una foto scelta dall'operatore).
+
+        Le voci il cui file non esiste più (auto rimosse, operazioni annullate) vengono scartate.
+        """
+        matches = self.similar(compute_hashes(image_path), **thresholds)
+        source = Path(image_path).resolve()
+        return [m for m in matches if (self.root / m[0]).exists() and (self.root / m[0]).resolve() != source]
+
+    def clusters(self, dhash_threshold=DHASH_THRESHOLD, phash_threshold=PHASH_THRESHOLD):
+        """Gruppi di foto simili (almeno due), come liste di percorsi"""
+        paths, dhashes, phashes = self.arrays()
+        count = len(paths)
+        parent = list(range(count))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        block = max(1, BLOCK_ELEMENTS // max(count, 1))
+        for start in range(0, count, block):
+            stop = min(start + block, count)
+            # Solo le coppie (i, j) con j > i; il pHash si calcola solo dove il dHash è già vicino
+            d_dist = hamming(dhashes[start:stop, None], dhashes[None, :])
+            rows, cols = np.nonzero(d_dist <= dhash_threshold)
+            rows += start
+            keep = cols > rows
+            rows, cols = rows[keep], cols[keep]
+            close = hamming(phashes[rows], phashes[cols]) <= phash_threshold
+            for i, j in zip(rows[close].tolist(), cols[close].tolist()):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+
+        groups = {}
+        for i in range(count):
+            groups.setdefault(find(i), []).append(paths[i])
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def image_owners(data):
+    """Percorso relativo dell'immagine -> "Brand Nome (id)" dell'auto che la usa"""
+    owners = {}
+    for brand in data.get('brands', []):
+        for car in brand.get('cars', []):
+            label = f"{brand.get('name', '?')} {car.get('name', '?')} ({car.get('id', '?')})"
+            for ref in [car.get('image')] + list(car.get('gallery', [])):
+                ref = ref if isinstance(ref, str) else (ref or {}).get('src')
+                if ref and site_refs.is_local(ref):
+                    path = site_refs.normalize("pages", ref)
+                    if path:
+                        owners.setdefault(path, label)
+    return owners
+
+
+def cluster_report(index, clusters, owners=None):
+    """
+    Gruppi ordinati per byte recuperabili: per ogni gruppo si tiene un file usato
+    da un'auto (owners, vedi image_owners), tra questi il più grande (di solito la
+    versione migliore), e si possono recuperare gli altri.
+
+    Returns:
+        lista di dict keep, duplicates, reclaimable
+    """
+    owners = owners or {}
+    report = []
+    for group in clusters:
+        sizes = {rel: index.entries[rel][1] for rel in group}
+        keep = max(group, key=lambda rel: (rel in owners, sizes[rel], rel))
+        duplicates = [rel for rel in group if rel != keep]
+        report.append({
+            "keep": keep,
+            "duplicates": duplicates,
+            "reclaimable": sum(sizes[rel] for rel in duplicates),
+        })
+    return sorted(report, key=lambda r: r['reclaimable'], reverse=True)
+
+
+def _format_bytes(size):
+    return f"{size / 1024 / 1024:.2f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trova le foto duplicate o quasi identiche in cars/")
+    parser.add_argument("--check", nargs='+', metavar="FOTO", help="cerca nell'inventario le foto simili a queste")
+    parser.add_argument("--dhash-threshold", type=int, default=DHASH_THRESHOLD,
+                        help=f"bit diversi ammessi nel dHash (default: {DHASH_THRESHOLD})")
+    parser.add_argument("--phash-threshold", type=int, default=PHASH_THRESHOLD,
+                        help=f"bit diversi ammessi nel pHash (default: {PHASH_THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=8, help="thread per il calcolo degli hash (default: 8)")
+    args = parser.parse_args()
+    thresholds = {"dhash_threshold": args.dhash_threshold, "phash_threshold": args.phash_threshold}
+
+    index = PhotoIndex().load()
+    hashed, removed = index.refresh(workers=args.workers)
+    index.save()
+    print(f"Indice: {len(index.entries)} foto ({hashed} hash calcolati, {removed} voci rimosse)")
+    try:
+        with open(SITE_ROOT / DATASET_FILE, 'r', encoding='utf-8') as f:
+            owners = image_owners(json.load(f))
+    except (OSError, ValueError):
+        owners = {}
+
+    if args.check:
+        for image_path in args.check:
+            matches = index.check(image_path, **thresholds)
+            print(f"\n{image_path}: {len(matches)} foto simili")
+            for rel, d_dist, p_dist in matches:
+                print(f"  {rel} [{owners.get(rel, 'non usata')}] dHash {d_dist}, pHash {p_dist}")
+        return
+
+    report = cluster_report(index, index.clusters(**thresholds), owners)
+    for group in report:
+        files = [group['keep']] + group['duplicates']
+        cars = {owners[rel] for rel in files if rel in owners}
+        unused = sum(1 for rel in files if rel not in owners)
+        where = {0: "nessuna auto", 1: "stessa auto"}.get(len(cars), f"{len(cars)} auto")
+        if unused:
+            where += f", {unused} non {'usata' if unused == 1 else 'usate'}"
+        print(f"\n[{where}] {_format_bytes(group['reclaimable'])} recuperabili")
+        print(f"  tieni    {group['keep']} [{owners.get(group['keep'], 'non usata')}]")
+        for rel in group['duplicates']:
+            print(f"  doppione {rel} [{owners.get(rel, 'non usata')}] ({_format_bytes(index.entries[rel][1])})")
+
+    total = sum(group['reclaimable'] for group in report)
+    print(f"\n{len(report)} gruppi di foto simili, {_format_bytes(total)} recuperabili")
+
+
+if __name__ == "__main__":
+    main()
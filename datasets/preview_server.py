@@ -0,0 +1,319 @@
+"""
+Server locale per l'anteprima del sito, con un comportamento simile alla produzione.
+
+- serve le versioni precompresse nome.br / nome.gz se esistono e il browser le
+  accetta; gli altri file di testo vengono compressi al volo con gzip
+- ETag per ogni versione del file e risposte 304 a If-None-Match
+- richieste Range (un solo intervallo) con 206 / 416
+- Cache-Control dal manifest della build (asset-manifest.json): i file con
+  hash sono immutabili, tutto il resto va rivalidato
+- una riga di log per richiesta con byte inviati e latenza, e un riepilogo
+  alla chiusura (Ctrl+C)
+
+Uso:
+    python datasets/preview_server.py                 # serve dist/ se esiste, altrimenti la root
+    python datasets/preview_server.py --dir . --port 8080
+"""
+import argparse
+import email.utils
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import fingerprint
+
+SITE_ROOT = Path(__file__).parent.parent
+DEFAULT_DIR = SITE_ROOT / "dist"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Estensioni delle versioni precompresse, in ordine di preferenza
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+# Sotto questa dimensione la compressione non conviene
+MIN_COMPRESS_BYTES = 1024
+COPY_CHUNK = 64 * 1024
+
+
+def accepted_encodings(header):
+    """Codifiche accettate da Accept-Encoding (escluse quelle con q=0)"""
+    accepted = set()
+    for part in (header or "").split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(token)
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    Interpreta un header Range con un solo intervallo.
+
+    Returns:
+        (inizio, fine) inclusivi, None se l'header va ignorato (assente o con
+        più intervalli), oppure "unsatisfiable"
+    """
+    if not header or not header.startswith("bytes=") or ',' in header:
+        return None
+    first, sep, last = header[len("bytes="):].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    """Confronto debole tra If-None-Match e l'ETag corrente"""
+    if header.strip() == '*':
+        return True
+    bare = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == bare for candidate in header.split(','))
+
+
+def load_immutable_paths(directory):
+    """Percorsi (relativi, con '/') dei file con hash elencati in asset-manifest.json"""
+    try:
+        with open(Path(directory) / fingerprint.MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {entry["file"] for entry in manifest.get("assets", {}).values()}
+
+
+class RequestLog:
+    """Statistiche delle richieste servite (condivise tra i thread)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.by_status = {}
+
+    def add(self, status, sent):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+
+    def summary(self):
+        statuses = ', '.join(f"{code}: {n}" for code, n in sorted(self.by_status.items()))
+        return f"{self.requests} richieste, {self.bytes_sent / 1024:.1f} KB inviati ({statuses})"
+
+
+class PreviewHandler(SimpleHTTPRequestHandler):
+    """Handler statico con compressione, ETag, Range e Cache-Control"""
+
+    server_version = "PreviewServer/1.0"
+    immutable_paths = set()
+    request_log = None
+    _gzip_cache = {}  # percorso -> (mtime_ns, byte compressi)
+    _gzip_lock = threading.Lock()
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_request(self, code='-', size='-'):
+        # Il log viene scritto da _serve con byte e latenza
+        pass
+
+    def _serve(self, send_body):
+        start = time.perf_counter()
+        self._sent = 0
+        self._encoding = "identity"
+        try:
+            status = self._respond(send_body)
+        except (BrokenPipeError, ConnectionResetError):
+            status = 499
+        latency = (time.perf_counter() - start) * 1000
+        if self.request_log:
+            self.request_log.add(status, self._sent)
+        encoding = "" if self._encoding == "identity" else f" [{self._encoding}]"
+        sys.stderr.write(f"{self.command} {self.path} {status} {self._sent}B{encoding} {latency:.1f}ms\n")
+
+    def _respond(self, send_body):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split('?', 1)[0].endswith('/'):
+                return self._redirect_to_dir()
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File non trovato")
+            return HTTPStatus.NOT_FOUND
+
+        rel = os.path.relpath(path, self.directory).replace(os.sep, '/')
+        content_type = self.guess_type(path)
+        stat = os.stat(path)
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+        range_header = self.headers.get("Range")
+
+        # Con una richiesta Range si serve sempre la versione non compressa
+        body_path, data, size, mtime = path, None, stat.st_size, stat.st_mtime_ns
+        if compressible and not range_header:
+            accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding in accepted and os.path.isfile(path + suffix):
+                    body_path = path + suffix
+                    sibling = os.stat(body_path)
+                    size, mtime = sibling.st_size, sibling.st_mtime_ns
+                    self._encoding = encoding
+                    break
+            else:
+                if "gzip" in accepted and stat.st_size >= MIN_COMPRESS_BYTES:
+                    data = self._gzipped(path, stat.st_mtime_ns)
+                    size = len(data)
+                    self._encoding = "gzip"
+
+        etag = f'"{mtime:x}-{size:x}-{self._encoding}"'
+        cache_control = IMMUTABLE_CACHE if rel in self.immutable_paths else REVALIDATE_CACHE
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._common_headers(etag, cache_control, compressible)
+            self.end_headers()
+            return HTTPStatus.NOT_MODIFIED
+
+        byte_range = None
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            byte_range = parse_range(range_header, size)
+        if byte_range == "unsatisfiable":
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+
+        first, last = byte_range or (0, size - 1)
+        length = last - first + 1 if size else 0
+        status = HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.send_header("Accept-Ranges", "bytes")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+        if self._encoding != "identity":
+            self.send_header("Content-Encoding", self._encoding)
+        self._common_headers(etag, cache_control, compressible)
+        self.end_headers()
+
+        if send_body and length:
+            if data is not None:
+                self.wfile.write(data)
+            else:
+                with open(body_path, 'rb') as f:
+                    f.seek(first)
+                    self._copy(f, length)
+            self._sent = length
+        return status
+
+    def _common_headers(self, etag, cache_control, compressible):
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        if compressible:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def _copy(self, source, length):
+        remaining = length
+        while remaining:
+            chunk = source.read(min(COPY_CHUNK, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def _redirect_to_dir(self):
+        base, sep, query = self.path.partition('?')
+        self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+        self.send_header("Location", base + '/' + sep + query)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return HTTPStatus.MOVED_PERMANENTLY
+
+    def _gzipped(self, path, mtime_ns):
+        """Versione gzip del file, ricompressa solo se il file è cambiato"""
+        with self._gzip_lock:
+            cached = self._gzip_cache.get(path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+        with open(path, 'rb') as f:
+            data = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        with self._gzip_lock:
+            self._gzip_cache[path] = (mtime_ns, data)
+        return data
+
+
+def serve(directory, host="127.0.0.1", port=8000):
+    directory = Path(directory).resolve()
+    immutable = load_immutable_paths(directory)
+    request_log = RequestLog()
+
+    handler = type("Handler", (PreviewHandler,), {
+        "immutable_paths": immutable,
+        "request_log": request_log,
+        "_gzip_cache": {},
+    })
+
+    def factory(*args, **kwargs):
+        return handler(*args, directory=str(directory), **kwargs)
+
+    with ThreadingHTTPServer((host, port), factory) as httpd:
+        manifest_note = f"{len(immutable)} asset immutabili dal manifest" if immutable else "nessun manifest: tutto in no-cache"
+        print(f"Anteprima di {directory} su http://{host}:{port}/ ({manifest_note})")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(f"\n{request_log.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server locale per l'anteprima del sito")
+    parser.add_argument("--dir", help="cartella da servire (default: dist/ se esiste, altrimenti la root del sito)")
+    parser.add_argument("--host", default="127.0.0.1", help="indirizzo (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="porta (default: 8000)")
+    args = parser.parse_args()
+
+    directory = Path(args.dir) if args.dir else (DEFAULT_DIR if DEFAULT_DIR.is_dir() else SITE_ROOT)
+    if not directory.is_dir():
+        print(f"Cartella non trovata: {directory}")
+        sys.exit(1)
+    serve(directory, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Misura dei tempi delle operazioni di CarManagerApp.
+
+Le operazioni sono racchiuse in span con nome (decoratore timed o context
+manager span). Finché il profiling non è attivo uno span costa un solo
+controllo di una variabile globale. Con gen_id.py --profile gli span vengono
+registrati e alla chiusura vengono scritti una traccia in formato Chrome
+(apribile con chrome://tracing o https://ui.perfetto.dev) e un riepilogo con
+p50/p95 per operazione.
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+_enabled = False
+_events = []  # (nome, inizio_ns, durata_ns, thread)
+_t0 = time.perf_counter_ns()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, start_ns, duration_ns):
+    """Registra uno span già misurato"""
+    if _enabled:
+        _events.append((name, start_ns, duration_ns, threading.get_ident()))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Context manager: with profiling.span("rmtree"): ..."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name=None):
+    """Decoratore che misura ogni chiamata della funzione"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(span_name, start, time.perf_counter_ns() - start)
+
+        return wrapper
+    return decorator
+
+
+def _percentile(sorted_values, percent):
+    """Percentile con il metodo nearest-rank"""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summary():
+    """dict nome -> {count, total_ms, p50_ms, p95_ms, max_ms}"""
+    durations = {}
+    for name, _, duration, _ in _events:
+        durations.setdefault(name, []).append(duration / 1e6)
+    result = {}
+    for name, values in durations.items():
+        values.sort()
+        result[name] = {
+            "count": len(values),
+            "total_ms": round(sum(values), 3),
+            "p50_ms": round(_percentile(values, 50), 3),
+            "p95_ms": round(_percentile(values, 95), 3),
+            "max_ms": round(values[-1], 3),
+        }
+    return result
+
+
+def format_summary(stats=None):
+    stats = summary() if stats is None else stats
+    lines = [f"{'operazione':<28}{'n':>6}{'totale ms':>12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, s in sorted(stats.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+        lines.append(f"{name:<28}{s['count']:>6}{s['total_ms']:>12.1f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    return '\n'.join(lines)
+
+
+def write_trace(path):
+    """Scrive gli span registrati in formato Chrome trace (eventi completi "X", tempi in microsecondi)"""
+    pid = os.getpid()
+    events = [
+        {
+            "name": name,
+            "ph": "X",
+            "ts": (start - _t0) / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+        }
+        for name, start, duration, tid in _events
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "summary": summary()}, f, indent=1)
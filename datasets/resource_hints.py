@@ -0,0 +1,202 @@
+"""
+Step di build: resource hint nelle pagine pubblicate.
+
+Le risorse che decidono il primo disegno della pagina vengono scoperte tardi:
+il bundle dei moduli è in fondo al body e le foto delle prime schede
+arrivano solo dopo il catalogo. Per ogni pagina lo step aggiunge nell'head:
+
+    modulepreload          moduli caricati dalla pagina (con i loro import statici)
+    preload as="image"     immagine principale delle pagine statiche: la prima
+                           immagine dentro un carosello o una galleria dell'HTML
+                           (CAROUSEL_CLASS_RE, es. il carosello del concessionario
+                           della home), con fetchpriority="high"
+    preload as="image"     prime foto delle schede dal dataset corrente, nell'ordine
+                           della pagina (page_weight.card_order): quelle visibili su
+                           mobile con fetchpriority="high", le altre visibili su
+                           desktop solo sopra MOBILE_MAX_WIDTH (media)
+
+e mette fetchpriority="high" sull'immagine principale e sulle prime
+STATIC_HIGH_PRIORITY_IMAGES immagini statiche dell'HTML (i loghi del loader,
+il primo disegno). Le altre slide del carosello non sono visibili
+all'apertura e restano senza hint. Lo step
+gira a ogni build, quindi i hint seguono inventario e hash degli asset.
+
+Il catalogo non viene precaricato: api.js non lo scarica se la copia in
+localStorage è aggiornata o se bastano le patch (dataset_versions.py), e un
+preload lo farebbe scaricare comunque a ogni visita.
+"""
+import posixpath
+import re
+from html.parser import HTMLParser
+
+import js_bundle
+import page_weight
+import site_refs
+
+STATIC_HIGH_PRIORITY_IMAGES = 2
+# Stessa soglia di ui.js (isMobile: carosello delle aggiunte di recente)
+MOBILE_MAX_WIDTH = 1400
+
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+SRC_RE = re.compile(r'\bsrc=["\']([^"\']+)["\']', re.IGNORECASE)
+HREF_RE = re.compile(r'\bhref=["\']([^"\']+)["\']', re.IGNORECASE)
+STYLESHEET_RE = re.compile(r'[ \t]*<link\b[^>]*\brel=["\']stylesheet["\']', re.IGNORECASE)
+HEAD_END_RE = re.compile(r'</head>', re.IGNORECASE)
+# Classi dei contenitori la cui prima immagine è il contenuto principale della pagina
+CAROUSEL_CLASS_RE = re.compile(r'carousel|slide|gallery', re.IGNORECASE)
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class _StaticImageParser(HTMLParser):
+    """<img> dell'HTML in ordine di pagina, ognuna con l'indicazione se sta dentro un carosello o una galleria"""
+
+    def __init__(self):
+        super().__init__()
+        self.open_tags = []   # (tag, contenitore di un carosello)
+        self.images = []      # (src, dentro un carosello)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "img":
+            self.images.append((attrs.get("src"), any(flag for _, flag in self.open_tags)))
+        elif tag not in VOID_TAGS:
+            self.open_tags.append((tag, bool(CAROUSEL_CLASS_RE.search(attrs.get("class") or ""))))
+
+    def handle_endtag(self, tag):
+        # Chiude anche i tag rimasti aperti al suo interno (HTML non sempre ben formato)
+        for position in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[position][0] == tag:
+                del self.open_tags[position:]
+                break
+
+
+def lcp_image(html, page, known):
+    """Immagine principale di una pagina statica: la prima locale dentro un carosello (None se non c'è)"""
+    parser = _StaticImageParser()
+    parser.feed(html)
+    page_dir = posixpath.dirname(page)
+    for src, in_carousel in parser.images:
+        if in_carousel and src and site_refs.is_local(src):
+            target = site_refs.normalize(page_dir, src)
+            if target in known:
+                return target
+    return None
+
+
+def existing_hints(html, page):
+    """Percorsi (relativi alla root) già anticipati da un <link> della pagina, es. il modulepreload di js_bundle.py"""
+    page_dir = posixpath.dirname(page)
+    found = set()
+    for match in page_weight.HINT_LINK_RE.finditer(html):
+        href = HREF_RE.search(match.group(0))
+        if href and site_refs.is_local(href.group(1)):
+            found.add(site_refs.normalize(page_dir, href.group(1)))
+    return found
+
+
+def critical_resources(site, page):
+    """
+    Hint di una pagina (esclusi quelli che la pagina ha già).
+
+    Returns:
+        lista di dict di attributi per i tag <link> (href relativo alla root)
+    """
+    html = site.read_text(page)
+    page_dir = posixpath.dirname(page)
+    hints = []
+
+    scripts = []
+    data_refs = set()
+    for match in js_bundle.MODULE_SCRIPT_RE.finditer(html):
+        src = match.group(1) or match.group(2)
+        target = site_refs.normalize(page_dir, src) if site_refs.is_local(src) else None
+        if target:
+            page_weight.script_graph(site, target, scripts, data_refs)
+    hints.extend({"rel": "modulepreload", "href": path} for path in scripts if path.endswith('.js'))
+
+    lcp = lcp_image(html, page, site.known)
+    if lcp:
+        hints.append({"rel": "preload", "href": lcp, "as": "image", "fetchpriority": "high"})
+
+    if data_refs:
+        _, dataset_file = page_weight.dataset_requests(site)
+        if dataset_file in site.known:
+            hints.extend(card_photo_hints(site, page, dataset_file))
+
+    existing = existing_hints(html, page)
+    return [hint for hint in hints if hint["href"] not in existing]
+
+
+def card_photo_hints(site, page, dataset_file):
+    """Preload delle foto delle prime schede: alta priorità quelle visibili su mobile, le altre solo su desktop"""
+    _, photos = page_weight.dataset_images(site, page, dataset_file)
+    mobile_cards = page_weight.PROFILES["mobile"]["cards"]
+    desktop_cards = page_weight.PROFILES["desktop"]["cards"]
+    hints = []
+    seen = set()
+    for position, photo in enumerate(photos[:desktop_cards]):
+        if not photo or photo in seen:
+            continue
+        seen.add(photo)
+        if position < mobile_cards:
+            hints.append({"rel": "preload", "href": photo, "as": "image", "fetchpriority": "high"})
+        else:
+            hints.append({"rel": "preload", "href": photo, "as": "image", "media": f"(min-width: {MOBILE_MAX_WIDTH + 1}px)"})
+    return hints
+
+
+def render_hints(hints, page):
+    page_dir = posixpath.dirname(page) or '.'
+    lines = []
+    for hint in hints:
+        attrs = dict(hint, href=posixpath.relpath(hint["href"], page_dir))
+        lines.append("    <link " + " ".join(f'{name}="{value}"' for name, value in attrs.items()) + ">\n")
+    return "".join(lines)
+
+
+def prioritize_static_images(html, page, known, limit=STATIC_HIGH_PRIORITY_IMAGES, main_image=None):
+    """fetchpriority="high" sulle prime immagini locali dell'HTML e sull'immagine principale"""
+    page_dir = posixpath.dirname(page)
+    remaining = [limit]
+
+    def _replace(match):
+        tag = match.group(0)
+        src = SRC_RE.search(tag)
+        if not src or 'fetchpriority' in tag.lower():
+            return tag
+        target = site_refs.normalize(page_dir, src.group(1))
+        if target not in known:
+            return tag
+        if target != main_image:
+            if remaining[0] <= 0:
+                return tag
+            remaining[0] -= 1
+        return tag[:4] + ' fetchpriority="high"' + tag[4:]
+
+    return IMG_TAG_RE.sub(_replace, html)
+
+
+def insert_hints(html, block):
+    """Inserisce i hint prima del primo foglio di stile (o in fondo all'head)"""
+    match = STYLESHEET_RE.search(html) or HEAD_END_RE.search(html)
+    if not match:
+        return html
+    return html[:match.start()] + block + html[match.start():]
+
+
+def run(out_dir, context):
+    """Aggiunge preload, modulepreload e fetchpriority alle pagine dell'output"""
+    site = page_weight.SiteFiles(out_dir)
+    result = {}
+    for page in context.get("pages", []):
+        if page not in site.known:
+            continue
+        hints = critical_resources(site, page)
+        html = site.read_text(page)
+        html = prioritize_static_images(html, page, site.known, main_image=lcp_image(html, page, site.known))
+        if hints:
+            html = insert_hints(html, "    <!-- Resource hint generati da datasets/resource_hints.py -->\n" + render_hints(hints, page))
+        (out_dir / page).write_text(html, encoding='utf-8')
+        result[page] = hints
+        print(f"Hint: {page}: {len(hints)} hint ({', '.join(sorted({h['rel'] + ':' + h.get('as', 'script') for h in hints})) or 'nessuno'})")
+    return result
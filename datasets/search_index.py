@@ -0,0 +1,86 @@
+"""
+Step di build: indice di ricerca testuale per il sito.
+
+Per ogni auto del dataset pubblicato vengono estratte le parole di brand,
+name, sub_name, details e carburante, senza accenti e in minuscolo ("Citroën
+C3 1.6 HDi" -> citroen, c3, 1, 6, hdi). L'indice inverso associa a ogni parola
+le auto che la contengono:
+
+    {
+      "format": "search/1",
+      "ids": ["citroen-c3217801225", ...],       id delle auto, posizione = numero dell'auto
+      "tokens": ["1", "6", "c3", "citroen", ...], parole in ordine alfabetico
+      "postings": [[0, 3, 1], ...]               numeri delle auto per parola (differenze dal precedente)
+    }
+
+Le parole sono ordinate, quindi nel browser una ricerca per prefisso ("cit")
+è una ricerca binaria più una scansione delle parole che iniziano così; più
+parole nella ricerca devono comparire tutte. Il client è scripts/modules/search.js,
+che usa la stessa normalizzazione. Il file viene pubblicato come
+datasets/search-index.<hash>.json ed elencato nel puntatore di versione.
+"""
+import json
+import re
+import unicodedata
+
+import fingerprint
+
+FORMAT = "search/1"
+DATASET_FILE = "datasets/dataset.json"
+INDEX_FILE = "datasets/search-index.json"
+SEARCH_FIELDS = ("brand", "name", "sub_name", "details", "carburante")
+
+_SPLIT_RE = re.compile(r'[^a-z0-9]+')
+
+
+def fold(text):
+    """Minuscolo senza accenti (stessa trasformazione di foldText in search.js)"""
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if not '\u0300' <= ch <= '\u036f').lower()
+
+
+def tokenize(text):
+    return [token for token in _SPLIT_RE.split(fold(text)) if token]
+
+
+def car_tokens(brand, car):
+    """Parole cercabili di un'auto (il nome del brand vale anche se l'auto non ha il campo brand)"""
+    texts = [brand.get('name', '')] + [str(car.get(field) or '') for field in SEARCH_FIELDS]
+    return {token for text in texts for token in tokenize(text)}
+
+
+def build_index(data):
+    ids = []
+    postings = {}
+    for brand in data['brands']:
+        for car in brand.get('cars', []):
+            number = len(ids)
+            ids.append(car['id'])
+            for token in car_tokens(brand, car):
+                postings.setdefault(token, []).append(number)
+
+    tokens = sorted(postings)
+    encoded = []
+    for token in tokens:
+        numbers = postings[token]
+        encoded.append([numbers[0]] + [b - a for a, b in zip(numbers, numbers[1:])])
+    return {"format": FORMAT, "ids": ids, "tokens": tokens, "postings": encoded}
+
+
+def run(out_dir, context):
+    """Scrive l'indice di ricerca del dataset pubblicato e lo aggiunge al manifest"""
+    manifest = context.get("fingerprint")
+    published = manifest["assets"][DATASET_FILE]["file"] if manifest else DATASET_FILE
+    with open(out_dir / published, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    index = build_index(data)
+    payload = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if manifest:
+        rel = fingerprint.register_asset(out_dir, manifest, INDEX_FILE, payload)
+    else:
+        rel = INDEX_FILE
+        (out_dir / rel).write_bytes(payload)
+
+    print(f"Ricerca: {len(index['ids'])} auto, {len(index['tokens'])} parole, {len(payload) / 1024:.1f} KB ({rel})")
+    return {"file": rel, "bytes": len(payload), "tokens": len(index['tokens'])}
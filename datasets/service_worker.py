@@ -0,0 +1,221 @@
+"""
+Step di build: service worker con precache delle risorse delle pagine.
+
+Genera sw.js nella radice del sito pubblicato e aggiunge la registrazione a
+ogni pagina. Le strategie di cache sono:
+
+    pagine HTML        rete, con la copia in cache se si è offline
+    puntatore dataset  rete, con la copia in cache se si è offline (LIVE_FILES: version.json e
+                       last_update.txt devono indicare l'ultima versione), in una cache
+                       separata che non viene sfoltita
+    app shell e loghi  cache-first, precaricati all'installazione
+    file di dati       stale-while-revalidate (datasets/, nomi con hash), ultimi MAX_DATA_FILES file
+    foto delle auto    cache-first a runtime, al massimo MAX_PHOTOS foto (LRU)
+
+La lista di precache è il grafo delle risorse delle pagine calcolato da
+page_weight.py, senza dati e foto delle auto; la versione è quella del
+manifest della build (asset-manifest.json), quindi ogni pubblicazione produce
+un sw.js diverso e il browser lo reinstalla. I file con hash nel nome non
+cambiano mai contenuto: all'installazione vengono copiati dalla cache della
+versione precedente se già presenti, così il client scarica solo i file
+cambiati.
+"""
+import json
+import posixpath
+import re
+
+import page_weight
+
+SW_FILE = "sw.js"
+CACHE_PREFIX = "yaraauto"
+MAX_PHOTOS = 120
+MAX_DATA_FILES = 6
+# File di datasets/ con nome fisso che descrivono la versione corrente
+LIVE_FILES = ["datasets/version.json", "datasets/last_update.txt"]
+
+BODY_END_RE = re.compile(r'</body>', re.IGNORECASE)
+
+SW_TEMPLATE = """// Generated by datasets/service_worker.py - do not edit
+const VERSION = %(version)s;
+const PRECACHE = %(precache)s;
+// Files whose content never changes for a given URL (hash in the name)
+const IMMUTABLE = new Set(%(immutable)s);
+const MAX_PHOTOS = %(max_photos)d;
+const MAX_DATA_FILES = %(max_data)d;
+// Fixed-name files describing the current version: network-first, kept outside the trimmed data cache
+const LIVE_FILES = new Set(%(live)s);
+
+const SHELL_CACHE = `%(prefix)s-shell-${VERSION}`;
+const DATA_CACHE = '%(prefix)s-data';
+const LIVE_CACHE = '%(prefix)s-live';
+const PHOTO_CACHE = '%(prefix)s-photos';
+
+const scopeUrl = path => new URL(path, self.registration.scope).href;
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(SHELL_CACHE);
+        await Promise.all(PRECACHE.map(async path => {
+            const url = scopeUrl(path);
+            // Unchanged hashed files come from the previous version's cache
+            const previous = IMMUTABLE.has(path) ? await caches.match(url) : null;
+            if (previous) return cache.put(url, previous);
+            const response = await fetch(url, { cache: 'reload' });
+            if (!response.ok) throw new Error(`Precache failed: ${path} (${response.status})`);
+            return cache.put(url, response);
+        }));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.startsWith('%(prefix)s-shell-') && name !== SHELL_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+async function networkFirst(request, cacheName = SHELL_CACHE) {
+    const cache = await caches.open(cacheName);
+    try {
+        const response = await fetch(request);
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request, { ignoreSearch: true });
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(SHELL_CACHE);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(request, event) {
+    const cache = await caches.open(DATA_CACHE);
+    const cached = await cache.match(request);
+    const update = fetch(request).then(response => {
+        if (response.ok) return cache.put(request, response.clone()).then(() => trimCache(cache, MAX_DATA_FILES)).then(() => response);
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(update.catch(() => {}));
+        return cached;
+    }
+    return update;
+}
+
+// Oldest entries first: cache.keys() keeps insertion order, a hit is moved to the end
+async function trimCache(cache, maxEntries) {
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map(key => cache.delete(key)));
+}
+
+async function cachedPhoto(request, event) {
+    const cache = await caches.open(PHOTO_CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        event.waitUntil(cache.delete(request).then(() => cache.put(request, cached.clone())));
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        event.waitUntil(cache.put(request, response.clone()).then(() => trimCache(cache, MAX_PHOTOS)));
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+    const path = url.href.slice(self.registration.scope.length);
+
+    if (request.mode === 'navigate' || path.endsWith('.html') || path === '') {
+        event.respondWith(networkFirst(request));
+    } else if (LIVE_FILES.has(path)) {
+        // Never answer with a stale copy when online
+        event.respondWith(networkFirst(request, LIVE_CACHE));
+    } else if (path.startsWith('datasets/')) {
+        event.respondWith(staleWhileRevalidate(request, event));
+    } else if (path.startsWith('cars/')) {
+        event.respondWith(cachedPhoto(request, event));
+    } else {
+        event.respondWith(cacheFirst(request));
+    }
+});
+"""
+
+REGISTER_TEMPLATE = (
+    "    <script>if ('serviceWorker' in navigator) "
+    "navigator.serviceWorker.register('%s').catch(() => {});</script>\n"
+)
+
+
+def precache_list(out_dir, pages):
+    """Risorse delle pagine da precaricare: pagine, CSS, JS e immagini (non dati e foto delle auto)"""
+    site = page_weight.SiteFiles(out_dir)
+    found = []
+    for page in pages:
+        if page not in site.known:
+            continue
+        resources, _, _ = page_weight.page_graph(site, page)
+        for path in resources:
+            if path not in found and page_weight.resource_type(path) != "data" and not path.startswith("cars/"):
+                found.append(path)
+    return found
+
+
+def register_in_pages(out_dir, pages):
+    """Aggiunge a ogni pagina lo script di registrazione del service worker"""
+    for page in pages:
+        path = out_dir / page
+        if not path.exists():
+            continue
+        html = path.read_text(encoding='utf-8')
+        sw_url = posixpath.relpath(SW_FILE, posixpath.dirname(page) or '.')
+        snippet = REGISTER_TEMPLATE % sw_url
+        html, count = BODY_END_RE.subn(lambda m: snippet + m.group(0), html, count=1)
+        if count:
+            path.write_text(html, encoding='utf-8')
+
+
+def run(out_dir, context):
+    """Scrive sw.js con la lista di precache e registra il service worker nelle pagine"""
+    manifest = context.get("fingerprint")
+    if not manifest:
+        print("Service worker: nessun manifest della build, step saltato")
+        return None
+
+    pages = context.get("pages", [])
+    precache = precache_list(out_dir, pages)
+    hashed = {entry["file"] for entry in manifest["assets"].values()}
+    immutable = [path for path in precache if path in hashed]
+
+    source = SW_TEMPLATE % {
+        "version": json.dumps(manifest["version"]),
+        "precache": json.dumps(precache, indent=4),
+        "immutable": json.dumps(immutable),
+        "max_photos": MAX_PHOTOS,
+        "max_data": MAX_DATA_FILES,
+        "live": json.dumps(LIVE_FILES),
+        "prefix": CACHE_PREFIX,
+    }
+    (out_dir / SW_FILE).write_text(source, encoding='utf-8')
+    register_in_pages(out_dir, pages)
+
+    total = sum((out_dir / path).stat().st_size for path in precache)
+    print(f"Service worker: versione {manifest['version']}, {len(precache)} file in precache ({total / 1024:.1f} KB)")
+    return {"file": SW_FILE, "version": manifest["version"], "precache": precache}
@@ -0,0 +1,228 @@
+"""
+Step di build: auto simili per la scheda di dettaglio del sito.
+
+Per ogni auto disponibile (venduto diverso da true) vengono calcolate le K
+auto disponibili più vicine su prezzo, chilometraggio, anno, cavalli,
+carburante e tipo di cambio. I campi numerici sono portati in [0, 1] sul
+catalogo corrente (min-max), il carburante diventa un vettore di flag (le
+alimentazioni miste come "Benzina-GPL" accendono entrambi i flag) e il
+cambio un flag per valore; la distanza è euclidea pesata (WEIGHTS) ed è
+calcolata con NumPy su tutta la matrice auto x auto.
+
+Il file pubblicato è compatto, i vicini sono posizioni nella lista degli id:
+
+    {
+      "format": "similar/1",
+      "k": 4,
+      "ids": ["audi-a6231001125", ...],
+      "neighbours": [[5, 2, 9, 1], ...]     vicini di ids[n], dal più simile
+    }
+
+Incrementale: la cache (datasets/.similar_cache.json, fuori dal sito
+pubblicato) conserva vettori e vicini della build precedente. Se la
+normalizzazione non è cambiata e sono cambiate poche auto, si ricalcolano
+da zero solo le righe delle auto cambiate e di quelle che le avevano tra i
+vicini; per le altre basta la distanza dalle auto cambiate.
+"""
+import json
+import os
+
+import numpy as np
+
+import fingerprint
+
+FORMAT = "similar/1"
+DATASET_FILE = "datasets/dataset.json"
+SIMILAR_FILE = "datasets/similar.json"
+CACHE_FILE = "datasets/.similar_cache.json"
+K = 4
+
+NUMERIC_FIELDS = ("prezzo", "chilometraggio", "anno", "cavalli")
+WEIGHTS = {"prezzo": 2.0, "chilometraggio": 1.0, "anno": 1.0, "cavalli": 1.0, "carburante": 0.5, "tipo_cambio": 0.5}
+
+# Oltre questa quota di auto cambiate conviene ricalcolare tutta la matrice
+INCREMENTAL_MAX_CHANGED = 0.25
+
+
+def available_cars(data):
+    return [car for brand in data['brands'] for car in brand.get('cars', []) if car.get('venduto') is not True]
+
+
+def _fuels(car):
+    return [part.strip().lower() for part in str(car.get('carburante') or '').split('-') if part.strip()]
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def feature_space(cars):
+    """Parametri di normalizzazione: intervalli dei campi numerici e valori dei campi categorici"""
+    ranges = {}
+    for field in NUMERIC_FIELDS:
+        values = np.array([_number(car.get(field)) for car in cars], dtype=np.float64)
+        values = values[~np.isnan(values)]
+        ranges[field] = [float(values.min()), float(values.max())] if len(values) else [0.0, 0.0]
+    return {
+        "ranges": ranges,
+        "fuels": sorted({fuel for car in cars for fuel in _fuels(car)}),
+        "gears": sorted({str(car.get('tipo_cambio') or '') for car in cars}),
+    }
+
+
+def feature_matrix(cars, space):
+    """Una riga per auto: campi numerici in [0, 1] e flag categorici, già moltiplicati per la radice dei pesi"""
+    columns = []
+    for field in NUMERIC_FIELDS:
+        low, high = space["ranges"][field]
+        values = np.array([_number(car.get(field)) for car in cars], dtype=np.float64)
+        values = (values - low) / (high - low) if high > low else np.zeros_like(values)
+        # Campo mancante: a metà intervallo, così non avvicina né allontana
+        values[np.isnan(values)] = 0.5
+        columns.append(values[:, None] * np.sqrt(WEIGHTS[field]))
+
+    fuels = {fuel: n for n, fuel in enumerate(space["fuels"])}
+    fuel_flags = np.zeros((len(cars), len(fuels)))
+    gears = {gear: n for n, gear in enumerate(space["gears"])}
+    gear_flags = np.zeros((len(cars), len(gears)))
+    for row, car in enumerate(cars):
+        for fuel in _fuels(car):
+            fuel_flags[row, fuels[fuel]] = 1.0
+        gear_flags[row, gears[str(car.get('tipo_cambio') or '')]] = 1.0
+    columns.append(fuel_flags * np.sqrt(WEIGHTS["carburante"] / 2))
+    columns.append(gear_flags * np.sqrt(WEIGHTS["tipo_cambio"] / 2))
+    return np.hstack(columns)
+
+
+def distances(rows, columns):
+    """Distanze euclidee al quadrato tra le righe di due matrici di feature"""
+    sq = (rows ** 2).sum(axis=1)[:, None] + (columns ** 2).sum(axis=1)[None, :] - 2.0 * rows @ columns.T
+    return np.maximum(sq, 0.0)
+
+
+def top_k(dist, k, exclude=None):
+    """(posizioni, distanze) delle k colonne più vicine per riga, dalla più vicina; exclude[r] = colonna di r stessa"""
+    dist = dist.copy()
+    if exclude is not None:
+        dist[np.arange(len(dist)), exclude] = np.inf
+    k = min(k, dist.shape[1] - (1 if exclude is not None else 0))
+    if k <= 0:
+        return np.zeros((len(dist), 0), dtype=np.int64), np.zeros((len(dist), 0))
+    part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    part_dist = np.take_along_axis(dist, part, axis=1)
+    order = np.argsort(part_dist, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_dist, order, axis=1)
+
+
+def full_neighbours(features, k=K):
+    return top_k(distances(features, features), k, exclude=np.arange(len(features)))
+
+
+def load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cache(path, cache):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def compute(cars, cache=None, k=K):
+    """
+    Vicini delle auto, riusando la cache della build precedente quando possibile.
+
+    Returns:
+        (ids, vicini come posizioni in ids, nuova cache, righe ricalcolate per intero)
+    """
+    ids = [car['id'] for car in cars]
+    space = feature_space(cars)
+    features = feature_matrix(cars, space)
+    n = len(ids)
+
+    rows = cache.get("rows", {}) if cache and cache.get("space") == space and cache.get("k") == k else None
+    if rows is not None:
+        changed = [
+            i for i, car_id in enumerate(ids)
+            if car_id not in rows or not np.array_equal(rows[car_id]["features"], features[i])
+        ]
+        removed = set(rows) - set(ids)
+        if n and len(changed) + len(removed) > INCREMENTAL_MAX_CHANGED * n:
+            rows = None
+
+    if rows is None:
+        positions, dist = full_neighbours(features, k)
+        neighbours = [[ids[p] for p in row] for row in positions]
+        neighbour_dist = dist.tolist()
+        recomputed = n
+    else:
+        changed_set = set(changed)
+        changed_ids = {ids[i] for i in changed} | removed
+        # Da rifare: le auto cambiate e quelle che avevano un'auto cambiata o tolta tra i vicini
+        redo = [
+            i for i, car_id in enumerate(ids)
+            if i in changed_set or changed_ids.intersection(rows[car_id]["neighbours"])
+        ]
+        neighbours = [rows[car_id]["neighbours"] if car_id in rows else [] for car_id in ids]
+        neighbour_dist = [rows[car_id]["distances"] if car_id in rows else [] for car_id in ids]
+
+        if redo:
+            positions, dist = top_k(distances(features[redo], features), k, exclude=np.array(redo))
+            for row, i in enumerate(redo):
+                neighbours[i] = [ids[p] for p in positions[row]]
+                neighbour_dist[i] = dist[row].tolist()
+
+        # Le altre tengono i vicini, ma un'auto cambiata può essere diventata più vicina
+        keep = sorted(set(range(n)) - set(redo))
+        if keep and changed:
+            candidate = distances(features[keep], features[changed])
+            for row, i in enumerate(keep):
+                merged = list(zip(neighbour_dist[i], neighbours[i])) + [
+                    (float(d), ids[j]) for d, j in zip(candidate[row], changed) if j != i
+                ]
+                merged.sort(key=lambda pair: pair[0])
+                neighbour_dist[i] = [d for d, _ in merged[:k]]
+                neighbours[i] = [car_id for _, car_id in merged[:k]]
+        recomputed = len(redo)
+
+    new_cache = {
+        "k": k,
+        "space": space,
+        "rows": {
+            car_id: {"features": features[i].tolist(), "neighbours": neighbours[i], "distances": neighbour_dist[i]}
+            for i, car_id in enumerate(ids)
+        },
+    }
+    position = {car_id: i for i, car_id in enumerate(ids)}
+    return ids, [[position[car_id] for car_id in row] for row in neighbours], new_cache, recomputed
+
+
+def run(out_dir, context):
+    """Scrive le auto simili del dataset pubblicato e le aggiunge al manifest"""
+    manifest = context.get("fingerprint")
+    published = manifest["assets"][DATASET_FILE]["file"] if manifest else DATASET_FILE
+    with open(out_dir / published, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    cache_path = context["root"] / CACHE_FILE
+    ids, neighbours, cache, recomputed = compute(available_cars(data), load_cache(cache_path))
+    save_cache(cache_path, cache)
+
+    doc = {"format": FORMAT, "k": K, "ids": ids, "neighbours": neighbours}
+    payload = json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if manifest:
+        rel = fingerprint.register_asset(out_dir, manifest, SIMILAR_FILE, payload)
+    else:
+        rel = SIMILAR_FILE
+        (out_dir / rel).write_bytes(payload)
+
+    print(f"Auto simili: {len(ids)} auto, {recomputed} righe ricalcolate, {len(payload) / 1024:.1f} KB ({rel})")
+    return {"file": rel, "bytes": len(payload), "recomputed": recomputed}
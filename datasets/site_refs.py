@@ -0,0 +1,99 @@
+"""
+Utility per trovare e risolvere i riferimenti ad asset locali
+(immagini, CSS, JS, JSON) dentro HTML, CSS, moduli JS e dataset.
+
+Tutti i percorsi restituiti sono relativi alla root del sito, in formato POSIX
+(es. "cars/audi/a4-a4216300126/main.jpg").
+"""
+import posixpath
+import re
+
+ASSET_SUFFIXES = {".css", ".js", ".json", ".webp", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".avif", ".ico"}
+
+# Un riferimento è una stringa racchiusa da virgolette o da url(...) che termina con un'estensione nota
+REFERENCE_RE = re.compile(
+    r"""(?<=["'(])([^"'()\s<>]+?\.(?:css|js|json|webp|jpe?g|png|gif|svg|avif|ico))(?=[?#"')])""",
+    re.IGNORECASE,
+)
+
+# I percorsi usati a runtime (fetch, img.src, gallery del dataset) si risolvono rispetto alla pagina
+PAGE_DIRS = ("pages", "")
+
+_EXTERNAL_PREFIXES = ("http:", "https:", "//", "data:", "mailto:", "tel:", "blob:")
+
+
+def is_local(ref):
+    """True se il riferimento punta a un file del sito (non a un URL esterno)"""
+    return not ref.lower().startswith(_EXTERNAL_PREFIXES)
+
+
+def normalize(base_dir, ref):
+    """Risolve ref rispetto a base_dir; None se esce dalla root del sito"""
+    if ref.startswith('/'):
+        path = ref.lstrip('/')
+    else:
+        path = posixpath.normpath(posixpath.join(base_dir, ref))
+    if path == '.' or path.startswith('../') or path == '..':
+        return None
+    return path
+
+
+def base_dirs_for(rel_path):
+    """Cartelle rispetto a cui provare a risolvere i riferimenti contenuti in rel_path"""
+    own_dir = posixpath.dirname(rel_path)
+    if rel_path.endswith(('.js', '.json')):
+        # import statici relativi al modulo, fetch/src relativi alla pagina che li usa
+        return [own_dir] + [d for d in PAGE_DIRS if d != own_dir]
+    return [own_dir]
+
+
+def resolve(ref, rel_path, known):
+    """
+    Trova il file a cui punta ref (scritto dentro rel_path).
+
+    Args:
+        ref: riferimento così come compare nel testo
+        rel_path: file che contiene il riferimento
+        known: insieme (o dict) dei percorsi esistenti
+
+    Returns:
+        percorso relativo alla root, oppure None se non corrisponde a nessun file noto
+    """
+    if not is_local(ref):
+        return None
+    for base in base_dirs_for(rel_path):
+        candidate = normalize(base, ref)
+        if candidate is not None and candidate in known:
+            return candidate
+    return None
+
+
+def find_references(text, rel_path, known):
+    """Restituisce l'insieme dei file noti referenziati da text"""
+    found = set()
+    for match in REFERENCE_RE.finditer(text):
+        target = resolve(match.group(1), rel_path, known)
+        if target is not None:
+            found.add(target)
+    return found
+
+
+def rewrite_references(text, rel_path, replacements):
+    """
+    Riscrive i riferimenti presenti in text.
+
+    Args:
+        replacements: dict percorso originale -> nuovo percorso (relativi alla root)
+
+    Viene cambiato solo il nome del file: la parte di cartella del riferimento
+    resta quella scritta nel sorgente.
+    """
+    def _replace(match):
+        ref = match.group(1)
+        target = resolve(ref, rel_path, replacements)
+        if target is None:
+            return ref
+        new_name = posixpath.basename(replacements[target])
+        return ref[:ref.rfind('/') + 1] + new_name
+
+    return REFERENCE_RE.sub(_replace, text)
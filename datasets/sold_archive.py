@@ -0,0 +1,355 @@
+"""
+Archivio delle auto vendute.
+
+Le auto vendute da più di ARCHIVE_AFTER_DAYS giorni escono da dataset.json (che
+resta grande quanto lo stock attuale) e vengono aggiunte in coda a
+datasets/archive/sold.jsonl, una riga JSON per operazione:
+
+    {"op": "archive", "date": ..., "brand": "fiat", "car": {...}, "photos": "photos/fiat/panda-ftp2018.zip"}
+    {"op": "restore", "date": ..., "id": "fiat-ftp201812"}
+
+Il file non viene mai riscritto: lo stato dell'archivio è la riproduzione delle
+righe in ordine (un ripristino annulla l'archiviazione precedente della stessa
+auto). Le foto escono da cars/ (quindi anche dal sito pubblicato) e finiscono in
+datasets/archive/photos/ in uno di questi modi:
+
+    move        cartella spostata così com'è
+    zip         un file zip per auto (senza ricompressione)
+    downscale   zip con le foto ridotte a DOWNSCALE_SIZE (il ripristino riporta le foto ridotte)
+
+La data di vendita è "date_sold", impostata da gen_id.py quando un'auto viene
+segnata come venduta; per le auto vendute prima che esistesse si usa date_added.
+
+Uso:
+    python datasets/sold_archive.py                      # archivia le auto vendute da più di 90 giorni
+    python datasets/sold_archive.py --days 30 --photos zip
+    python datasets/sold_archive.py --list [TESTO]       # cerca nell'archivio
+    python datasets/sold_archive.py --restore ID         # riporta un'auto nel dataset
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import dataset_sync
+import inventory
+import validator
+
+SITE_ROOT = Path(__file__).parent.parent
+DATASET_FILE = Path(__file__).parent / "dataset.json"
+ARCHIVE_DIR = Path(__file__).parent / "archive"
+ARCHIVE_NAME = "sold.jsonl"
+PHOTOS_DIR = "photos"
+
+ARCHIVE_AFTER_DAYS = 90
+SOLD_DATE_FIELD = "date_sold"
+PHOTO_MODES = ("move", "zip", "downscale")
+DOWNSCALE_SIZE = (600, 400)
+DOWNSCALE_QUALITY = 75
+
+
+def sold_date(car):
+    """Data di vendita (date_sold, oppure date_added per le auto vendute prima del campo); None se non venduta"""
+    if not car.get('venduto'):
+        return None
+    value = car.get(SOLD_DATE_FIELD) or car.get('date_added')
+    try:
+        return datetime.strptime(value, inventory.DATE_FORMAT)
+    except (TypeError, ValueError):
+        return datetime(1970, 1, 1)
+
+
+def due_for_archive(data, days=ARCHIVE_AFTER_DAYS, now=None):
+    """(brand, auto) vendute da più di days giorni"""
+    limit = (now or datetime.now()) - timedelta(days=days)
+    return [
+        (brand, car) for brand in data['brands'] for car in brand['cars']
+        if sold_date(car) is not None and sold_date(car) <= limit
+    ]
+
+
+class SoldArchive:
+    """Archivio append-only: lettura per riproduzione delle righe, scrittura solo in coda"""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, root=SITE_ROOT):
+        self.dir = Path(archive_dir)
+        self.path = self.dir / ARCHIVE_NAME
+        self.root = Path(root)
+
+    def entries(self):
+        """id -> ultima riga "archive" delle auto attualmente archiviate (in ordine di archiviazione)"""
+        archived = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record['op'] == "archive":
+                        archived.pop(record['car']['id'], None)
+                        archived[record['car']['id']] = record
+                    elif record['op'] == "restore":
+                        archived.pop(record['id'], None)
+        except FileNotFoundError:
+            pass
+        return archived
+
+    def _append(self, records):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def search(self, search_term=""):
+        """Righe "archive" che contengono search_term (in minuscolo), dalla più recente"""
+        found = []
+        for record in reversed(list(self.entries().values())):
+            brand = {"id": record['brand'], "name": record['car'].get('brand', record['brand'])}
+            if not search_term or search_term in inventory.searchable_text(brand, record['car']):
+                found.append(record)
+        return found
+
+    def display_text(self, record):
+        car = record['car']
+        brand = {"name": car.get('brand', record['brand'])}
+        sold = car.get(SOLD_DATE_FIELD) or car.get('date_added', '?')
+        return f"{inventory.display_text(brand, car)} - venduta il {sold[:10]}"
+
+    def reserved(self):
+        """Id e cartelle delle auto archiviate: non vanno riassegnati a nuove auto"""
+        entries = self.entries()
+        folders = {validator.car_folder(r['car']) for r in entries.values()} - {None}
+        return set(entries), folders
+
+    # --- foto ---
+
+    def _car_dir(self, car):
+        folder = validator.car_folder(car)
+        return self.root / "cars" / folder if folder else None
+
+    def pack_photos(self, car, mode="move"):
+        """
+        Sposta le foto di un'auto da cars/ all'archivio.
+
+        Returns:
+            percorso relativo alla cartella dell'archivio, oppure None se l'auto non ha foto
+        """
+        source = self._car_dir(car)
+        if source is None or not source.is_dir():
+            return None
+        folder = validator.car_folder(car)
+        if mode == "move":
+            target = self.dir / PHOTOS_DIR / folder
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(source), str(target))
+        else:
+            target = self.dir / PHOTOS_DIR / f"{folder}.zip"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f".{target.name}.tmp")
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as archive:
+                for path in sorted(source.iterdir()):
+                    if path.is_file():
+                        data = _downscale(path) if mode == "downscale" else path.read_bytes()
+                        archive.writestr(path.name, data)
+            os.replace(tmp_path, target)
+            shutil.rmtree(source)
+        return target.relative_to(self.dir).as_posix()
+
+    def unpack_photos(self, record):
+        """
+        Riporta in cars/ le foto di un'auto archiviata. Lo zip resta nell'archivio
+        finché il ripristino non è confermato (mark_restored): se il salvataggio
+        del dataset fallisce, cancel_restore toglie la copia da cars/.
+        """
+        target = self._car_dir(record['car'])
+        if not record.get('photos') or target is None or target.exists():
+            return
+        source = self.dir / record['photos']
+        if not source.exists():
+            # Foto mai spostate (errore durante l'archiviazione): sono ancora in cars/ o perse
+            return
+        if source.suffix == ".zip":
+            target.mkdir(parents=True)
+            with zipfile.ZipFile(source) as archive:
+                archive.extractall(target)
+        elif source.is_dir():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(source), str(target))
+
+    # --- operazioni ---
+
+    def archive(self, data, cars, photo_mode="move", now=None):
+        """
+        Archivia le auto indicate: righe in coda all'archivio, poi tolte da data (sul posto).
+
+        Le foto vanno spostate con move_photos dopo aver salvato il dataset.
+
+        Args:
+            cars: lista di (brand, auto) di data
+
+        Returns:
+            righe scritte nell'archivio
+        """
+        date = (now or datetime.now()).strftime(inventory.DATE_FORMAT)
+        records = []
+        for brand, car in cars:
+            folder = validator.car_folder(car)
+            photos = None
+            if folder and (self.root / "cars" / folder).is_dir():
+                photos = f"{PHOTOS_DIR}/{folder}" + ("" if photo_mode == "move" else ".zip")
+            records.append({"op": "archive", "date": date, "brand": brand['id'], "car": car, "photos": photos})
+        # Prima l'archivio (scrittura sincronizzata), poi il dataset: un'interruzione non perde auto
+        self._append(records)
+        archived = {id(car) for _, car in cars}
+        for brand in data['brands']:
+            brand['cars'] = [car for car in brand['cars'] if id(car) not in archived]
+        return records
+
+    def rollback(self, records, data):
+        """Salvataggio del dataset annullato: le auto tornano nei loro brand e l'archiviazione viene annullata"""
+        brands = {brand['id']: brand for brand in data['brands']}
+        for record in records:
+            brands[record['brand']]['cars'].append(record['car'])
+        self._append([{"op": "restore", "date": record['date'], "id": record['car']['id']} for record in records])
+
+    def move_photos(self, records, photo_mode="move"):
+        """Sposta nell'archivio le foto delle auto archiviate; restituisce gli errori"""
+        errors = []
+        for record in records:
+            try:
+                self.pack_photos(record['car'], photo_mode)
+            except OSError as e:
+                errors.append(f"{record['car']['id']}: {e}")
+        return errors
+
+    def restore(self, data, car_id):
+        """
+        Riporta un'auto archiviata nel suo brand (in data, sul posto) e le sue foto in cars/.
+
+        Dopo aver salvato il dataset va chiamato mark_restored.
+
+        Returns:
+            (brand, auto) ripristinata
+        """
+        record = self.entries().get(car_id)
+        if record is None:
+            raise ValueError(f"Auto {car_id} non presente nell'archivio")
+        if any(car.get('id') == car_id for brand in data['brands'] for car in brand['cars']):
+            raise ValueError(f"L'auto {car_id} è già nel dataset")
+        brand = next((b for b in data['brands'] if b['id'] == record['brand']), None)
+        if brand is None:
+            raise ValueError(f"Il brand '{record['brand']}' non esiste più nel dataset")
+        self.unpack_photos(record)
+        car = dict(record['car'])
+        brand['cars'].append(car)
+        return brand, car
+
+    def cancel_restore(self, data, brand, car):
+        """Salvataggio del dataset annullato dopo restore: l'auto esce dal brand e le foto tornano nell'archivio"""
+        brand['cars'][:] = [c for c in brand['cars'] if c is not car]
+        record = self.entries().get(car['id'])
+        target = self._car_dir(car)
+        if not record or not record.get('photos') or target is None or not target.is_dir():
+            return
+        source = self.dir / record['photos']
+        if source.suffix == ".zip":
+            # Lo zip è ancora nell'archivio (unpack_photos non lo elimina): basta togliere la copia
+            if source.exists():
+                shutil.rmtree(target)
+        elif not source.exists():
+            source.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(target), str(source))
+
+    def mark_restored(self, car_id, now=None):
+        """Conferma il ripristino (dopo il salvataggio del dataset) ed elimina lo zip delle foto ormai in cars/"""
+        record = self.entries().get(car_id)
+        date = (now or datetime.now()).strftime(inventory.DATE_FORMAT)
+        self._append([{"op": "restore", "date": date, "id": car_id}])
+        if record and (record.get('photos') or '').endswith(".zip"):
+            (self.dir / record['photos']).unlink(missing_ok=True)
+
+
+def _downscale(path):
+    """Foto ridotta a DOWNSCALE_SIZE nello stesso formato (i byte originali se non è un'immagine)"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            image_format = img.format
+            img.thumbnail(DOWNSCALE_SIZE)
+            buffer = io.BytesIO()
+            if image_format == 'JPEG':
+                img.save(buffer, image_format, quality=DOWNSCALE_QUALITY, optimize=True)
+            else:
+                img.save(buffer, image_format)
+        return buffer.getvalue()
+    except (OSError, ValueError):
+        return Path(path).read_bytes()
+
+
+def refresh_gallery_meta(car, root=SITE_ROOT):
+    """Dopo un ripristino da foto ridotte pesi e dimensioni non sono più quelli registrati"""
+    import image_meta
+
+    if car.get(image_meta.META_FIELD) and not image_meta.is_current(car, root):
+        car.pop(image_meta.META_FIELD)
+        image_meta.ensure_gallery_meta(car, root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivia le auto vendute e le ripristina")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archivia le auto vendute da più di DAYS giorni (default: {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--photos", choices=PHOTO_MODES, default="move", help="come archiviare le foto (default: move)")
+    parser.add_argument("--dry-run", action="store_true", help="elenca soltanto le auto da archiviare")
+    parser.add_argument("--list", nargs='?', const="", metavar="TESTO", help="cerca nelle auto archiviate")
+    parser.add_argument("--restore", metavar="ID", help="riporta un'auto archiviata nel dataset")
+    args = parser.parse_args()
+
+    archive = SoldArchive()
+    if args.list is not None:
+        records = archive.search(args.list.lower())
+        for record in records:
+            print(f"{record['car']['id']}: {archive.display_text(record)}")
+        print(f"\n{len(records)} auto archiviate")
+        return
+
+    sync = dataset_sync.SyncState(DATASET_FILE)
+    data = sync.load()
+
+    if args.restore:
+        brand, car = archive.restore(data, args.restore)
+        refresh_gallery_meta(car)
+        if not sync.save(data).written:
+            archive.cancel_restore(data, brand, car)
+            print("Salvataggio annullato: conflitti con le modifiche di un altro operatore, riprova")
+            return
+        archive.mark_restored(args.restore)
+        print(f"Ripristinata {car['name']} ({car['id']}) in {brand['name']}")
+        return
+
+    cars = due_for_archive(data, args.days)
+    for brand, car in cars:
+        print(f"{car['id']}: {inventory.display_text(brand, car)}")
+    print(f"\n{len(cars)} auto vendute da più di {args.days} giorni")
+    if args.dry_run or not cars:
+        return
+
+    records = archive.archive(data, cars, args.photos)
+    if not sync.save(data).written:
+        archive.rollback(records, data)
+        print("Salvataggio annullato: conflitti con le modifiche di un altro operatore, riprova")
+        return
+    for error in archive.move_photos(records, args.photos):
+        print(f"Foto non archiviate: {error}")
+    print(f"{len(records)} auto archiviate in {archive.path}")
+
+
+if __name__ == "__main__":
+    main()
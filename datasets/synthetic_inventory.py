@@ -0,0 +1,140 @@
+"""
+Generatore di inventari sintetici per le prove di carico.
+
+Parte da dataset.json: usa gli stessi brand, gli stessi campi e le stesse
+distribuzioni dei valori. I campi tecnici (cilindrata, cavalli, kw,
+carburante, cambio, posti) vengono copiati insieme da un'auto reale, così le
+combinazioni restano plausibili; chilometraggio, anno e prezzo sono quelli di
+un'auto reale con una variazione casuale; condizioni, euro, neopatentati e
+venduto seguono le frequenze osservate. Gli id sono assegnati con
+CarIdAllocator come in gen_id.py e, come nell'editor, solo le
+AGGIUNTO_LIMIT auto più recenti hanno aggiunto=true.
+
+Le immagini non esistono su disco: per validare un inventario sintetico usare
+validator.validate_inventory(data, check_files=False).
+
+Uso:
+    python datasets/synthetic_inventory.py 10000 --out /tmp/inventory-10k.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import car_ids
+import inventory
+
+DATASET_FILE = Path(__file__).parent / "dataset.json"
+TECH_FIELDS = ("cilindrata", "cavalli", "kw", "carburante", "tipo_cambio", "posti")
+SAMPLED_FIELDS = ("condizioni", "euro", "neopatentati", "venduto", "sub_name", "details")
+# Peso dei brand senza auto nel dataset reale rispetto a un brand con un'auto
+EMPTY_BRAND_WEIGHT = 0.3
+# Le date di inserimento coprono gli ultimi DATE_SPAN_DAYS giorni
+DATE_SPAN_DAYS = 3 * 365
+GALLERY_SIZE = 8
+
+
+def load_template(path=DATASET_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _real_cars(template):
+    return [(brand, car) for brand in template['brands'] for car in brand.get('cars', [])]
+
+
+def _gallery(brand_id, folder, ext):
+    base = f"../cars/{brand_id}/{folder}"
+    return [f"{base}/main{ext}"] + [f"{base}/main{i}{ext}" for i in range(1, GALLERY_SIZE)]
+
+
+def generate(count, template=None, seed=0, now=None):
+    """
+    Crea un inventario di count auto con la stessa struttura di dataset.json.
+
+    Args:
+        count: numero di auto
+        template: dataset reale da cui prendere brand e distribuzioni
+        seed: seme del generatore (stesso seme, stesso inventario)
+        now: data di riferimento per date_added (default: adesso)
+
+    Returns:
+        dict con la lista 'brands', come dataset.json
+    """
+    template = template or load_template()
+    real = _real_cars(template)
+    if not real:
+        raise ValueError("Il dataset di partenza non contiene auto")
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(microsecond=0)
+
+    brands = [{key: value for key, value in b.items() if key != 'cars'} for b in template['brands']]
+    for brand in brands:
+        brand['cars'] = []
+    names_by_brand = {}
+    for brand, car in real:
+        names_by_brand.setdefault(brand['id'], []).append(car['name'])
+    all_names = [car['name'] for _, car in real]
+    weights = [len(names_by_brand.get(b['id'], [])) or EMPTY_BRAND_WEIGHT for b in brands]
+
+    with_gallery = sum(1 for _, car in real if car.get('gallery')) / len(real)
+    extensions = [car['image'].rsplit('.', 1)[-1] for _, car in real if car.get('image')] or ["webp"]
+    allocator = car_ids.CarIdAllocator()
+
+    generated = []
+    for brand in rng.choices(brands, weights=weights, k=count):
+        source = rng.choice(real)[1]
+        car = {
+            "brand": brand['name'],
+            "name": rng.choice(names_by_brand.get(brand['id']) or all_names),
+        }
+        for field in SAMPLED_FIELDS:
+            car[field] = rng.choice(real)[1].get(field, '')
+        car["chilometraggio"] = max(0, int(source['chilometraggio'] * rng.uniform(0.6, 1.4)) // 1000 * 1000)
+        car["anno"] = min(now.year, max(1990, source['anno'] + rng.randint(-3, 3)))
+        car["prezzo"] = float(max(500, round(source['prezzo'] * rng.uniform(0.7, 1.3), -2)))
+        for field in TECH_FIELDS:
+            car[field] = source[field]
+
+        added = now - timedelta(seconds=rng.randrange(DATE_SPAN_DAYS * 86400))
+        car_id, folder = allocator.allocate(brand['id'], car['name'], car['chilometraggio'], car['anno'], added)
+        car["id"] = car_id
+        car["aggiunto"] = False
+        car["date_added"] = added.strftime(inventory.DATE_FORMAT)
+        if rng.random() < with_gallery:
+            car["gallery"] = _gallery(brand['id'], folder, '.' + rng.choice(extensions))
+            car["image"] = car["gallery"][0]
+        brand['cars'].append(car)
+        generated.append((added, car))
+
+    # Solo le più recenti restano tra le "nuove arrivate", come in gen_id.py
+    generated.sort(key=lambda item: item[0], reverse=True)
+    for _, car in generated[:inventory.AGGIUNTO_LIMIT]:
+        car["aggiunto"] = True
+    return {"brands": brands}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un inventario sintetico con la struttura di dataset.json")
+    parser.add_argument("count", type=int, help="numero di auto")
+    parser.add_argument("--out", type=Path, help="file di destinazione (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0, help="seme del generatore (default: 0)")
+    parser.add_argument("--template", type=Path, default=DATASET_FILE, help="dataset di partenza")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = generate(args.count, load_template(args.template), args.seed)
+    elapsed = time.perf_counter() - start
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"{args.count} auto generate in {elapsed:.2f} s -> {args.out}")
+    else:
+        json.dump(data, sys.stdout, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Anteprime delle immagini per il tab Modifica Auto.
+
+Le miniature vengono salvate in datasets/.thumbnails/ come PNG, con un nome
+ricavato da percorso, data di modifica e dimensione dell'originale: finché la
+foto non cambia l'originale (spesso 1 MB) non viene più decodificato. Le
+PhotoImage di Tk restano in memoria in una cache LRU di dimensione limitata.
+La generazione delle miniature mancanti avviene in thread separati; Tk viene
+usato solo dal thread principale. Ogni scrittura usa un file temporaneo
+proprio, quindi due thread possono chiedere la stessa miniatura.
+
+Le miniature di foto rimosse o sostituite non servono più (la chiave cambia):
+prune_cache le elimina dopo PRUNE_AFTER_DAYS giorni (all'avvio dell'editor e
+a ogni aggiornamento delle miniature del watch).
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+THUMB_SIZE = (120, 80)
+CACHE_DIR = Path(__file__).parent / ".thumbnails"
+POLL_MS = 30
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# Le miniature non più usate restano questo tempo (es. foto scelte ma non ancora copiate in cars/)
+PRUNE_AFTER_DAYS = 1
+
+
+def cache_key(image_path):
+    """Chiave della miniatura: cambia se il file viene modificato"""
+    stat = os.stat(image_path)
+    source = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def ensure_thumbnail(image_path, cache_dir=CACHE_DIR, size=THUMB_SIZE):
+    """
+    Restituisce il percorso della miniatura PNG, creandola se non esiste.
+
+    Args:
+        image_path: immagine originale
+        cache_dir: cartella della cache su disco
+        size: dimensione massima (larghezza, altezza)
+    """
+    thumb_path = Path(cache_dir) / f"{cache_key(image_path)}.png"
+    if thumb_path.exists():
+        return thumb_path
+
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        # Per i JPEG decodifica direttamente a risoluzione ridotta
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        img = img.convert('RGB')
+        img.thumbnail(size)
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=thumb_path.parent, prefix=thumb_path.stem, suffix='.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
+            try:
+                img.save(tmp, 'PNG', optimize=True)
+            except Exception:
+                tmp.close()
+                os.unlink(tmp_path)
+                raise
+    os.replace(tmp_path, thumb_path)
+    return thumb_path
+
+
+def prune_cache(site_root, cache_dir=CACHE_DIR, older_than_days=PRUNE_AFTER_DAYS):
+    """
+    Elimina le miniature che non corrispondono più a una foto di cars/ (e i
+    file temporanei rimasti), se più vecchie di older_than_days giorni.
+
+    Returns:
+        numero di file eliminati
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+    live = set()
+    for dirpath, _, filenames in os.walk(Path(site_root) / "cars"):
+        for name in filenames:
+            if os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES:
+                try:
+                    live.add(f"{cache_key(os.path.join(dirpath, name))}.png")
+                except OSError:
+                    continue
+    limit = time.time() - older_than_days * 86400
+    removed = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name in live or not entry.is_file():
+            continue
+        try:
+            if entry.stat().st_mtime < limit:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class ThumbnailLoader:
+    """Carica le miniature come PhotoImage, con cache LRU in memoria e generazione in background"""
+
+    def __init__(self, root, capacity=64, workers=2, cache_dir=CACHE_DIR):
+        self.root = root
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self.images = OrderedDict()  # chiave -> PhotoImage
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = []  # (future, chiave, callback)
+        self.polling = False
+
+    def prune(self, site_root):
+        """Pulisce la cache su disco in background (vedi prune_cache)"""
+        self.pool.submit(prune_cache, site_root, self.cache_dir)
+
+    def request(self, image_path, callback):
+        """Chiama callback(PhotoImage) appena la miniatura è disponibile (subito se è in memoria)"""
+        try:
+            key = cache_key(image_path)
+        except OSError:
+            return
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+            callback(image)
+            return
+        future = self.pool.submit(ensure_thumbnail, image_path, self.cache_dir)
+        self.pending.append((future, key, callback))
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        still_pending = []
+        for future, key, callback in self.pending:
+            if not future.done():
+                still_pending.append((future, key, callback))
+                continue
+            try:
+                thumb_path = future.result()
+            except Exception as e:
+                print(f"Errore nella creazione della miniatura: {str(e)}")
+                continue
+            callback(self._remember(key, thumb_path))
+        self.pending = still_pending
+        if self.pending:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+
+    def _remember(self, key, thumb_path):
+        import tkinter as tk
+
+        image = self.images.get(key)
+        if image is None:
+            image = tk.PhotoImage(master=self.root, file=str(thumb_path))
+            self.images[key] = image
+            while len(self.images) > self.capacity:
+                self.images.popitem(last=False)
+        self.images.move_to_end(key)
+        return image
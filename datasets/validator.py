@@ -0,0 +1,303 @@
+"""
+Validazione dello schema di dataset.json.
+
+Lo schema viene compilato una sola volta (all'import) in una funzione di
+controllo per campo, così l'intero inventario si valida in pochi millisecondi.
+Oltre ai tipi e ai valori ammessi controlla che gli id (e le cartelle delle
+immagini) siano unici e che i file di image/gallery esistano, usando un elenco
+delle cartelle in cache (riletto solo se la cartella è cambiata).
+
+Uso:
+    python datasets/validator.py [percorso/dataset.json]
+"""
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+SITE_ROOT = Path(__file__).parent.parent
+
+# Valori ammessi (usati anche dai menu a tendina di gen_id.py)
+CONDIZIONI = ("Usato", "Nuovo", "Usato Ricondizionato", "Buono", "Ottimo", "Eccellente", "Usato Nuovo")
+CARBURANTI = (
+    "Benzina", "Diesel", "GPL", "Mild Hybrid Benzina+Elettrico leggero",
+    "Full Hybrid (HEV) Benzina+Elettrico", "Plug-in Hybrid (PHEV) Benzina+Elettrico con batteria grande",
+    "Plug-in Hybrid (PHEV) Gasolio+Elettrico con batteria grande", "Benzina-GPL",
+    "Benzina-Elettrico-GPL", "Elettrica", "Ibrida"
+)
+TIPI_CAMBIO = ("Manuale", "Automatico")
+EURO = ("Euro 0", "Euro 1", "Euro 2", "Euro 3", "Euro 4", "Euro 5", "Euro 6", "Euro 6A", "Euro 6B", "Euro 6C", "Euro 6D", "Euro 7")
+NEOPATENTATI = ("SI", "NO")
+
+ID_PATTERN = r'^[a-z0-9]+(-[a-z0-9]+)+$'
+DATE_PATTERN = r'^\d{2}-\d{2}-\d{4} \d{2}:\d{2}:\d{2}$'
+IMAGE_PATTERN = r'^\.\./cars/[^/]+/[^/]+/[^/]+$'
+# Sottoclassi come "Euro 5B" sono valide anche se non sono nel menu
+EURO_PATTERN = r'^Euro \d[A-Z]?$'
+
+# Schema di un'auto: campo -> regole
+CAR_SCHEMA = {
+    "id": {"type": "str", "pattern": ID_PATTERN},
+    "brand": {"type": "str", "required": False},
+    "name": {"type": "str", "min_length": 1},
+    "sub_name": {"type": "str", "required": False},
+    "details": {"type": "str", "required": False},
+    "chilometraggio": {"type": "int", "min": 0},
+    "condizioni": {"type": "str", "choices": CONDIZIONI},
+    "anno": {"type": "int", "min": 1900, "max": datetime.now().year + 1},
+    "carburante": {"type": "str", "choices": CARBURANTI},
+    "cilindrata": {"type": "int", "min": 0},
+    "cavalli": {"type": "int", "min": 0},
+    "kw": {"type": "int", "min": 0},
+    "tipo_cambio": {"type": "str", "choices": TIPI_CAMBIO},
+    "euro": {"type": "str", "pattern": EURO_PATTERN},
+    "posti": {"type": "int", "min": 1, "max": 9},
+    "prezzo": {"type": "number", "min": 0},
+    "neopatentati": {"type": "str", "choices": NEOPATENTATI},
+    "venduto": {"type": "bool"},
+    "aggiunto": {"type": "bool"},
+    "date_added": {"type": "str", "pattern": DATE_PATTERN, "required": False},
+    "date_sold": {"type": "str", "pattern": DATE_PATTERN, "required": False},  # per l'archivio (sold_archive.py)
+    "image": {"type": "str", "pattern": IMAGE_PATTERN, "required": False},
+    "gallery": {"type": "list", "items": IMAGE_PATTERN, "required": False},
+    # Una voce per foto della gallery (image_meta.py)
+    "gallery_meta": {"type": "list", "item_fields": ("width", "height", "bytes", "format"), "required": False},
+    "rev": {"type": "int", "min": 0, "required": False},  # contatore delle modifiche (dataset_sync.py)
+}
+
+_TYPE_CHECKS = {
+    "str": (lambda v: isinstance(v, str), "deve essere un testo"),
+    "int": (lambda v: isinstance(v, int) and not isinstance(v, bool), "deve essere un numero intero"),
+    "number": (lambda v: isinstance(v, (int, float)) and not isinstance(v, bool), "deve essere un numero"),
+    "bool": (lambda v: isinstance(v, bool), "deve essere vero/falso"),
+    "list": (lambda v: isinstance(v, list), "deve essere una lista"),
+}
+
+
+def _compile_field(field, rules):
+    """Crea la funzione di controllo di un campo: valore -> messaggio di errore o None"""
+    is_type, type_message = _TYPE_CHECKS[rules["type"]]
+    checks = []
+
+    if "min_length" in rules:
+        min_length = rules["min_length"]
+        checks.append(lambda v: None if len(v.strip()) >= min_length else "non può essere vuoto")
+    if "min" in rules:
+        low = rules["min"]
+        checks.append(lambda v: None if v >= low else f"deve essere almeno {low} (trovato {v})")
+    if "max" in rules:
+        high = rules["max"]
+        checks.append(lambda v: None if v <= high else f"deve essere al massimo {high} (trovato {v})")
+    if "choices" in rules:
+        choices = frozenset(rules["choices"])
+        checks.append(lambda v: None if v in choices else f"valore non ammesso '{v}'")
+    if "pattern" in rules:
+        match = re.compile(rules["pattern"]).match
+        checks.append(lambda v: None if match(v) else f"formato non valido '{v}'")
+    if "items" in rules:
+        item_match = re.compile(rules["items"]).match
+        checks.append(lambda v: next(
+            (f"elemento non valido '{item}'" for item in v if not isinstance(item, str) or not item_match(item)),
+            None,
+        ))
+    if "item_fields" in rules:
+        item_fields = rules["item_fields"]
+        checks.append(lambda v: next(
+            (f"elemento non valido {item!r}" for item in v
+             if not isinstance(item, dict) or any(key not in item for key in item_fields)),
+            None,
+        ))
+
+    def check(value):
+        if not is_type(value):
+            return f"{field}: {type_message} (trovato {value!r})"
+        for single in checks:
+            message = single(value)
+            if message:
+                return f"{field}: {message}"
+        return None
+
+    return check
+
+
+def compile_schema(schema):
+    """Schema -> lista di (campo, obbligatorio, funzione di controllo)"""
+    return [(field, rules.get("required", True), _compile_field(field, rules)) for field, rules in schema.items()]
+
+
+_CAR_CHECKS = compile_schema(CAR_SCHEMA)
+
+
+class DirectoryCache:
+    """Elenco dei file per cartella, riletto solo quando cambia la data di modifica della cartella"""
+
+    def __init__(self):
+        self._listings = {}
+
+    def exists(self, path):
+        folder, name = os.path.split(path)
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return False
+        cached = self._listings.get(folder)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, frozenset(os.listdir(folder)))
+            self._listings[folder] = cached
+        return name in cached[1]
+
+
+_directory_cache = DirectoryCache()
+
+
+def validate_car(car):
+    """Errori di schema di una singola auto (lista di messaggi)"""
+    errors = []
+    for field, required, check in _CAR_CHECKS:
+        if field not in car:
+            if required:
+                errors.append(f"{field}: campo mancante")
+            continue
+        message = check(car[field])
+        if message:
+            errors.append(message)
+    return errors
+
+
+def car_label(brand, car):
+    return f"{brand.get('name', '?')} - {car.get('name', '?')} ({car.get('id', 'senza id')})"
+
+
+def car_folder(car):
+    """Cartella delle immagini (es. "audi/a4-a4216300126") ricavata da image o dalla gallery"""
+    path = car.get('image') or next(iter(car.get('gallery') or []), None)
+    if not isinstance(path, str):
+        return None
+    parts = path.split('/')
+    return '/'.join(parts[2:4]) if len(parts) >= 4 else None
+
+
+def validate_inventory(data, root=SITE_ROOT, check_files=True, directory_cache=None):
+    """
+    Valida l'intero dataset.
+
+    Args:
+        data: contenuto di dataset.json
+        root: radice del sito (per verificare l'esistenza delle immagini)
+        check_files: se False non controlla il filesystem
+        directory_cache: DirectoryCache da usare (default: cache condivisa del modulo)
+
+    Returns:
+        dict etichetta auto/brand -> lista di errori (vuoto se il dataset è valido)
+    """
+    report = {}
+    if not isinstance(data, dict) or not isinstance(data.get('brands'), list):
+        return {"dataset": ["manca la lista 'brands'"]}
+
+    cache = directory_cache or _directory_cache
+    pages_dir = os.path.join(str(root), "pages")
+    seen_ids = {}
+    seen_folders = {}
+    seen_brands = set()
+
+    for brand in data['brands']:
+        brand_errors = []
+        brand_id = brand.get('id')
+        if not isinstance(brand_id, str) or not brand_id:
+            brand_errors.append("id del brand mancante")
+        elif brand_id in seen_brands:
+            brand_errors.append(f"id del brand duplicato '{brand_id}'")
+        seen_brands.add(brand_id)
+        if not isinstance(brand.get('name'), str) or not brand.get('name'):
+            brand_errors.append("nome del brand mancante")
+        if not isinstance(brand.get('cars'), list):
+            brand_errors.append("manca la lista 'cars'")
+        if brand_errors:
+            report[f"Brand {brand_id or '?'}"] = brand_errors
+        if not isinstance(brand.get('cars'), list):
+            continue
+
+        for car in brand['cars']:
+            label = car_label(brand, car) if isinstance(car, dict) else f"{brand_id}: voce non valida"
+            if not isinstance(car, dict):
+                report[label] = ["l'auto deve essere un oggetto"]
+                continue
+            errors = validate_car(car)
+
+            car_id = car.get('id')
+            if isinstance(car_id, str):
+                if car_id in seen_ids:
+                    errors.append(f"id duplicato, già usato da {seen_ids[car_id]}")
+                else:
+                    seen_ids[car_id] = label
+                if isinstance(brand_id, str) and not car_id.startswith(brand_id + '-'):
+                    errors.append(f"l'id deve iniziare con '{brand_id}-'")
+
+            if isinstance(car.get('gallery_meta'), list) and isinstance(car.get('gallery'), list):
+                if len(car['gallery_meta']) != len(car['gallery']):
+                    errors.append(f"gallery_meta: {len(car['gallery_meta'])} voci per {len(car['gallery'])} foto")
+
+            folder = car_folder(car)
+            if folder:
+                if folder in seen_folders and seen_folders[folder] != car_id:
+                    errors.append(f"cartella immagini '{folder}' condivisa con {seen_folders[folder]}")
+                seen_folders.setdefault(folder, car_id)
+
+            if check_files:
+                paths = list(car.get('gallery') or []) if isinstance(car.get('gallery'), list) else []
+                if isinstance(car.get('image'), str) and car['image'] not in paths:
+                    paths.append(car['image'])
+                for img in paths:
+                    if isinstance(img, str) and not cache.exists(os.path.normpath(os.path.join(pages_dir, img))):
+                        errors.append(f"immagine non trovata '{img}'")
+
+            if errors:
+                report[label] = errors
+    return report
+
+
+def format_report(report, limit=None):
+    """Testo leggibile del report, un blocco per auto"""
+    lines = []
+    for n, (label, errors) in enumerate(report.items()):
+        if limit is not None and n >= limit:
+            lines.append(f"... e altre {len(report) - limit} auto con errori")
+            break
+        lines.append(f"{label}:")
+        lines.extend(f"  - {e}" for e in errors)
+    return '\n'.join(lines)
+
+
+def run(out_dir, context):
+    """Step di build: blocca la pubblicazione se il dataset sorgente non è valido"""
+    root = context["root"]
+    with open(root / "datasets" / "dataset.json", 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    report = validate_inventory(data, root)
+    if report:
+        raise ValueError(f"Dataset non valido, pubblicazione annullata:\n{format_report(report)}")
+    return report
+
+
+def main():
+    dataset_path = Path(sys.argv[1]) if len(sys.argv) > 1 else SITE_ROOT / "datasets" / "dataset.json"
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    start = time.perf_counter()
+    report = validate_inventory(data, dataset_path.resolve().parent.parent)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    cars = sum(len(b.get('cars', [])) for b in data.get('brands', []))
+    if report:
+        print(format_report(report))
+        print(f"\n{len(report)} voci con errori su {cars} auto ({elapsed:.1f} ms)")
+        sys.exit(1)
+    print(f"Dataset valido: {cars} auto ({elapsed:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Modalità watch: rigenera i file derivati quando cambiano i sorgenti.
+
+Controlla periodicamente (polling su data di modifica e dimensione, senza
+dipendenze esterne) datasets/, cars/, images/, styles/, scripts/, pages/ e i
+file della radice pubblicati. Ogni sorgente è collegato ai file derivati che
+ne dipendono (DEPENDENCIES):
+
+    foto in cars/             miniature dell'editor, indice degli hash delle foto,
+                              gallery_meta in dataset.json, sito
+    datasets/dataset.json     gallery_meta, sito
+    styles/ scripts/ images/  sito
+    pages/ e file radice      sito
+
+Le modifiche vengono raccolte finché non passano DEBOUNCE_S secondi senza
+altri cambiamenti (un salvataggio dell'editor o una copia di foto sono
+spesso più scritture), poi vengono rigenerati solo i derivati interessati,
+nell'ordine di ARTIFACTS, con il tempo di ciascuno. I lavori sulle immagini
+girano in un pool di thread.
+
+Il sito è un derivato unico: fingerprint, hint e service worker riscrivono
+pagine e riferimenti di tutti gli asset, quindi la build riparte sempre
+dalla copia completa (gli step costosi, come le auto simili, sono già
+incrementali). La build viene fatta in una cartella temporanea e sostituisce
+dist/ solo se riesce: il server di anteprima non vede mai un sito a metà.
+
+Le build del watch sono anteprime: la cronologia delle versioni del dataset
+è una cartella temporanea della sessione (cancellata all'uscita), mai quella
+di pubblicazione, altrimenti ogni salvataggio durante le modifiche
+diventerebbe una versione pubblicata e allungherebbe la catena delle patch.
+
+Le modifiche ai file .py non vengono rilevate: gli step sono già importati,
+per usare il codice nuovo bisogna riavviare il watch.
+
+Uso:
+    python datasets/watch.py                  # build iniziale, poi resta in ascolto
+    python datasets/watch.py --no-initial     # solo le modifiche successive
+    python datasets/watch.py --once           # rigenera tutto ed esce
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import build_site
+import dataset_sync
+import image_meta
+import photo_hashes
+import thumbnails
+
+SITE_ROOT = Path(__file__).parent.parent
+DATASET_FILE = "datasets/dataset.json"
+
+POLL_INTERVAL_S = 1.0
+DEBOUNCE_S = 0.5
+
+WATCHED_DIRS = ["datasets", "cars", "images", "styles", "scripts", "pages"]
+# Non sono sorgenti (datasets/versions/: cronologia scritta dalle build precedenti)
+IGNORED_DIRS = {"datasets/versions", "__pycache__"}
+IGNORED_SUFFIXES = {".lock", ".tmp", ".pyc"}
+
+# Derivati nell'ordine in cui vengono rigenerati (gallery_meta finisce nel dataset pubblicato)
+ARTIFACTS = ["thumbnails", "photo_hashes", "image_meta", "site"]
+
+# (sorgente, estensioni o None per tutte, derivati); vale la prima regola che corrisponde.
+# Le cartelle finiscono con "/", gli altri sono file singoli.
+DEPENDENCIES = [
+    ("cars/", photo_hashes.IMAGE_SUFFIXES, ("thumbnails", "photo_hashes", "image_meta", "site")),
+    (DATASET_FILE, None, ("image_meta", "site")),
+] + [
+    (f"{name}/", None, ("site",)) for name in build_site.STAGED_DIRS
+] + [
+    (name, None, ("site",)) for name in build_site.STAGED_FILES if name != DATASET_FILE
+]
+
+
+def affected_artifacts(rel):
+    """Derivati che dipendono dal file rel (relativo alla root del sito)"""
+    suffix = os.path.splitext(rel)[1].lower()
+    for source, suffixes, artifacts in DEPENDENCIES:
+        if source.endswith('/'):
+            if not rel.startswith(source):
+                continue
+            # Stessi file esclusi dalla copia della build
+            if suffixes is None and suffix in build_site.SKIPPED_SUFFIXES:
+                return set()
+        elif rel != source:
+            continue
+        if suffixes is None or suffix in suffixes:
+            return set(artifacts)
+    return set()
+
+
+def _ignored(rel, name):
+    return name.startswith('.') or rel in IGNORED_DIRS or name in IGNORED_DIRS
+
+
+def snapshot(root):
+    """Percorso relativo -> (data di modifica, byte) dei file controllati"""
+    files = {}
+    root_len = len(str(root)) + 1
+    paths = [root / name for name in WATCHED_DIRS]
+    paths.extend(root / name for name in build_site.STAGED_FILES if '/' not in name)
+    for path in paths:
+        if path.is_file():
+            stat = path.stat()
+            files[path.name] = (stat.st_mtime_ns, stat.st_size)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            rel_dir = dirpath[root_len:].replace(os.sep, '/')
+            dirnames[:] = [d for d in dirnames if not _ignored(f"{rel_dir}/{d}", d)]
+            for name in filenames:
+                if name.startswith('.') or os.path.splitext(name)[1].lower() in IGNORED_SUFFIXES:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue  # rimosso durante la scansione
+                files[f"{rel_dir}/{name}"] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff(before, after):
+    """Percorsi aggiunti, modificati o rimossi tra due snapshot"""
+    changed = {rel for rel, stamp in after.items() if before.get(rel) != stamp}
+    changed.update(rel for rel in before if rel not in after)
+    return changed
+
+
+class Watcher:
+    """Stato del watch: ultimo snapshot, modifiche in attesa e derivati"""
+
+    def __init__(self, root=SITE_ROOT, out_dir=build_site.DEFAULT_OUT_DIR, workers=8,
+                 interval=POLL_INTERVAL_S, debounce=DEBOUNCE_S, versions_dir=None):
+        self.root = Path(root)
+        self.out_dir = Path(out_dir)
+        # Cronologia usa e getta per le anteprime (vedi docstring del modulo)
+        self._own_versions_dir = versions_dir is None
+        self.versions_dir = Path(tempfile.mkdtemp(prefix="yaraauto-watch-versions-")) if versions_dir is None else Path(versions_dir)
+        self.workers = workers
+        self.interval = interval
+        self.debounce = debounce
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.index = photo_hashes.PhotoIndex(self.root, self.root / "datasets" / photo_hashes.INDEX_FILE.name).load()
+        self.files = snapshot(self.root)
+        self.pending = set()
+        self._last_change = None
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self._own_versions_dir:
+            shutil.rmtree(self.versions_dir, ignore_errors=True)
+
+    def poll(self):
+        """Aggiorna lo snapshot; True se ci sono modifiche pronte (trascorso il debounce)"""
+        current = snapshot(self.root)
+        changed = diff(self.files, current)
+        self.files = current
+        if changed:
+            self.pending.update(changed)
+            self._last_change = time.monotonic()
+        return bool(self.pending) and time.monotonic() - self._last_change >= self.debounce
+
+    def rebuild_pending(self):
+        changed = sorted(self.pending)
+        self.pending = set()
+        artifacts = set()
+        for rel in changed:
+            artifacts |= affected_artifacts(rel)
+        if not artifacts:
+            return {}
+        shown = ", ".join(changed[:5]) + (f" e altri {len(changed) - 5}" if len(changed) > 5 else "")
+        print(f"\n[{datetime.now().strftime('%d-%m-%Y %H:%M:%S')}] {len(changed)} file modificati: {shown}")
+        return self.rebuild(artifacts, changed)
+
+    def rebuild(self, artifacts, changed=None):
+        """
+        Rigenera i derivati richiesti, in ordine, stampando il tempo di ciascuno.
+
+        Args:
+            artifacts: nomi da ARTIFACTS
+            changed: file modificati (None = tutti, es. build iniziale)
+
+        Returns:
+            dict nome -> secondi impiegati
+        """
+        photos = None
+        if changed is not None:
+            photos = [rel for rel in changed if rel.startswith("cars/")
+                      and os.path.splitext(rel)[1].lower() in photo_hashes.IMAGE_SUFFIXES]
+        timings = {}
+        total_start = time.perf_counter()
+        for name in ARTIFACTS:
+            if name not in artifacts:
+                continue
+            start = time.perf_counter()
+            try:
+                summary = getattr(self, f"_build_{name}")(photos)
+            except Exception as e:
+                # Un derivato fallito non ferma il watch: si riprova alla prossima modifica
+                summary = f"errore: {e}"
+            timings[name] = time.perf_counter() - start
+            print(f"  {name}: {summary} ({timings[name]:.2f}s)")
+        print(f"Aggiornamento completato in {time.perf_counter() - total_start:.2f}s")
+        return timings
+
+    def _build_thumbnails(self, photos):
+        if photos is None:
+            photos = self.index.scan()
+        paths = [self.root / rel for rel in photos if (self.root / rel).is_file()]
+
+        def _thumbnail(path):
+            try:
+                cached = (thumbnails.CACHE_DIR / f"{thumbnails.cache_key(path)}.png").exists()
+                thumbnails.ensure_thumbnail(path)
+                return not cached
+            except Exception as e:
+                print(f"  Impossibile creare la miniatura di {path.relative_to(self.root)}: {e}")
+                return False
+
+        created = sum(self.pool.map(_thumbnail, paths))
+        pruned = thumbnails.prune_cache(self.root)
+        return f"{created} miniature create, {len(paths) - created} già in cache, {pruned} non più usate eliminate"
+
+    def _build_photo_hashes(self, photos):
+        # refresh() ricalcola solo le foto nuove o con data/dimensione cambiate
+        hashed, removed = self.index.refresh(workers=self.workers)
+        self.index.save()
+        return f"{hashed} foto analizzate, {removed} rimosse dall'indice"
+
+    def _build_image_meta(self, photos):
+        sync = dataset_sync.SyncState(self.root / DATASET_FILE)
+        data = sync.load()
+        updated, read, failed = image_meta.backfill(data, self.root, workers=self.workers)
+        if not updated:
+            return f"nessuna auto da aggiornare ({read} foto lette)"
+        if not sync.save(data).written:
+            return "salvataggio annullato per conflitti con un altro operatore"
+        # La scrittura è nostra: non deve far ripartire il watch (la build del sito la legge già)
+        stamp = os.stat(self.root / DATASET_FILE)
+        self.files[DATASET_FILE] = (stamp.st_mtime_ns, stamp.st_size)
+        return f"{updated} auto aggiornate, {read} foto lette, {failed} non leggibili"
+
+    def _build_site(self, photos):
+        building = self.out_dir.with_name(self.out_dir.name + ".building")
+        previous = self.out_dir.with_name(self.out_dir.name + ".old")
+        built = False
+        try:
+            build_site.build(self.root, building, versions_dir=self.versions_dir)
+            built = True
+        except Exception as e:
+            return f"build interrotta, {self.out_dir.name}/ non modificata: {e}"
+        finally:
+            # Anche con Ctrl+C durante la build non resta una copia a metà
+            if not built:
+                shutil.rmtree(building, ignore_errors=True)
+        shutil.rmtree(previous, ignore_errors=True)
+        if self.out_dir.exists():
+            self.out_dir.rename(previous)
+        building.rename(self.out_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+        return f"{self.out_dir.name}/ aggiornata"
+
+    def run_forever(self):
+        print(f"In ascolto su {', '.join(WATCHED_DIRS)} ({len(self.files)} file, Ctrl+C per uscire)")
+        while True:
+            time.sleep(self.interval if not self.pending else min(self.interval, self.debounce))
+            if self.poll():
+                self.rebuild_pending()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rigenera i file derivati quando cambiano i sorgenti")
+    parser.add_argument("--out", default=str(build_site.DEFAULT_OUT_DIR), help="cartella del sito (default: dist/)")
+    parser.add_argument("--versions-dir", default=None, help="cronologia delle versioni del dataset per le anteprime (default: cartella temporanea; non usare quella di pubblicazione)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S, help=f"secondi tra due controlli (default: {POLL_INTERVAL_S})")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_S, help=f"secondi senza modifiche prima di rigenerare (default: {DEBOUNCE_S})")
+    parser.add_argument("--workers", type=int, default=8, help="thread per i lavori sulle immagini (default: 8)")
+    parser.add_argument("--no-initial", action="store_true", help="non rigenera tutto all'avvio")
+    parser.add_argument("--once", action="store_true", help="rigenera tutto una volta ed esce")
+    args = parser.parse_args()
+
+    watcher = Watcher(SITE_ROOT, Path(args.out), workers=args.workers, interval=args.interval, debounce=args.debounce,
+                      versions_dir=args.versions_dir)
+    try:
+        if args.once or not args.no_initial:
+            watcher.rebuild(set(ARTIFACTS))
+        if args.once:
+            return
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        print("\nWatch terminato")
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
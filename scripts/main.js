@@ -36,7 +36,8 @@ async function init() {
         // 4. Setup Filters
         // Create a wrapper object to expose generateCarSections to filters
         const carDealerInterface = {
-            generateCarSections: (filters) => generateCarSections(filters)
+            generateCarSections: (filters) => generateCarSections(filters),
+            data: app.data
         };
         
         console.log('🔍 Setup filtri...');
@@ -4,20 +4,24 @@
  */
 
 import { showError, hidePageLoader } from './utils.js';
+import { decodeColumns } from './columnar.js';
+import { prepareIndex, buildIndex } from './search.js';
+
+const DATASET_URL = '../datasets/dataset.json';
+const VERSION_URL = '../datasets/version.json';
+const CACHE_KEY = 'yaraauto-dataset';
+
+// Version pointer of the loaded dataset (null for the plain dataset.json)
+let latestPointer = null;
+let searchIndexPromise = null;
+let similarCarsPromise = null;
 
 // Load JSON data
 export async function loadData() {
-    console.log('📡 Tentativo di caricamento da: ../datasets/dataset.json');
+    console.log(`📡 Tentativo di caricamento da: ${DATASET_URL}`);
     
     try {
-        const response = await fetch('../datasets/dataset.json');
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status} - ${response.statusText}`);
-        }
-        
-        const text = await response.text();
-        const data = JSON.parse(text);
+        const data = await loadLatestDataset();
         
         console.log('✅ JSON parsato con successo');
         
@@ -43,6 +47,179 @@ export async function loadData() {
     }
 }
 
+async function fetchJson(url) {
+    const response = await fetch(url);
+    
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status} - ${response.statusText}`);
+    }
+    
+    const text = await response.text();
+    return JSON.parse(text);
+}
+
+// Latest dataset: cached copy + delta patches when possible, full file otherwise
+async function loadLatestDataset() {
+    let pointer = null;
+    try {
+        const response = await fetch(VERSION_URL, { cache: 'no-cache' });
+        if (response.ok) pointer = await response.json();
+    } catch (error) {
+        console.warn('⚠️ Puntatore versione non disponibile:', error);
+    }
+    
+    // No published versions (e.g. local preview of the sources): plain full download
+    if (!pointer) return fetchJson(DATASET_URL);
+    latestPointer = pointer;
+    
+    const base = new URL(VERSION_URL, document.baseURI);
+    const cached = readCachedDataset();
+    
+    if (cached && cached.hash === pointer.hash) {
+        console.log(`✅ Dataset v${pointer.version} già in cache`);
+        return cached.data;
+    }
+    
+    if (cached) {
+        try {
+            const data = await applyPatchChain(cached, pointer, base);
+            if (data) {
+                console.log(`✅ Dataset aggiornato con patch alla v${pointer.version}`);
+                writeCachedDataset(pointer, data);
+                return data;
+            }
+        } catch (error) {
+            console.warn('⚠️ Patch non applicabili, scarico il dataset completo:', error);
+        }
+    }
+    
+    const data = await fetchFullDataset(pointer, base);
+    writeCachedDataset(pointer, data);
+    return data;
+}
+
+// Columnar catalogue when published (smaller and faster to parse), plain JSON otherwise
+async function fetchFullDataset(pointer, base) {
+    if (pointer.columns) {
+        try {
+            return decodeColumns(await fetchJson(new URL(pointer.columns, base)));
+        } catch (error) {
+            console.warn('⚠️ Catalogo a colonne non disponibile, uso il JSON completo:', error);
+        }
+    }
+    return fetchJson(new URL(pointer.full, base));
+}
+
+// Search index of the loaded dataset: published with the version, built from the data otherwise
+export function loadSearchIndex(data) {
+    if (!searchIndexPromise) {
+        searchIndexPromise = (async () => {
+            if (latestPointer && latestPointer.search) {
+                try {
+                    return prepareIndex(await fetchJson(new URL(latestPointer.search, new URL(VERSION_URL, document.baseURI))));
+                } catch (error) {
+                    console.warn('⚠️ Indice di ricerca non disponibile, lo costruisco dai dati:', error);
+                }
+            }
+            return buildIndex(data);
+        })();
+    }
+    return searchIndexPromise;
+}
+
+// Similar cars computed by the publisher: Map car id -> ids of the most similar cars (null when not published)
+export function loadSimilarCars() {
+    if (!similarCarsPromise) {
+        similarCarsPromise = (async () => {
+            if (!latestPointer || !latestPointer.similar) return null;
+            try {
+                const doc = await fetchJson(new URL(latestPointer.similar, new URL(VERSION_URL, document.baseURI)));
+                if (doc.format !== 'similar/1') throw new Error(`formato ${doc.format}`);
+                return new Map(doc.ids.map((id, n) => [id, doc.neighbours[n].map(other => doc.ids[other])]));
+            } catch (error) {
+                console.warn('⚠️ Auto simili non disponibili:', error);
+                return null;
+            }
+        })();
+    }
+    return similarCarsPromise;
+}
+
+// Null when the chain does not start from the cached version or costs more than the full file
+async function applyPatchChain(cached, pointer, base) {
+    const start = pointer.patches.findIndex(p => p.from_hash === cached.hash);
+    if (start === -1) return null;
+    
+    const chain = pointer.patches.slice(start);
+    const chainBytes = chain.reduce((sum, p) => sum + p.bytes, 0);
+    if (chainBytes >= (pointer.columns_bytes || pointer.full_bytes)) return null;
+    
+    const patches = await Promise.all(chain.map(p => fetchJson(new URL(p.file, base))));
+    
+    let data = cached.data;
+    let hash = cached.hash;
+    for (const patch of patches) {
+        if (patch.from_hash !== hash) return null;
+        data = applyPatch(data, patch);
+        hash = patch.to_hash;
+    }
+    return hash === pointer.hash ? data : null;
+}
+
+// Same algorithm as apply_patch in datasets/dataset_versions.py
+function applyPatch(data, patch) {
+    const oldBrands = new Map(data.brands.map(b => [b.id, b]));
+    const brands = (patch.brands || data.brands).map(brand => {
+        const source = patch.brands ? oldBrands.get(brand.id) : brand;
+        const meta = { ...brand };
+        delete meta.cars;
+        return { ...meta, cars: source ? [...source.cars] : [] };
+    });
+    const byId = new Map(brands.map(b => [b.id, b]));
+    
+    const removed = new Set(patch.removed || []);
+    const changes = patch.changed || {};
+    brands.forEach(brand => {
+        brand.cars = brand.cars
+            .filter(car => !removed.has(car.id))
+            .map(car => {
+                const change = changes[car.id];
+                if (!change) return car;
+                const updated = { ...car };
+                (change.unset || []).forEach(key => delete updated[key]);
+                return Object.assign(updated, change.set || {});
+            });
+    });
+    
+    (patch.added || []).forEach(entry => byId.get(entry.brand).cars.push(entry.car));
+    
+    Object.entries(patch.order || {}).forEach(([brandId, order]) => {
+        const brand = byId.get(brandId);
+        const cars = new Map(brand.cars.map(car => [car.id, car]));
+        brand.cars = order.map(id => cars.get(id));
+    });
+    
+    return { ...data, brands };
+}
+
+function readCachedDataset() {
+    try {
+        const cached = JSON.parse(localStorage.getItem(CACHE_KEY));
+        return cached && cached.hash && cached.data ? cached : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function writeCachedDataset(pointer, data) {
+    try {
+        localStorage.setItem(CACHE_KEY, JSON.stringify({ version: pointer.version, hash: pointer.hash, data }));
+    } catch (error) {
+        // Storage full or disabled: next visit downloads the full file again
+        console.warn('⚠️ Impossibile salvare il dataset in cache:', error);
+    }
+}
+
 // Filter sold cars and brand without available cars
 function filterSoldCarsAndEmptyBrands(data) {
     if (!data || !data.brands) return data;
@@ -3,7 +3,7 @@
  * Handles image carousels for car cards
  */
 
-import { getCarTitle, getCarEmoji } from './utils.js';
+import { getCarTitle, getCarEmoji, getImageMeta, applyImageSize } from './utils.js';
 
 export const carousels = new Map();
 
@@ -21,6 +21,7 @@ export function createImageCarousel(car) {
         slide.className = 'carousel-slide';
 
         const img = document.createElement('img');
+        applyImageSize(img, getImageMeta(car, index));
         // Lazy load: only first image loads immediately, others use data-src
         if (index === 0) {
             img.src = imageSrc;
@@ -0,0 +1,75 @@
+/**
+ * Columnar Module
+ * Decodes the columnar catalogue written by datasets/columnar.py
+ * into the same { brands: [{ ..., cars: [...] }] } objects as dataset.json
+ */
+
+const TYPED_ARRAYS = {
+    u8: Uint8Array,
+    u16: Uint16Array,
+    i32: Int32Array,
+    f64: Float64Array
+};
+
+// Base64 little-endian buffer -> typed array
+function unpack(text, kind) {
+    const binary = atob(text);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new TYPED_ARRAYS[kind](bytes.buffer);
+}
+
+function decodeColumn(column) {
+    switch (column.type) {
+        case 'bool':
+            return Array.from(unpack(column.data, 'u8'), v => v === 1);
+        case 'int':
+            return unpack(column.data, column.kind);
+        case 'f64':
+            return unpack(column.data, 'f64');
+        case 'dict': {
+            const values = column.values;
+            return Array.from(unpack(column.data, column.kind), code => values[code]);
+        }
+        case 'paths':
+            return column.values.map(([folder, names]) => names.map(name => `${folder}/${name}`));
+        case 'records': {
+            const keys = column.keys;
+            return column.values.map(rows => rows.map(row => Object.fromEntries(keys.map((key, i) => [key, row[i]]))));
+        }
+        default:
+            return column.values;
+    }
+}
+
+export function decodeColumns(doc) {
+    if (!doc || doc.format !== 'columns/1') {
+        throw new Error('Formato a colonne non supportato');
+    }
+
+    const cars = Array.from({ length: doc.count }, () => ({}));
+
+    doc.fields.forEach(field => {
+        const column = doc.columns[field];
+        const missing = new Set(column.missing || []);
+        const values = decodeColumn(column);
+        let next = 0;
+        for (let row = 0; row < doc.count; row++) {
+            if (!missing.has(row)) {
+                cars[row][field] = values[next++];
+            }
+        }
+    });
+
+    let start = 0;
+    const brands = doc.brands.map(meta => {
+        const { count, ...brand } = meta;
+        brand.cars = cars.slice(start, start + count);
+        start += count;
+        return brand;
+    });
+
+    return { brands };
+}
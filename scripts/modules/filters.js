@@ -4,6 +4,10 @@
  */
 
 import { hidePageLoader, showNotification } from './utils.js';
+import { loadSearchIndex } from './api.js';
+import { searchCars } from './search.js';
+
+const SEARCH_DELAY = 200;
 
 // Setup filters
 export function setupFilters(carDealer) {
@@ -38,9 +42,7 @@ export function setupFilters(carDealer) {
     }
     
     if (filterForm) {
-        // Prevent default submit
-        filterForm.addEventListener('submit', (e) => {
-            e.preventDefault();
+        const readFilters = async () => {
             const formData = new FormData(filterForm);
             const filters = Object.fromEntries(formData.entries());
             
@@ -51,7 +53,14 @@ export function setupFilters(carDealer) {
                 }
             });
             
-            carDealer.generateCarSections(filters);
+            await resolveSearch(filters, carDealer.data);
+            return filters;
+        };
+        
+        // Prevent default submit
+        filterForm.addEventListener('submit', async (e) => {
+            e.preventDefault();
+            carDealer.generateCarSections(await readFilters());
             
             // Show notification
             showNotification('Filtri applicati', 'success');
@@ -67,6 +76,18 @@ export function setupFilters(carDealer) {
             }
         });
         
+        // Free-text search updates the results while typing
+        const searchInput = filterForm.querySelector('#searchQuery');
+        if (searchInput) {
+            let searchTimeout;
+            searchInput.addEventListener('input', () => {
+                clearTimeout(searchTimeout);
+                searchTimeout = setTimeout(async () => {
+                    carDealer.generateCarSections(await readFilters());
+                }, SEARCH_DELAY);
+            });
+        }
+        
         // Real-time filtering for select inputs
         /* // DISABLED to match original behavior - only Apply button triggers search
         const selects = filterForm.querySelectorAll('select');
@@ -143,11 +164,23 @@ function setupFilterButtonsVisibility() {
     handleResize(); // Init
 }
 
+// Free-text query -> filters.matchIds (ids of the matching cars, see search.js)
+export async function resolveSearch(filters, data) {
+    delete filters.matchIds;
+    if (!filters.q || !data) return filters;
+    const matches = searchCars(await loadSearchIndex(data), filters.q);
+    if (matches) filters.matchIds = matches;
+    return filters;
+}
+
 // Apply filters to calculate visible cars
 export function applyFilters(cars, filters) {
     if (!cars) return [];
     
     return cars.filter(car => {
+        // Free-text search
+        if (filters.matchIds && !filters.matchIds.has(car.id)) return false;
+        
         // Price Max
         if (filters.prezzoMax && car.prezzo > parseFloat(filters.prezzoMax)) return false;
         // Price Min
@@ -0,0 +1,75 @@
+/**
+ * Search Module
+ * Free-text search over the inverted index built by datasets/search_index.py
+ * (same folding: lowercase, no accents, words of letters and digits)
+ */
+
+const SEARCH_FIELDS = ['brand', 'name', 'sub_name', 'details', 'carburante'];
+
+export function foldText(text) {
+    return String(text).normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+}
+
+export function tokenize(text) {
+    return foldText(text).split(/[^a-z0-9]+/).filter(Boolean);
+}
+
+// Published index -> postings as absolute car numbers
+export function prepareIndex(doc) {
+    if (!doc || doc.format !== 'search/1') {
+        throw new Error('Formato indice di ricerca non supportato');
+    }
+    const postings = doc.postings.map(deltas => {
+        let number = 0;
+        return deltas.map((delta, n) => (number = n === 0 ? delta : number + delta));
+    });
+    return { ids: doc.ids, tokens: doc.tokens, postings };
+}
+
+// Same index built in the browser (local preview of the sources, where no index is published)
+export function buildIndex(data) {
+    const ids = [];
+    const byToken = new Map();
+    data.brands.forEach(brand => {
+        (brand.cars || []).forEach(car => {
+            const number = ids.length;
+            ids.push(car.id);
+            const texts = [brand.name || '', ...SEARCH_FIELDS.map(field => car[field] || '')];
+            new Set(texts.flatMap(tokenize)).forEach(token => {
+                if (!byToken.has(token)) byToken.set(token, []);
+                byToken.get(token).push(number);
+            });
+        });
+    });
+    const tokens = [...byToken.keys()].sort();
+    return { ids, tokens, postings: tokens.map(token => byToken.get(token)) };
+}
+
+// First position whose token is >= term
+function lowerBound(tokens, term) {
+    let low = 0;
+    let high = tokens.length;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (tokens[mid] < term) low = mid + 1;
+        else high = mid;
+    }
+    return low;
+}
+
+// Ids of the cars containing every word of the query as a prefix; null for an empty query
+export function searchCars(index, query) {
+    const terms = tokenize(query);
+    if (terms.length === 0) return null;
+
+    let result = null;
+    for (const term of terms) {
+        const matches = new Set();
+        for (let i = lowerBound(index.tokens, term); i < index.tokens.length && index.tokens[i].startsWith(term); i++) {
+            index.postings[i].forEach(number => matches.add(index.ids[number]));
+        }
+        result = result === null ? matches : new Set([...result].filter(id => matches.has(id)));
+        if (result.size === 0) break;
+    }
+    return result;
+}
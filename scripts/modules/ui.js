@@ -3,9 +3,10 @@
  * Handles DOM manipulation and rendering
  */
 
-import { getBrandEmoji, getCarEmoji, getCarTitle, formatPrice, formatNumber, hidePageLoader, showNotification } from './utils.js';
+import { getBrandEmoji, getCarEmoji, getCarTitle, formatPrice, formatNumber, hidePageLoader, showNotification, getImageMeta, applyImageSize } from './utils.js';
 import { createImageCarousel, carousels, initCarousel } from './carousel.js';
-import { applyFilters } from './filters.js';
+import { applyFilters, resolveSearch } from './filters.js';
+import { loadSimilarCars } from './api.js';
 
 // State
 let loadedData = null;
@@ -14,7 +15,9 @@ let currentLightboxImages = [];
 let currentLightboxIndex = 0;
 let carDetailModal = null;
 let currentCarDetailImages = [];
+let currentCarDetailMeta = [];
 let currentCarDetailIndex = 0;
+let currentCarDetailId = null;
 let mobileFullscreenOverlay = null;
 
 // Initialize UI
@@ -298,6 +301,9 @@ function createCarCard(car, isRecentlyAdded = false) {
         if (car.image && car.image.trim() !== '') {
             const img = document.createElement('img');
             img.src = car.image;
+            if (car.gallery && car.gallery[0] === car.image) {
+                applyImageSize(img, getImageMeta(car, 0));
+            }
             img.loading = 'lazy';
             img.alt = getCarTitle(car);
             img.style.width = '100%';
@@ -848,6 +854,10 @@ function setupCarDetailModal() {
                     <h3>Specifiche Tecniche</h3>
                     <div class="car-specs-grid"></div>
                 </div>
+                <div class="car-detail-similar" hidden>
+                    <h3>Auto simili</h3>
+                    <div class="car-similar-list"></div>
+                </div>
                 <div class="car-detail-contact">
                     <h3>Contattami</h3>
                     <div class="contact-info-direct">
@@ -945,8 +955,11 @@ function updateCarDetailContent(car) {
     const price = carDetailModal.querySelector('.car-detail-price');
     const specsGrid = carDetailModal.querySelector('.car-specs-grid');
     
+    currentCarDetailId = car.id;
+    
     // Images
     currentCarDetailImages = car.gallery && car.gallery.length > 0 ? car.gallery : [car.image];
+    currentCarDetailMeta = currentCarDetailImages.map((_, index) => car.gallery && car.gallery.length > 0 ? getImageMeta(car, index) : null);
     currentCarDetailIndex = 0;
     updateCarDetailCarousel();
     
@@ -997,6 +1010,45 @@ function updateCarDetailContent(car) {
             <span class="car-spec-value">${car.neopatentati === 'SI' || car.neopatentati === true ? '✅ SI' : '❌ NO'}</span>
         </div>
     `;
+    
+    updateSimilarCars(car);
+}
+
+// Find a loaded car by id
+function findCar(id) {
+    for (const brand of loadedData.brands) {
+        const car = (brand.cars || []).find(c => c.id === id);
+        if (car) return car;
+    }
+    return null;
+}
+
+// Similar cars precomputed by the publisher (see datasets/similar_cars.py)
+async function updateSimilarCars(car) {
+    const section = carDetailModal.querySelector('.car-detail-similar');
+    const list = section.querySelector('.car-similar-list');
+    section.hidden = true;
+    list.innerHTML = '';
+    
+    const similar = await loadSimilarCars();
+    // Another car may have been opened while the list was loading
+    if (!similar || currentCarDetailId !== car.id) return;
+    
+    const cars = (similar.get(car.id) || []).map(findCar).filter(Boolean);
+    cars.forEach(other => {
+        const item = document.createElement('button');
+        item.type = 'button';
+        item.className = 'car-similar-item';
+        const image = other.gallery && other.gallery.length > 0 ? other.gallery[0] : other.image;
+        item.innerHTML = `
+            ${image ? `<img src="${image}" alt="${getCarTitle(other)}" loading="lazy">` : `<span class="car-similar-emoji">${getCarEmoji(other)}</span>`}
+            <span class="car-similar-title">${getCarTitle(other)}</span>
+            <span class="car-similar-price">${formatPrice(other.prezzo)}</span>
+        `;
+        item.addEventListener('click', () => updateCarDetailContent(other));
+        list.appendChild(item);
+    });
+    section.hidden = cars.length === 0;
 }
 
 function updateCarDetailCarousel() {
@@ -1014,6 +1066,7 @@ function updateCarDetailCarousel() {
         const slide = document.createElement('div');
         slide.className = 'car-detail-slide';
         const img = document.createElement('img');
+        applyImageSize(img, currentCarDetailMeta[index]);
         img.src = src;
         
         slide.appendChild(img);
@@ -1074,6 +1127,7 @@ function updateMobileFullscreenContent(index) {
     
     const img = mobileFullscreenOverlay.querySelector('.mobile-fullscreen-image');
     if (currentCarDetailImages[currentCarDetailIndex]) {
+        applyImageSize(img, currentCarDetailMeta[currentCarDetailIndex]);
         img.src = currentCarDetailImages[currentCarDetailIndex];
     }
     
@@ -1286,7 +1340,7 @@ function setupMobileFilterEvents() {
 
 
 // Apply mobile filters
-function applyMobileFilters() {
+async function applyMobileFilters() {
     const mobileForm = document.getElementById('mobileCarFilters');
     if (!mobileForm) return;
     
@@ -1306,14 +1360,16 @@ function applyMobileFilters() {
         carburante: formData.get('carburante') || '',
         cambio: formData.get('cambio') || '',
         neopatentati: formData.get('neopatentati') || '',
-        euro: formData.get('euro') || ''
+        euro: formData.get('euro') || '',
+        q: (formData.get('q') || '').trim()
     };
+    await resolveSearch(filters, loadedData);
 
     // Apply filters
     generateCarSections(filters);
     
     const hasFilters = filters.prezzoMin > 0 || filters.prezzoMax < Infinity || 
-                      filters.annoMin > 0 || filters.annoMax < Infinity || 
+                      filters.annoMin > 0 || filters.annoMax < Infinity || filters.q !== '' ||
                       (filters.neopatentati && filters.neopatentati !== '');
     
     if (hasFilters) {
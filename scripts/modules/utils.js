@@ -134,3 +134,17 @@ export function formatPrice(price) {
 export function formatNumber(num) {
     return num.toLocaleString('it-IT');
 }
+
+// Helper: Width/height/bytes/format of a gallery photo (gallery_meta, see datasets/image_meta.py)
+export function getImageMeta(car, index) {
+    const meta = car.gallery_meta;
+    if (!meta || !car.gallery || meta.length !== car.gallery.length) return null;
+    return meta[index] || null;
+}
+
+// Helper: Width/height attributes let the browser reserve the photo's space before it loads
+export function applyImageSize(img, meta) {
+    if (!meta) return;
+    img.width = meta.width;
+    img.height = meta.height;
+}